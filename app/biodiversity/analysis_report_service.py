@@ -1,13 +1,17 @@
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from fastapi import HTTPException, status
 from sqlalchemy import and_, desc, func, select
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.shared.models import 区域表
 
-from .models import 物种表, 物种监测记录表
+from .diversity_service import diversity_engine, month_range, month_start
+from .models import 物种监测记录表
+from .queries import BATCH_UPDATE_CHUNK, BiodiversityQueries
+from .review_queue import ReviewQueueService, claims_enabled
 
 
 class AnalysisReportService:
@@ -33,6 +37,7 @@ class AnalysisReportService:
         record.analyst_id = analyst_id
         record.analysis_time = datetime.now()
         record.confidence_level = confidence_level
+        ReviewQueueService.complete(db, "analysis", [record_id])
 
         db.commit()
         db.refresh(record)
@@ -45,6 +50,61 @@ class AnalysisReportService:
             "confidence_level": confidence_level,
         }
 
+    @staticmethod
+    def batch_add_conclusion(
+        db: Session,
+        conclusion: str,
+        analyst_id: int,
+        confidence_level: str = "中",
+        overwrite: bool = False,
+        record_ids: Optional[List[int]] = None,
+        species_id: Optional[int] = None,
+        device_id: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """为符合条件的有效记录写入同一分析结论；overwrite=False 时跳过已有结论的记录"""
+        if confidence_level not in ["高", "中", "低"]:
+            confidence_level = "中"
+        analysis_time = datetime.now()
+        updated = 0
+        chunks = 0
+        release_claims = claims_enabled(db)
+        if record_ids is not None:
+            ids = sorted(set(record_ids))
+            groups = [ids[i:i + BATCH_UPDATE_CHUNK] for i in range(0, len(ids), BATCH_UPDATE_CHUNK)]
+        else:
+            groups = [None]
+        for group in groups:
+            where, params = BiodiversityQueries.batch_where(group, species_id, device_id, start_date, end_date)
+            after_id = 0
+            while True:
+                changed = BiodiversityQueries.conclude_valid_chunk(
+                    db, where, params, after_id, BATCH_UPDATE_CHUNK,
+                    conclusion, confidence_level, analyst_id, analysis_time, overwrite,
+                    release_claims=release_claims,
+                )
+                db.commit()
+                if not changed:
+                    break
+                chunks += 1
+                updated += len(changed)
+                after_id = changed[-1]
+                if len(changed) < BATCH_UPDATE_CHUNK:
+                    break
+
+        result = {
+            "updated": updated,
+            "chunks": chunks,
+            "analyst_id": analyst_id,
+            "analysis_time": analysis_time,
+            "confidence_level": confidence_level,
+        }
+        if record_ids is not None:
+            # 不存在、未核实或（不覆盖时）已有结论的记录
+            result["skipped"] = len(set(record_ids)) - updated
+        return result
+
     @staticmethod
     def get_records_without_conclusion(db: Session, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
         base_query = select(物种监测记录表).where(
@@ -88,36 +148,53 @@ class AnalysisReportService:
             "confidence_stats": confidence_stats,
         }
 
+    @staticmethod
+    def _check_period(start_date: datetime, end_date: datetime) -> None:
+        if start_date > end_date:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="开始时间不能晚于结束时间")
+        months = len(month_range(month_start(start_date), month_start(end_date)))
+        if months > settings.diversity_max_months:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"时间范围不能超过 {settings.diversity_max_months} 个月",
+            )
+
+    @staticmethod
+    def get_area_diversity(
+        db: Session,
+        area_ids: Optional[List[int]],
+        start_date: datetime,
+        end_date: datetime,
+    ) -> Dict[str, Any]:
+        """各区域逐月及整个时间段的多样性指数；area_ids 为空时返回全部区域"""
+        AnalysisReportService._check_period(start_date, end_date)
+        query = select(区域表.id, 区域表.name, 区域表.type)
+        if area_ids:
+            query = query.where(区域表.id.in_(area_ids))
+        areas = db.execute(query.order_by(区域表.id)).all()
+        if area_ids and len(areas) != len(set(area_ids)):
+            raise HTTPException(status_code=404, detail="区域不存在")
+
+        result = diversity_engine.compute(db, [a.id for a in areas], start_date, end_date)
+        info = {a.id: {"area_name": a.name, "area_type": a.type} for a in areas}
+        for entry in result["areas"]:
+            entry.update(info[entry["area_id"]])
+        result["time_range"] = {"start": start_date, "end": end_date}
+        return result
+
     @staticmethod
     def generate_area_monitoring_report(db: Session, area_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         area = db.get(区域表, area_id)
         if not area:
             raise HTTPException(status_code=404, detail="区域不存在")
+        AnalysisReportService._check_period(start_date, end_date)
 
-        species_ids = db.execute(
-            select(func.distinct(物种表.id))
-            .select_from(物种表)
-            .join_from(物种表, 物种监测记录表, 物种监测记录表.species_id == 物种表.id, isouter=True)
-        )
-
-        _ = species_ids  # keep placeholder for future extensions
-
-        total_records = (
-            db.scalar(
-                select(func.count())
-                .select_from(物种监测记录表)
-                .where(
-                    and_(
-                        物种监测记录表.time >= start_date,
-                        物种监测记录表.time <= end_date,
-                    )
-                )
-            )
-            or 0
-        )
+        entry = diversity_engine.compute(db, [area_id], start_date, end_date)["areas"][0]
 
         return {
             "area": {"id": area.id, "name": area.name, "type": area.type},
             "time_range": {"start": start_date, "end": end_date},
-            "total_records": total_records,
+            "total_records": entry["total"]["records"],
+            "diversity": entry["total"],
+            "by_period": entry["by_period"],
         }
@@ -1,27 +1,36 @@
-import os
-import uuid
+import zipfile
 from datetime import datetime
-from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File, status
 from sqlalchemy import and_, select
 from sqlalchemy.orm import Session
 
-UPLOAD_DIR = Path(__file__).resolve().parent.parent.parent / "frontend" / "assets" / "uploads"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
+from app import idempotency
 from app.core.api import get_current_user
+from app.config import settings
 from app.core.models import User
 from app.db import get_db
+from app.media import store as media_store
+from app.media.derivatives import derivative_worker
 from app.shared.models import 区域表
 
 from .analysis_report_service import AnalysisReportService
+from . import spatial
+from .burst_dedup import BurstDedupService
+from .cluster_service import occurrence_clusters
+from .diversity_service import add_months, month_start
 from .models import 物种表, 物种监测记录表, 区域物种关联表
 from .monitoring_service import MonitoringRecordService
+from .queries import BiodiversityQueries
 from .schemas import (
     AnalysisConclusionCreate,
     AnalystStatsResponse,
+    AreaBoundaryUpdate,
+    BatchConclusionRequest,
+    BatchVerifyRequest,
+    BurstDedupRequest,
+    ClaimedRecords,
     AreaSpeciesCreate,
     AreaSpeciesResponse,
     DataStatus,
@@ -35,12 +44,22 @@ from .schemas import (
     PaginatedMonitoringRecords,
     PaginatedSpecies,
     ProtectLevel,
+    ReviewClaimRequest,
+    ReviewQueue,
+    ReviewReleaseRequest,
     SpeciesCreate,
+    SpeciesMonitoringSummary,
     SpeciesQueryParams,
     SpeciesResponse,
     SpeciesUpdate,
+    UploadSessionCreate,
 )
+from .import_service import RecordImportService
+from .review_queue import ReviewQueueService
 from .species_service import SpeciesService
+from .species_summary import SpeciesSummaryService
+from .taxonomy_service import RANKS, taxonomy_tree
+from .upload_service import UploadService
 
 router = APIRouter(prefix="/biodiversity", tags=["生物多样性监测"])
 
@@ -50,6 +69,19 @@ def _require_roles(current_user: User, allowed_roles: List[str], detail: str = "
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
 
 
+def _parse_bbox(min_lat, min_lng, max_lat, max_lng) -> Optional[spatial.BBox]:
+    bbox_args = (min_lat, min_lng, max_lat, max_lng)
+    if all(v is None for v in bbox_args):
+        return None
+    if any(v is None for v in bbox_args):
+        raise HTTPException(status_code=400, detail="视野范围需同时提供 min_lat/min_lng/max_lat/max_lng")
+    try:
+        spatial.validate_bbox(bbox_args)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return bbox_args
+
+
 @router.post("/species", response_model=SpeciesResponse)
 def create_species(
     species_data: SpeciesCreate,
@@ -79,8 +111,12 @@ def list_species(
         page_size=page_size,
     )
     result = SpeciesService.list_species(db, query_params)
-    # 手动序列化物种列表
+    # 手动序列化物种列表，监测汇总按当前页的物种编号读取
     species_list = [SpeciesResponse.model_validate(s) for s in result["species"]]
+    summaries = SpeciesSummaryService.summaries(db, [s.id for s in species_list])
+    for item in species_list:
+        if item.id in summaries:
+            item.summary = SpeciesMonitoringSummary(**summaries[item.id])
     return {
         "total": result["total"],
         "species": species_list,
@@ -98,7 +134,21 @@ def get_species(
     species = SpeciesService.get_species(db, species_id)
     if not species:
         raise HTTPException(status_code=404, detail="物种不存在")
-    return species
+    response = SpeciesResponse.model_validate(species)
+    summary = SpeciesSummaryService.summaries(db, [species_id], with_months=True).get(species_id)
+    if summary is not None:
+        response.summary = SpeciesMonitoringSummary(**summary)
+    return response
+
+
+@router.post("/species/summary/rebuild", response_model=Dict[str, Any])
+def rebuild_species_summary(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """按有效监测记录重建物种监测汇总（首次部署或数据修复时使用）"""
+    _require_roles(current_user, ["系统管理员"], "需要系统管理员权限")
+    return SpeciesSummaryService.rebuild(db)
 
 
 @router.put("/species/{species_id}", response_model=SpeciesResponse)
@@ -126,11 +176,20 @@ def delete_species(
 @router.post("/records", response_model=MonitoringRecordResponse)
 def create_monitoring_record(
     record_data: MonitoringRecordCreate,
+    idem: idempotency.IdempotencyGuard = Depends(idempotency.guard()),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     _require_roles(current_user, ["生态监测员", "数据分析师", "系统管理员", "公园管理人员", "科研人员"], "无权创建监测记录")
-    return MonitoringRecordService.create_record(db, record_data, current_user.id)
+    idem.reserve(db)
+    # 幂等响应与记录在同一事务中提交
+    record = MonitoringRecordService.create_record(
+        db,
+        record_data,
+        current_user.id,
+        before_commit=lambda r: idem.complete(db, MonitoringRecordResponse.model_validate(r), commit=False),
+    )
+    return MonitoringRecordResponse.model_validate(record)
 
 
 @router.get("/records", response_model=PaginatedMonitoringRecords)
@@ -142,13 +201,24 @@ def list_monitoring_records(
     state: Optional[DataStatus] = Query(None),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
-    area_id: Optional[int] = Query(None),
+    area_id: Optional[int] = Query(None, description="有区域边界时按点是否在边界内，否则按监测设备的部署区域"),
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lng: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lng: Optional[float] = Query(None, ge=-180, le=180),
+    near_lat: Optional[float] = Query(None, ge=-90, le=90),
+    near_lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_m: Optional[float] = Query(None, gt=0, le=500000),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     # 所有角色可查
+    bbox = _parse_bbox(min_lat, min_lng, max_lat, max_lng)
+    near_args = (near_lat, near_lng, radius_m)
+    if any(v is not None for v in near_args) and any(v is None for v in near_args):
+        raise HTTPException(status_code=400, detail="按距离筛选需同时提供 near_lat/near_lng/radius_m")
     query_params = MonitoringRecordQueryParams(
         species_id=species_id,
         recorder_id=recorder_id,
@@ -158,6 +228,10 @@ def list_monitoring_records(
         start_date=start_date,
         end_date=end_date,
         area_id=area_id,
+        bbox=bbox,
+        near_lat=near_lat,
+        near_lng=near_lng,
+        radius_m=radius_m,
         page=page,
         page_size=page_size,
     )
@@ -172,6 +246,47 @@ def list_monitoring_records(
     }
 
 
+@router.get("/records/map", response_model=Dict[str, Any])
+def get_record_map(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lng: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lng: float = Query(..., ge=-180, le=180),
+    species_id: Optional[int] = Query(None),
+    state: Optional[DataStatus] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """视野内的监测记录点位（内存网格），数量与视野内的点数相关"""
+    bbox = _parse_bbox(min_lat, min_lng, max_lat, max_lng)
+    try:
+        points = spatial.sighting_grid.query(db, bbox, species_id=species_id, state=state.value if state else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    limit = settings.sighting_map_max_points
+    return {
+        "count": len(points),
+        "truncated": len(points) > limit,
+        "points": [p._asdict() for p in points[:limit]],
+    }
+
+
+@router.get("/occurrences/clusters", response_model=Dict[str, Any])
+def get_occurrence_clusters(
+    zoom: int = Query(..., ge=0, le=22, description="地图缩放级别（Web 墨卡托）"),
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lng: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lng: Optional[float] = Query(None, ge=-180, le=180),
+    species_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """有效记录按缩放级别聚合后的分布点，每个簇返回点数和平均位置"""
+    bbox = _parse_bbox(min_lat, min_lng, max_lat, max_lng)
+    return occurrence_clusters.clusters(db, zoom, bbox=bbox, species_id=species_id)
+
+
 @router.get("/records/pending", response_model=PaginatedMonitoringRecords)
 def list_pending_records(
     page: int = Query(1, ge=1),
@@ -184,6 +299,43 @@ def list_pending_records(
     return result
 
 
+@router.post("/records/batch-verify", response_model=Dict[str, Any])
+def batch_verify_monitoring_records(
+    payload: BatchVerifyRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    _require_roles(current_user, ["数据分析师", "系统管理员", "公园管理人员"], "无权核实数据")
+    f = payload.filter
+    return MonitoringRecordService.batch_verify(
+        db,
+        record_ids=payload.record_ids,
+        species_id=f.species_id if f else None,
+        device_id=f.device_id if f else None,
+        start_date=f.start_date if f else None,
+        end_date=f.end_date if f else None,
+    )
+
+
+@router.post("/records/dedup-bursts", response_model=Dict[str, Any])
+def dedup_record_bursts(
+    payload: BurstDedupRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """历史数据重跑红外相机连拍去重（默认 dry_run 只统计）"""
+    _require_roles(current_user, ["系统管理员"], "需要系统管理员权限")
+    if payload.start_date and payload.end_date and payload.start_date > payload.end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="开始时间不能晚于结束时间")
+    return BurstDedupService.rerun(
+        db,
+        device_id=payload.device_id,
+        start_date=payload.start_date,
+        end_date=payload.end_date,
+        dry_run=payload.dry_run,
+    )
+
+
 @router.post("/records/{record_id}/verify", response_model=MonitoringRecordResponse)
 def verify_monitoring_record(
     record_id: int,
@@ -214,6 +366,16 @@ def delete_monitoring_record(
     return {"message": "删除成功"}
 
 
+_UPLOAD_ROLES = ["生态监测员", "数据分析师", "系统管理员", "公园管理人员", "科研人员"]
+
+
+def _get_record_or_404(db: Session, record_id: int) -> 物种监测记录表:
+    record = db.get(物种监测记录表, record_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="监测记录不存在")
+    return record
+
+
 @router.post("/records/{record_id}/upload")
 async def upload_record_file(
     record_id: int,
@@ -221,30 +383,108 @@ async def upload_record_file(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """上传监测记录文件"""
-    _require_roles(current_user, ["生态监测员", "数据分析师", "系统管理员", "公园管理人员", "科研人员"], "无权上传文件")
-    
-    # 检查记录是否存在
-    record = db.get(物种监测记录表, record_id)
-    if not record:
-        raise HTTPException(status_code=404, detail="监测记录不存在")
-    
-    # 生成唯一文件名
-    ext = os.path.splitext(file.filename)[1] if file.filename else ""
-    unique_name = f"bio_{record_id}_{uuid.uuid4().hex[:8]}{ext}"
-    file_path = UPLOAD_DIR / unique_name
-    
-    # 保存文件
-    content = await file.read()
-    with open(file_path, "wb") as f:
-        f.write(content)
-    
-    # 更新数据库中的 image_path 字段
-    relative_path = f"/web/assets/uploads/{unique_name}"
-    record.image_path = relative_path
+    """上传监测记录文件（流式写入，大视频请使用分块续传接口）"""
+    _require_roles(current_user, _UPLOAD_ROLES, "无权上传文件")
+    record = _get_record_or_404(db, record_id)
+
+    saved = await UploadService.save_upload(db, file)
+
+    # 更新数据库中的 image_path 字段，原文件引用计数减一
+    media_store.release(db, record.image_path)
+    record.image_path = saved["file_path"]
+    db.commit()
+    derivative_worker.enqueue(saved["sha256"], saved["content_type"])
+
+    return {"message": "上传成功", **saved}
+
+
+@router.post("/records/{record_id}/uploads")
+def create_upload_session(
+    record_id: int,
+    payload: UploadSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """创建分块续传会话，返回 upload_id 和建议的分块大小"""
+    _require_roles(current_user, _UPLOAD_ROLES, "无权上传文件")
+    _get_record_or_404(db, record_id)
+    return UploadService.create_session(
+        record_id, current_user.id, payload.filename, payload.total_size, payload.sha256
+    )
+
+
+@router.get("/uploads/{upload_id}")
+def get_upload_session(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    """查询已接收的字节数，断点续传时从 received 处继续"""
+    meta = UploadService.load_session(upload_id, current_user.id)
+    return UploadService.session_status(meta)
+
+
+@router.put("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: User = Depends(get_current_user),
+):
+    """请求体为原始字节（application/octet-stream），写入到 offset 处"""
+    meta = UploadService.load_session(upload_id, current_user.id)
+    length = request.headers.get("content-length")
+    return await UploadService.write_chunk(
+        meta, offset, request.stream(), int(length) if length and length.isdigit() else None
+    )
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """校验并落盘，更新监测记录的文件路径"""
+    meta = UploadService.load_session(upload_id, current_user.id)
+    record = _get_record_or_404(db, meta["record_id"])
+    saved = await UploadService.complete_session(db, meta)
+    media_store.release(db, record.image_path)
+    record.image_path = saved["file_path"]
     db.commit()
-    
-    return {"message": "上传成功", "file_path": relative_path}
+    derivative_worker.enqueue(saved["sha256"], saved["content_type"])
+    return {"message": "上传成功", **saved}
+
+
+@router.delete("/uploads/{upload_id}")
+def abort_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    meta = UploadService.load_session(upload_id, current_user.id)
+    UploadService.abort_session(meta)
+    return {"message": "已取消上传"}
+
+
+@router.post("/records/import")
+def import_monitoring_records(
+    manifest: UploadFile = File(..., description="CSV / JSON / JSON Lines 清单"),
+    archive: Optional[UploadFile] = File(None, description="清单 image 列引用的 ZIP 包"),
+    dry_run: bool = Query(False, description="只校验不写入"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """红外相机批量导入：逐行校验、分批写入，返回每行的错误"""
+    _require_roles(current_user, _UPLOAD_ROLES, "无权导入监测记录")
+    if archive is not None and not zipfile.is_zipfile(archive.file):
+        raise HTTPException(status_code=400, detail="archive 必须是 ZIP 文件")
+    return RecordImportService.run(
+        db,
+        manifest.file,
+        manifest.filename,
+        current_user.id,
+        archive=archive.file if archive is not None else None,
+        dry_run=dry_run,
+    )
 
 
 @router.post("/areas/{area_id}/species", response_model=AreaSpeciesResponse)
@@ -350,6 +590,37 @@ def remove_species_from_area(
     return {"message": "移除成功"}
 
 
+@router.put("/areas/{area_id}/boundary", response_model=Dict[str, Any])
+def set_area_boundary(
+    area_id: int,
+    payload: AreaBoundaryUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    _require_roles(current_user, ["系统管理员", "公园管理人员"], "无权设置区域边界")
+    if not db.get(区域表, area_id):
+        raise HTTPException(status_code=404, detail="区域不存在")
+    try:
+        wkt, extent = spatial.polygon_wkt(payload.coordinates)
+    except (ValueError, IndexError) as e:
+        raise HTTPException(status_code=400, detail=str(e) or "边界坐标格式错误")
+    BiodiversityQueries.upsert_area_boundary(db, area_id, wkt, extent)
+    db.commit()
+    return BiodiversityQueries.get_area_boundary(db, area_id)
+
+
+@router.get("/areas/{area_id}/boundary", response_model=Dict[str, Any])
+def get_area_boundary(
+    area_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    boundary = BiodiversityQueries.get_area_boundary(db, area_id)
+    if boundary is None:
+        raise HTTPException(status_code=404, detail="该区域未设置边界")
+    return boundary
+
+
 @router.get("/all-areas", response_model=List[Dict[str, Any]])
 def get_all_areas_for_biodiversity(
     db: Session = Depends(get_db),
@@ -378,6 +649,19 @@ def get_taxonomy_stats(
     return SpeciesService.get_species_taxonomy_stats(db)
 
 
+@router.get("/taxonomy/tree", response_model=Dict[str, Any])
+def get_taxonomy_tree(
+    node: Optional[str] = Query(None, description="以“/”连接的分类路径，如 动物界/脊索动物门/哺乳纲；为空表示根"),
+    depth: int = Query(1, ge=1, le=len(RANKS) + 1, description="向下展开的层数"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    subtree = taxonomy_tree.subtree(db, node, depth)
+    if subtree is None:
+        raise HTTPException(status_code=404, detail="分类节点不存在")
+    return subtree
+
+
 @router.post("/analysis/conclusions", response_model=Dict[str, Any])
 def add_analysis_conclusion(
     conclusion_data: AnalysisConclusionCreate,
@@ -394,6 +678,28 @@ def add_analysis_conclusion(
     )
 
 
+@router.post("/analysis/conclusions/batch", response_model=Dict[str, Any])
+def batch_add_analysis_conclusion(
+    payload: BatchConclusionRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    _require_roles(current_user, ["数据分析师"], "需要数据分析师权限")
+    f = payload.filter
+    return AnalysisReportService.batch_add_conclusion(
+        db,
+        conclusion=payload.conclusion,
+        analyst_id=current_user.id,
+        confidence_level=payload.confidence_level,
+        overwrite=payload.overwrite,
+        record_ids=payload.record_ids,
+        species_id=f.species_id if f else None,
+        device_id=f.device_id if f else None,
+        start_date=f.start_date if f else None,
+        end_date=f.end_date if f else None,
+    )
+
+
 @router.get("/analysis/pending", response_model=PaginatedAnalysisRecords)
 def get_pending_analysis_records(
     page: int = Query(1, ge=1),
@@ -406,6 +712,80 @@ def get_pending_analysis_records(
     return result
 
 
+# 工作队列：verify 与核实接口同权限，analysis 与分析结论接口同权限
+_REVIEW_QUEUE_ROLES = {
+    ReviewQueue.VERIFY: ["数据分析师", "系统管理员", "公园管理人员"],
+    ReviewQueue.ANALYSIS: ["数据分析师"],
+}
+
+
+@router.post("/queue/{queue}/claim", response_model=ClaimedRecords)
+def claim_review_records(
+    queue: ReviewQueue,
+    payload: ReviewClaimRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    _require_roles(current_user, _REVIEW_QUEUE_ROLES[queue], "无权领取该队列的记录")
+    return ReviewQueueService.claim(db, queue.value, current_user.id, payload.size)
+
+
+@router.get("/queue/{queue}/mine", response_model=ClaimedRecords)
+def list_my_review_records(
+    queue: ReviewQueue,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    _require_roles(current_user, _REVIEW_QUEUE_ROLES[queue], "无权查看该队列的记录")
+    return ReviewQueueService.list_claimed(db, queue.value, current_user.id)
+
+
+@router.post("/queue/{queue}/renew", response_model=Dict[str, Any])
+def renew_review_records(
+    queue: ReviewQueue,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    _require_roles(current_user, _REVIEW_QUEUE_ROLES[queue], "无权操作该队列")
+    return ReviewQueueService.renew(db, queue.value, current_user.id)
+
+
+@router.post("/queue/{queue}/release", response_model=Dict[str, Any])
+def release_review_records(
+    queue: ReviewQueue,
+    payload: ReviewReleaseRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    _require_roles(current_user, _REVIEW_QUEUE_ROLES[queue], "无权操作该队列")
+    return ReviewQueueService.release(db, queue.value, current_user.id, payload.record_ids)
+
+
+@router.get("/analysis/diversity", response_model=Dict[str, Any])
+def get_area_diversity(
+    area_id: Optional[List[int]] = Query(None, description="区域编号，可重复；为空表示全部区域"),
+    start_date: Optional[datetime] = Query(None, description="默认为结束时间前 23 个月的月初"),
+    end_date: Optional[datetime] = Query(None, description="默认为当前时间"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    end_date = end_date or datetime.now()
+    if start_date is None:
+        start_date = datetime.combine(add_months(month_start(end_date), -23), datetime.min.time())
+    return AnalysisReportService.get_area_diversity(db, area_id, start_date, end_date)
+
+
+@router.get("/areas/{area_id}/report", response_model=Dict[str, Any])
+def get_area_monitoring_report(
+    area_id: int,
+    start_date: datetime = Query(...),
+    end_date: datetime = Query(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    return AnalysisReportService.generate_area_monitoring_report(db, area_id, start_date, end_date)
+
+
 @router.get("/analysis/analyst-stats/{analyst_id}", response_model=AnalystStatsResponse)
 def get_analyst_statistics(
     analyst_id: int,
@@ -0,0 +1,344 @@
+"""
+红外相机连拍去重
+红外相机一次触发会连拍多张，同一设备、同一物种在几秒内产生几十条几乎相同的监测记录，
+抬高记录数、个体数和待核实队列。新增监测记录（单条与批量导入）时先与同一设备的记录比较：
+监测方式为红外相机、设备、物种和状态相同，时间相差不超过 burst_window_seconds，
+且坐标相距不超过 burst_distance_m（任一条没有坐标时只比较时间）的记录视为同一次连拍，
+不再新增，而是并入已有记录：个体数取较大值，duplicate_count 加 1。
+
+每台设备在内存中保留一段按时间排序的时间窗，覆盖不到的时间段从数据库加载
+（前后各多取 burst_preload_minutes），按时间顺序导入一张存储卡时只需偶尔查询一次。
+历史数据可按设备重跑：按 (物种, 状态, 时间) 排序后一次扫描，
+每段连拍并入第一条记录并删除其余记录（同时释放其图片引用）。
+时间窗只包含加载时已提交的记录和本进程写入的记录（见 app/local_cache.py），漏并的连拍可由历史重跑补齐。
+"""
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.media import store as media_store
+from app.schema_registry import schema
+
+from .cluster_service import occurrence_clusters
+from .diversity_service import diversity_engine
+from .queries import BiodiversityQueries
+from .spatial import haversine_m, sighting_grid
+from .species_summary import SpeciesSummaryService
+from .stats_cache import biodiversity_stats
+from .taxonomy_service import taxonomy_tree
+
+BURST_METHOD = "红外相机"
+
+
+class BurstEntry(NamedTuple):
+    time: datetime
+    record_id: Optional[int]  # 批量导入写入的记录没有编号，并入时按 (设备, 物种, 时间) 定位
+    species_id: int
+    state: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+
+
+def duplicate_count_enabled(db: Session) -> bool:
+    return schema.ensure(db).has_column("物种监测记录表", "duplicate_count")
+
+
+def is_candidate(values: Dict[str, Any]) -> bool:
+    """只对有设备编号的红外相机记录去重"""
+    return (
+        settings.burst_dedup_enabled
+        and values.get("device_id") is not None
+        and values.get("monitoring_method") == BURST_METHOD
+    )
+
+
+def same_burst(a, b) -> bool:
+    """a、b 含 species_id, state, time, latitude, longitude，调用方已保证同一设备"""
+    if a.species_id != b.species_id or a.state != b.state:
+        return False
+    if abs((b.time - a.time).total_seconds()) > settings.burst_window_seconds:
+        return False
+    if None in (a.latitude, a.longitude, b.latitude, b.longitude):
+        return True
+    return haversine_m(a.latitude, a.longitude, b.latitude, b.longitude) <= settings.burst_distance_m
+
+
+def _max_count(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+class _DeviceWindow:
+    """一台设备在 [lo, hi] 内的全部红外相机记录，按时间排序"""
+
+    __slots__ = ("lo", "hi", "times", "entries")
+
+    def __init__(self, lo: Optional[datetime], hi: Optional[datetime], entries: List[BurstEntry]):
+        self.lo = lo
+        self.hi = hi
+        self.times = [e.time for e in entries]
+        self.entries = entries
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        return self.lo <= start and end <= self.hi
+
+    def insert(self, entry: BurstEntry) -> None:
+        i = bisect.bisect_right(self.times, entry.time)
+        self.times.insert(i, entry.time)
+        self.entries.insert(i, entry)
+
+    def nearest(self, probe) -> Optional[BurstEntry]:
+        """时间窗内与 probe 属于同一次连拍、时间最接近的记录"""
+        window = timedelta(seconds=settings.burst_window_seconds)
+        lo = bisect.bisect_left(self.times, probe.time - window)
+        hi = bisect.bisect_right(self.times, probe.time + window)
+        best = None
+        for entry in self.entries[lo:hi]:
+            if same_burst(entry, probe) and (
+                best is None or abs(entry.time - probe.time) < abs(best.time - probe.time)
+            ):
+                best = entry
+        return best
+
+
+class BurstWindow:
+    def __init__(self, max_devices: int):
+        self.max_devices = max_devices
+        self._devices: "OrderedDict[int, _DeviceWindow]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def match(self, db: Session, device_id: int, probe: BurstEntry) -> Optional[BurstEntry]:
+        """查找 probe 应并入的已写入记录；时间窗覆盖不到时先从数据库加载"""
+        window = timedelta(seconds=settings.burst_window_seconds)
+        with self._lock:
+            device = self._devices.get(device_id)
+            if device is not None and device.covers(probe.time - window, probe.time + window):
+                self._devices.move_to_end(device_id)
+                return device.nearest(probe)
+
+        pad = window + timedelta(minutes=settings.burst_preload_minutes)
+        lo, hi = probe.time - pad, probe.time + pad
+        rows = BiodiversityQueries.list_burst_window(db, device_id, lo, hi)
+        device = _DeviceWindow(lo, hi, [
+            BurstEntry(r.time, r.id, r.species_id, r.state, r.latitude, r.longitude) for r in rows
+        ])
+        with self._lock:
+            self._devices[device_id] = device
+            self._devices.move_to_end(device_id)
+            while len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+            return device.nearest(probe)
+
+    # ---------- 维护（在事务提交成功后调用） ----------
+
+    def add(self, entries: Iterable[Tuple[int, BurstEntry]]) -> None:
+        """新写入的记录 (设备编号, 记录)；只加入已覆盖该时间的时间窗"""
+        with self._lock:
+            for device_id, entry in entries:
+                device = self._devices.get(device_id)
+                if device is not None and device.lo <= entry.time <= device.hi:
+                    device.insert(entry)
+
+    def forget(self, device_ids: Iterable[Optional[int]]) -> None:
+        """设备的记录被修改、核实或删除后丢弃其时间窗，下次使用时重新加载"""
+        with self._lock:
+            for device_id in device_ids:
+                if device_id is not None:
+                    self._devices.pop(device_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._devices.clear()
+
+
+burst_window = BurstWindow(max_devices=settings.burst_max_devices)
+
+
+def probe_of(values: Dict[str, Any], record_id: Optional[int] = None) -> BurstEntry:
+    return BurstEntry(
+        values["time"], record_id, values["species_id"], values["state"], values.get("latitude"), values.get("longitude")
+    )
+
+
+def merge_new_record(db: Session, values: Dict[str, Any], commit: bool = True) -> Optional[int]:
+    """
+    新增记录属于已写入记录的连拍时并入该记录，返回被并入的记录编号；否则返回 None。
+    commit=False 时由调用方提交（与幂等响应等其他写入同一事务）。
+    """
+    target = burst_window.match(db, values["device_id"], probe_of(values))
+    if target is None:
+        return None
+    record_id = BiodiversityQueries.merge_burst_duplicates(
+        db, target.state, values.get("count"), 1, duplicate_count_enabled(db),
+        record_id=target.record_id, device_id=values["device_id"], species_id=target.species_id, time=target.time,
+    )
+    if record_id is None:
+        # 时间窗中的记录已删除或状态已变化（UPDATE 未修改任何行），按新记录写入
+        burst_window.forget([values["device_id"]])
+        return None
+    if target.state == "有效":
+        SpeciesSummaryService.refresh(db, [target.species_id])
+    if commit:
+        db.commit()
+    return record_id
+
+
+class BatchBurstDedup:
+    """批量导入的一批记录：与本批已接受的记录及已写入的记录比较，连拍并入后只写入其余记录"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.with_duplicate_count = duplicate_count_enabled(db)
+        self._batch: Dict[int, _DeviceWindow] = {}
+        self._rows: List[Dict[str, Any]] = []  # 本批将写入的红外相机记录
+        # 并入已写入记录：(设备编号, 记录) -> [个体数, 并入条数]
+        self._merges: Dict[Tuple[int, BurstEntry], list] = {}
+        self.merged = 0
+
+    def accept(self, values: Dict[str, Any]) -> bool:
+        """返回 True 表示 values 已并入其他记录，不需要写入"""
+        values.setdefault("duplicate_count", 0)
+        if not is_candidate(values):
+            return False
+        device_id = values["device_id"]
+        probe = probe_of(values)
+        device = self._batch.get(device_id)
+        target = device.nearest(probe) if device is not None else None
+        if target is not None:
+            row = self._rows[target.record_id]
+            row["count"] = _max_count(row["count"], values.get("count"))
+            row["duplicate_count"] += 1
+            self.merged += 1
+            return True
+        target = burst_window.match(self.db, device_id, probe)
+        if target is not None:
+            merge = self._merges.setdefault((device_id, target), [None, 0])
+            merge[0] = _max_count(merge[0], values.get("count"))
+            merge[1] += 1
+            self.merged += 1
+            return True
+        if device is None:
+            device = self._batch[device_id] = _DeviceWindow(None, None, [])
+        # 本批记录的 record_id 暂存为在 _rows 中的下标
+        device.insert(probe._replace(record_id=len(self._rows)))
+        self._rows.append(values)
+        return False
+
+    def apply(self) -> List[datetime]:
+        """在写入本批的事务中更新被并入的已写入记录，返回其中有效记录的时间（个体数变化）"""
+        changed = []
+        for (device_id, target), (count, n) in self._merges.items():
+            record_id = BiodiversityQueries.merge_burst_duplicates(
+                self.db, target.state, count, n, self.with_duplicate_count,
+                record_id=target.record_id, device_id=device_id, species_id=target.species_id, time=target.time,
+            )
+            if record_id is not None and target.state == "有效":
+                changed.append(target)
+        SpeciesSummaryService.refresh(self.db, (target.species_id for target in changed))
+        return [target.time for target in changed]
+
+    @property
+    def extra_columns(self) -> Tuple[str, ...]:
+        return ("duplicate_count",) if self.with_duplicate_count else ()
+
+    def committed(self) -> None:
+        """本批提交成功后把写入的记录加入设备时间窗"""
+        burst_window.add((values["device_id"], probe_of(values)) for values in self._rows)
+
+    def reset(self) -> None:
+        self._batch.clear()
+        self._rows.clear()
+        self._merges.clear()
+        self.merged = 0
+
+
+def sweep(rows: List) -> List[Tuple[int, List[int]]]:
+    """rows 为同一设备的记录，按 (物种, 状态, 时间) 排序；
+    每段连拍以第一条为代表，与代表相隔不超过时间窗的后续记录并入。返回 [(代表下标, [并入下标...])]"""
+    bursts = []
+    rep = None
+    members: List[int] = []
+    for i, row in enumerate(rows):
+        if rep is not None and same_burst(rows[rep], row):
+            members.append(i)
+            continue
+        if members:
+            bursts.append((rep, members))
+        rep, members = i, []
+    if members:
+        bursts.append((rep, members))
+    return bursts
+
+
+class BurstDedupService:
+    @staticmethod
+    def rerun(
+        db: Session,
+        device_id: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        dry_run: bool = True,
+    ) -> Dict[str, Any]:
+        """对历史记录按设备重跑连拍去重；每台设备一个事务。dry_run 时只统计不修改"""
+        started = datetime.now()
+        with_duplicate_count = duplicate_count_enabled(db)
+        device_ids = BiodiversityQueries.list_burst_devices(db, device_id, start_date, end_date)
+        scanned = 0
+        bursts = 0
+        removed: List = []
+        for dev in device_ids:
+            rows = BiodiversityQueries.list_burst_sweep_rows(db, dev, start_date, end_date, with_duplicate_count)
+            scanned += len(rows)
+            groups = sweep(rows)
+            if not groups:
+                continue
+            bursts += len(groups)
+            duplicates = [rows[i] for _, members in groups for i in members]
+            removed.extend(duplicates)
+            if dry_run:
+                continue
+            updates = []
+            for rep, members in groups:
+                count = rows[rep].count
+                merged = rows[rep].duplicate_count
+                for i in members:
+                    count = _max_count(count, rows[i].count)
+                    merged += 1 + rows[i].duplicate_count
+                updates.append((rows[rep].id, count, merged))
+            BiodiversityQueries.apply_burst_merges(db, updates, with_duplicate_count)
+            for row in duplicates:
+                media_store.release(db, row.image_path)
+            BiodiversityQueries.delete_monitoring_records(db, [row.id for row in duplicates])
+            SpeciesSummaryService.refresh(db, (rows[rep].species_id for rep, _ in groups if rows[rep].state == "有效"))
+            db.commit()
+        db.rollback()
+
+        if removed and not dry_run:
+            _after_rerun(device_ids, removed)
+        return {
+            "dry_run": dry_run,
+            "devices": len(device_ids),
+            "scanned": scanned,
+            "bursts": bursts,
+            "removed": len(removed),
+            "removed_pending": sum(1 for row in removed if row.state == "待核实"),
+            "elapsed_ms": int((datetime.now() - started).total_seconds() * 1000),
+        }
+
+
+def _after_rerun(device_ids: List[int], removed: List) -> None:
+    """重跑删除了大量记录：各内存统计整体重新加载"""
+    biodiversity_stats.invalidate()
+    taxonomy_tree.invalidate()
+    diversity_engine.clear()
+    sighting_grid.invalidate((row.latitude, row.longitude) for row in removed)
+    occurrence_clusters.remove(row.id for row in removed if row.state == "有效")
+    burst_window.forget(device_ids)
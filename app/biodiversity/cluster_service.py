@@ -0,0 +1,264 @@
+"""
+物种分布点聚合
+地图缩小时不再把每条监测记录发给浏览器，而是按缩放级别把点位聚合为网格簇：
+缩放级别 z 下按 Web 墨卡托像素坐标每 cluster_cell_px 像素分一格，同一格的点合并为一个簇，
+返回点数和簇内点位的平均位置；只有一个点的簇附带记录编号。
+
+分层结果按 (物种, 缩放级别) 在第一次请求时由点位数组一次算出并缓存（全部物种另有一份），
+监测记录核实为有效、修改坐标或物种、删除后增量调整各已缓存层级中对应的簇；
+一次变化的点数较多（批量导入、批量核实）时直接丢弃该物种已缓存的层级，下次请求时重新计算。
+只统计状态为“有效”且有坐标的记录；点位超过 cluster_reconcile_seconds 后整体重新加载（见 app/local_cache.py）。
+"""
+import math
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.local_cache import ReconciledCache
+
+from .queries import BiodiversityQueries
+
+MAX_MERCATOR_LAT = 85.05112878
+ALL_SPECIES = 0  # 全部物种的图层键（物种编号从 1 开始）
+_INCREMENTAL_LIMIT = 64  # 一次变化超过该点数时丢弃已缓存层级而不是逐点调整
+
+
+class Occurrence(NamedTuple):
+    record_id: int
+    species_id: int
+    latitude: float
+    longitude: float
+
+
+def _mercator(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """经纬度转为 [0, 1) 的 Web 墨卡托坐标"""
+    lat = np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    mx = (lng + 180.0) / 360.0
+    s = np.sin(np.radians(lat))
+    my = 0.5 - np.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return np.clip(mx, 0.0, 1.0 - 1e-12), np.clip(my, 0.0, 1.0 - 1e-12)
+
+
+def _cells_per_axis(zoom: int) -> int:
+    return max(1, (256 << zoom) // settings.cluster_cell_px)
+
+
+def _cell_keys(mx: np.ndarray, my: np.ndarray, zoom: int) -> np.ndarray:
+    n = _cells_per_axis(zoom)
+    return (mx * n).astype(np.int64) * n + (my * n).astype(np.int64)
+
+
+class _Level:
+    """某缩放级别的全部簇，按 key 排序"""
+
+    __slots__ = ("keys", "count", "sum_lat", "sum_lng", "sum_id")
+
+    def __init__(self, keys, count, sum_lat, sum_lng, sum_id):
+        self.keys = keys
+        self.count = count
+        self.sum_lat = sum_lat
+        self.sum_lng = sum_lng
+        self.sum_id = sum_id
+
+    @classmethod
+    def build(cls, layer: "_Layer", zoom: int) -> "_Level":
+        if len(layer.ids) == 0:
+            empty_i = np.zeros(0, dtype=np.int64)
+            empty_f = np.zeros(0, dtype=np.float64)
+            return cls(empty_i, empty_i.copy(), empty_f, empty_f.copy(), empty_i.copy())
+        keys, inverse = np.unique(_cell_keys(layer.mx, layer.my, zoom), return_inverse=True)
+        return cls(
+            keys,
+            np.bincount(inverse, minlength=len(keys)).astype(np.int64),
+            np.bincount(inverse, weights=layer.lat, minlength=len(keys)),
+            np.bincount(inverse, weights=layer.lng, minlength=len(keys)),
+            np.bincount(inverse, weights=layer.ids, minlength=len(keys)).astype(np.int64),
+        )
+
+    def adjust(self, key: int, lat: float, lng: float, record_id: int, sign: int) -> None:
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            self.count[i] += sign
+            self.sum_lat[i] += sign * lat
+            self.sum_lng[i] += sign * lng
+            self.sum_id[i] += sign * record_id
+            if self.count[i] <= 0:
+                for name in self.__slots__:
+                    setattr(self, name, np.delete(getattr(self, name), i))
+        elif sign > 0:
+            self.keys = np.insert(self.keys, i, key)
+            self.count = np.insert(self.count, i, 1)
+            self.sum_lat = np.insert(self.sum_lat, i, lat)
+            self.sum_lng = np.insert(self.sum_lng, i, lng)
+            self.sum_id = np.insert(self.sum_id, i, record_id)
+
+
+class _Layer:
+    """一个物种（或全部物种）的点位及已缓存的层级"""
+
+    def __init__(self, ids: np.ndarray, lat: np.ndarray, lng: np.ndarray):
+        self.ids = ids
+        self.lat = lat
+        self.lng = lng
+        self.mx, self.my = _mercator(lat, lng)
+        self.levels: Dict[int, _Level] = {}
+
+    def add(self, points: List[Occurrence]) -> None:
+        ids = np.fromiter((p.record_id for p in points), dtype=np.int64, count=len(points))
+        lat = np.fromiter((p.latitude for p in points), dtype=np.float64, count=len(points))
+        lng = np.fromiter((p.longitude for p in points), dtype=np.float64, count=len(points))
+        mx, my = _mercator(lat, lng)
+        self._adjust_levels(ids, lat, lng, mx, my, 1)
+        self.ids = np.concatenate([self.ids, ids])
+        self.lat = np.concatenate([self.lat, lat])
+        self.lng = np.concatenate([self.lng, lng])
+        self.mx = np.concatenate([self.mx, mx])
+        self.my = np.concatenate([self.my, my])
+
+    def remove(self, record_ids: Iterable[int]) -> None:
+        mask = np.isin(self.ids, np.fromiter(record_ids, dtype=np.int64))
+        if not mask.any():
+            return
+        self._adjust_levels(self.ids[mask], self.lat[mask], self.lng[mask], self.mx[mask], self.my[mask], -1)
+        keep = ~mask
+        self.ids, self.lat, self.lng = self.ids[keep], self.lat[keep], self.lng[keep]
+        self.mx, self.my = self.mx[keep], self.my[keep]
+
+    def _adjust_levels(self, ids, lat, lng, mx, my, sign: int) -> None:
+        if len(ids) > _INCREMENTAL_LIMIT:
+            self.levels.clear()
+            return
+        for zoom, level in self.levels.items():
+            keys = _cell_keys(mx, my, zoom)
+            for key, la, ln, rid in zip(keys.tolist(), lat.tolist(), lng.tolist(), ids.tolist()):
+                level.adjust(key, la, ln, rid, sign)
+
+    def level(self, zoom: int) -> _Level:
+        level = self.levels.get(zoom)
+        if level is None:
+            level = self.levels[zoom] = _Level.build(self, zoom)
+        return level
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def _empty_layer() -> _Layer:
+    return _Layer(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.float64))
+
+
+class OccurrenceClusters(ReconciledCache):
+    def __init__(self, reconcile_seconds: float):
+        super().__init__(reconcile_seconds)
+        self._layers: Dict[int, _Layer] = {}
+        self._species_of: Dict[int, int] = {}  # 记录编号 -> 物种编号，删除和修改时定位图层
+
+    def _rebuild(self, db: Session) -> Dict[str, object]:
+        rows = BiodiversityQueries.list_valid_occurrences(db)
+        n = len(rows)
+        ids = np.fromiter((r.id for r in rows), dtype=np.int64, count=n)
+        species = np.fromiter((r.species_id for r in rows), dtype=np.int64, count=n)
+        lat = np.fromiter((r.latitude for r in rows), dtype=np.float64, count=n)
+        lng = np.fromiter((r.longitude for r in rows), dtype=np.float64, count=n)
+
+        layers: Dict[int, _Layer] = {ALL_SPECIES: _Layer(ids, lat, lng)}
+        order = np.argsort(species, kind="stable")
+        uniq, starts = np.unique(species[order], return_index=True)
+        bounds = list(starts) + [n]
+        for i, species_id in enumerate(uniq.tolist()):
+            idx = order[bounds[i]:bounds[i + 1]]
+            layers[species_id] = _Layer(ids[idx], lat[idx], lng[idx])
+        return {"_layers": layers, "_species_of": dict(zip(ids.tolist(), species.tolist()))}
+
+    # ---------- 增量调整（在事务提交成功后调用；尚未加载时忽略） ----------
+
+    def add(self, points: Iterable[Occurrence]) -> None:
+        """新增的有效记录；没有坐标的忽略"""
+        points = [p for p in points if p.latitude is not None and p.longitude is not None]
+        if not points:
+            return
+        with self._lock:
+            if not self.loaded:
+                return
+            points = [p for p in points if p.record_id not in self._species_of]
+            by_species: Dict[int, List[Occurrence]] = {}
+            for p in points:
+                by_species.setdefault(p.species_id, []).append(p)
+                self._species_of[p.record_id] = p.species_id
+            for species_id, group in by_species.items():
+                self._layers.setdefault(species_id, _empty_layer()).add(group)
+            if points:
+                self._layers[ALL_SPECIES].add(points)
+
+    def remove(self, record_ids: Iterable[int]) -> None:
+        """不再计入的记录（删除、改为待核实、修改坐标前的旧位置）"""
+        with self._lock:
+            if not self.loaded:
+                return
+            by_species: Dict[int, List[int]] = {}
+            for rid in record_ids:
+                species_id = self._species_of.pop(rid, None)
+                if species_id is not None:
+                    by_species.setdefault(species_id, []).append(rid)
+            if not by_species:
+                return
+            for species_id, rids in by_species.items():
+                layer = self._layers.get(species_id)
+                if layer is not None:
+                    layer.remove(rids)
+                    if not len(layer):
+                        del self._layers[species_id]
+            self._layers[ALL_SPECIES].remove([rid for rids in by_species.values() for rid in rids])
+
+    def record_changed(self, record_id: int, old: Tuple, new: Tuple) -> None:
+        """old / new 为 (状态, 物种编号, 纬度, 经度)；按是否计入增删，物种变化时从原物种图层移到新图层"""
+        if old == new:
+            return
+        if old[0] == "有效":
+            self.remove([record_id])
+        if new[0] == "有效":
+            self.add([Occurrence(record_id, new[1], new[2], new[3])])
+
+    # ---------- 查询 ----------
+
+    def clusters(
+        self,
+        db: Session,
+        zoom: int,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        species_id: Optional[int] = None,
+    ) -> dict:
+        self._ensure(db)
+        zoom = min(zoom, settings.cluster_max_zoom)
+        with self._lock:
+            layer = self._layers.get(species_id or ALL_SPECIES)
+            if layer is None:
+                return {"zoom": zoom, "total": 0, "clusters": []}
+            level = layer.level(zoom)
+            count = level.count.copy()
+            lat = level.sum_lat / np.maximum(count, 1)
+            lng = level.sum_lng / np.maximum(count, 1)
+            sum_id = level.sum_id.copy()
+        if bbox is not None:
+            min_lat, min_lng, max_lat, max_lng = bbox
+            mask = (lat >= min_lat) & (lat <= max_lat) & (lng >= min_lng) & (lng <= max_lng)
+            count, lat, lng, sum_id = count[mask], lat[mask], lng[mask], sum_id[mask]
+        return {
+            "zoom": zoom,
+            "total": int(count.sum()),
+            "clusters": [
+                {
+                    "latitude": round(la, 6),
+                    "longitude": round(ln, 6),
+                    "count": c,
+                    # 只有一个点时 sum_id 即该记录编号
+                    "record_id": rid if c == 1 else None,
+                }
+                for la, ln, c, rid in zip(lat.tolist(), lng.tolist(), count.tolist(), sum_id.tolist())
+            ],
+        }
+
+
+occurrence_clusters = OccurrenceClusters(reconcile_seconds=settings.cluster_reconcile_seconds)
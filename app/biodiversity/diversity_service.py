@@ -0,0 +1,239 @@
+"""
+区域生物多样性指数
+一条分组查询取出 (区域, 月份, 物种) 的个体数，组成 (区域×月份) × 物种 的矩阵，
+用 NumPy 一次算出所有单元格的物种丰富度、Shannon–Wiener 指数、Simpson 指数（1 − Σp²）
+和 Pielou 均匀度；整个时间段的指数由各月个体数相加后同样按矩阵计算。
+
+结果按月缓存（每个月包含所有区域），监测记录新增 / 核实 / 修改 / 删除后使对应月份失效；
+时间段首尾不满整月时，这两个月按实际起止时间直接查询，不使用也不写入缓存。
+每个月份的结果最多保留 diversity_cache_seconds（见 app/local_cache.py）。
+记录经监测设备的部署区域归属到区域，没有设备或设备未部署的记录不计入；只统计有效记录。
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.local_cache import expired
+from app.timeutil import local_naive
+
+from .queries import BiodiversityQueries
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(start: date, end: date) -> List[date]:
+    months = []
+    current = month_start(start)
+    while current <= end:
+        months.append(current)
+        current = add_months(current, 1)
+    return months
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def diversity_indices(abundance: np.ndarray) -> Dict[str, np.ndarray]:
+    """abundance 为 单元格 × 物种 的个体数矩阵，按行计算各指数；
+    没有个体的单元格各指数为 NaN，只有一个物种时 Pielou 均匀度为 NaN"""
+    abundance = np.asarray(abundance, dtype=np.float64)
+    individuals = abundance.sum(axis=1)
+    richness = np.count_nonzero(abundance, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = abundance / individuals[:, None]
+        # p = 0 的项按 0 计入，log 的参数替换为 1 避免 -inf；加 0.0 把只有一个物种时的 -0.0 变为 0.0
+        shannon = -(p * np.log(np.where(p > 0, p, 1.0))).sum(axis=1) + 0.0
+        simpson = 1.0 - (p * p).sum(axis=1)
+        pielou = np.where(richness > 1, shannon / np.log(np.maximum(richness, 2)), np.nan)
+    empty = individuals <= 0
+    shannon[empty] = np.nan
+    simpson[empty] = np.nan
+    pielou[empty] = np.nan
+    return {
+        "richness": richness,
+        "individuals": individuals,
+        "shannon": shannon,
+        "simpson": simpson,
+        "pielou": pielou,
+    }
+
+
+def _round(value: float, digits: int = 4) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+class _AreaMonth:
+    """一个区域一个月：物种个体数（稀疏）及已算好的指数"""
+
+    __slots__ = ("species_ids", "abundance", "indices")
+
+    def __init__(self, species_ids: np.ndarray, abundance: np.ndarray, indices: dict):
+        self.species_ids = species_ids
+        self.abundance = abundance
+        self.indices = indices
+
+
+class DiversityIndexEngine:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        # 月份 -> (加载时间, 区域编号 -> _AreaMonth)
+        self._months: Dict[date, Tuple[float, Dict[int, _AreaMonth]]] = {}
+        self._lock = threading.Lock()
+
+    # ---------- 失效 ----------
+
+    def invalidate(self, times: Iterable[Optional[datetime]]) -> None:
+        """监测记录变化后调用，传入受影响记录的时间（修改时间字段时新旧时间都要传）"""
+        months = {month_start(t) for t in times if t is not None}
+        if not months:
+            return
+        with self._lock:
+            for month in months:
+                self._months.pop(month, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._months.clear()
+
+    # ---------- 加载 ----------
+
+    def _missing(self, months: Sequence[date]) -> List[date]:
+        with self._lock:
+            return [m for m in months if expired(self._months.get(m, (None,))[0], self.ttl_seconds)]
+
+    def _load(self, db: Session, months: List[date]) -> None:
+        """缺失月份跨度内一次查询，按矩阵一次算出所有 (区域, 月份) 的指数"""
+        first, last = months[0], months[-1]
+        rows = BiodiversityQueries.aggregate_valid_records_by_area_month(db, first, add_months(last, 1))
+        loaded_at = time.monotonic()
+        result = self._build(rows, month_range(first, last))
+        with self._lock:
+            for m, areas in result.items():
+                self._months[m] = (loaded_at, areas)
+
+    def _partial(self, db: Session, start: datetime, end: datetime, end_inclusive: bool) -> Dict[int, _AreaMonth]:
+        """同一月内 [start, end]（end_inclusive 为否时为 [start, end)）的各区域指数，不缓存"""
+        rows = BiodiversityQueries.aggregate_valid_records_by_area_month(db, start, end, end_inclusive=end_inclusive)
+        return self._build(rows, [month_start(start)])[month_start(start)]
+
+    @staticmethod
+    def _build(rows: Sequence[tuple], span: List[date]) -> Dict[date, Dict[int, _AreaMonth]]:
+        result: Dict[date, Dict[int, _AreaMonth]] = {m: {} for m in span}
+        if rows:
+            area_col = np.fromiter((r.area_id for r in rows), dtype=np.int64, count=len(rows))
+            period_col = [month_start(r.period) for r in rows]
+            species_col = np.fromiter((r.species_id for r in rows), dtype=np.int64, count=len(rows))
+            individuals_col = np.fromiter((r.individuals for r in rows), dtype=np.float64, count=len(rows))
+            records_col = np.fromiter((r.records for r in rows), dtype=np.int64, count=len(rows))
+
+            period_index = {m: i for i, m in enumerate(span)}
+            period_idx = np.fromiter((period_index[p] for p in period_col), dtype=np.int64, count=len(rows))
+            # 行 = (区域, 月份) 单元格，列 = 物种
+            cell_keys = area_col * len(span) + period_idx
+            cells, cell_idx = np.unique(cell_keys, return_inverse=True)
+            species, species_idx = np.unique(species_col, return_inverse=True)
+            matrix = np.zeros((len(cells), len(species)), dtype=np.float64)
+            np.add.at(matrix, (cell_idx, species_idx), individuals_col)
+            records = np.bincount(cell_idx, weights=records_col, minlength=len(cells)).astype(np.int64)
+            indices = diversity_indices(matrix)
+
+            for i, key in enumerate(cells):
+                area_id, p = divmod(int(key), len(span))
+                nonzero = np.flatnonzero(matrix[i])
+                result[span[p]][area_id] = _AreaMonth(
+                    species[nonzero],
+                    matrix[i, nonzero],
+                    {
+                        "richness": int(indices["richness"][i]),
+                        "individuals": int(indices["individuals"][i]),
+                        "records": int(records[i]),
+                        "shannon": _round(indices["shannon"][i]),
+                        "simpson": _round(indices["simpson"][i]),
+                        "pielou": _round(indices["pielou"][i]),
+                    },
+                )
+        return result
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def _empty() -> dict:
+        return {"richness": 0, "individuals": 0, "records": 0, "shannon": None, "simpson": None, "pielou": None}
+
+    def compute(self, db: Session, area_ids: Sequence[int], start: datetime, end: datetime) -> dict:
+        """返回各区域逐月指数及整个时间段的指数，统计 [start, end] 内的记录；
+        月份按 start 所在月到 end 所在月（含），首尾不满整月的月份只统计范围内的部分"""
+        start, end = local_naive(start), local_naive(end)
+        months = month_range(month_start(start), month_start(end))
+        first, last = months[0], months[-1]
+        # 首尾月份只覆盖一部分时记下该月的实际范围 (起, 止, 是否含止)：start 不在月初，或 end 早于该月最后一刻
+        partial: Dict[date, Tuple[datetime, datetime, bool]] = {}
+        if start > _midnight(first):
+            partial[first] = (start, end, True) if first == last else (start, _midnight(add_months(first, 1)), False)
+        if end < _midnight(add_months(last, 1)) - timedelta(microseconds=1):
+            partial[last] = (max(start, _midnight(last)), end, True)
+        whole = [m for m in months if m not in partial]
+        missing = self._missing(whole)
+        if missing:
+            self._load(db, missing)
+        with self._lock:
+            cached = {m: self._months.get(m, (0.0, {}))[1] for m in whole}
+        for m, (lo, hi, inclusive) in partial.items():
+            cached[m] = self._partial(db, lo, hi, inclusive)
+
+        area_ids = list(area_ids)
+        area_pos = {a: i for i, a in enumerate(area_ids)}
+        per_area = {a: [] for a in area_ids}
+        # 整个时间段：各月稀疏个体数累加到 区域 × 物种 矩阵后一次计算
+        rows_idx, species_list, values = [], [], []
+        records_total = np.zeros(len(area_ids), dtype=np.int64)
+        for m in months:
+            areas = cached[m]
+            for a in area_ids:
+                entry = areas.get(a)
+                per_area[a].append({"period": m.strftime("%Y-%m"), **(entry.indices if entry else self._empty())})
+                if entry is not None:
+                    rows_idx.append(np.full(len(entry.species_ids), area_pos[a], dtype=np.int64))
+                    species_list.append(entry.species_ids)
+                    values.append(entry.abundance)
+                    records_total[area_pos[a]] += entry.indices["records"]
+
+        totals = [self._empty() for _ in area_ids]
+        if rows_idx:
+            species, species_idx = np.unique(np.concatenate(species_list), return_inverse=True)
+            matrix = np.zeros((len(area_ids), len(species)), dtype=np.float64)
+            np.add.at(matrix, (np.concatenate(rows_idx), species_idx), np.concatenate(values))
+            indices = diversity_indices(matrix)
+            for i in range(len(area_ids)):
+                totals[i] = {
+                    "richness": int(indices["richness"][i]),
+                    "individuals": int(indices["individuals"][i]),
+                    "records": int(records_total[i]),
+                    "shannon": _round(indices["shannon"][i]),
+                    "simpson": _round(indices["simpson"][i]),
+                    "pielou": _round(indices["pielou"][i]),
+                }
+
+        return {
+            "periods": [m.strftime("%Y-%m") for m in months],
+            "areas": [
+                {"area_id": a, "total": totals[area_pos[a]], "by_period": per_area[a]}
+                for a in area_ids
+            ],
+        }
+
+
+diversity_engine = DiversityIndexEngine(ttl_seconds=settings.diversity_cache_seconds)
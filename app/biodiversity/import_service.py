@@ -0,0 +1,363 @@
+"""
+红外相机批量导入
+野外回收的存储卡一次有上千条识别结果。导入清单（CSV / JSON / JSON Lines）逐行解析，
+物种、设备编号在导入开始时各查询一次放入集合校验，不再每条记录三次 db.get；
+校验通过的记录按 import_batch_rows 分批、每批一个事务用多行 INSERT 写入，
+某一批失败只影响该批。红外相机连拍在写入前并入同一次连拍的第一条记录（见 burst_dedup）。清单中的 image 列引用随附 ZIP 包内的文件，按需流式解压写入媒体存储
+（同一文件只解压一次，按引用次数计数）。每一行的错误都会返回行号和原因。
+
+清单列：species_id, device_id, time, latitude, longitude, monitoring_method, count,
+behavior, state, image（ZIP 包内文件名）或 image_path（已有地址）。
+"""
+import csv
+import io
+import json
+import logging
+import zipfile
+from collections import Counter
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.media import store as media_store
+from app.timeutil import local_naive
+from app.media.derivatives import derivative_worker
+
+from .burst_dedup import BatchBurstDedup
+from .queries import BiodiversityQueries
+from .cluster_service import occurrence_clusters
+from .diversity_service import diversity_engine
+from .spatial import sighting_grid
+from .schemas import DataStatus, MonitoringMethod
+from .species_summary import SpeciesSummaryService, SummaryDelta
+from .stats_cache import biodiversity_stats
+from .taxonomy_service import taxonomy_tree
+
+logger = logging.getLogger(__name__)
+
+_METHODS = {m.value for m in MonitoringMethod}
+_STATES = {s.value for s in DataStatus}
+
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and value.strip() == "")
+
+
+def iter_manifest(fileobj: BinaryIO, filename: Optional[str]) -> Iterator[Tuple[int, dict]]:
+    """逐行读取清单，返回 (行号, 原始字段)；CSV 行号按文件行计（含表头）"""
+    name = (filename or "").lower()
+    if name.endswith(".jsonl") or name.endswith(".ndjson"):
+        text_stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig")
+        for line_no, line in enumerate(text_stream, start=1):
+            if line.strip():
+                yield line_no, json.loads(line)
+        text_stream.detach()
+    elif name.endswith(".json"):
+        data = json.load(io.TextIOWrapper(fileobj, encoding="utf-8-sig"))
+        if isinstance(data, dict):
+            data = data.get("records", [])
+        for i, item in enumerate(data, start=1):
+            yield i, item
+    else:
+        text_stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(text_stream)
+        for raw in reader:
+            yield reader.line_num, raw
+        text_stream.detach()
+
+
+class _RowValidator:
+    def __init__(self, species_ids, device_ids, recorder_id: int, archive_names: Optional[Dict[str, str]]):
+        self.species_ids = species_ids
+        self.device_ids = device_ids
+        self.recorder_id = recorder_id
+        self.archive_names = archive_names
+        self.now = datetime.now()
+
+    @staticmethod
+    def _int(raw: dict, key: str, errors: List[str], required: bool = False) -> Optional[int]:
+        value = raw.get(key)
+        if _blank(value):
+            if required:
+                errors.append(f"{key} 不能为空")
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            errors.append(f"{key} 不是整数：{value}")
+            return None
+
+    @staticmethod
+    def _float(raw: dict, key: str, errors: List[str], low: float, high: float) -> Optional[float]:
+        value = raw.get(key)
+        if _blank(value):
+            return None
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            errors.append(f"{key} 不是数字：{value}")
+            return None
+        if not low <= number <= high:
+            errors.append(f"{key} 超出范围：{value}")
+            return None
+        return number
+
+    def validate(self, raw: dict) -> Tuple[Optional[dict], Optional[str], List[str]]:
+        """返回 (待写入字段, ZIP 包内文件名, 错误列表)；校验条件与 TR_监测数据完整性检查 一致"""
+        errors: List[str] = []
+        if not isinstance(raw, dict):
+            return None, None, ["不是有效的记录对象"]
+
+        species_id = self._int(raw, "species_id", errors, required=True)
+        if species_id is not None and species_id not in self.species_ids:
+            errors.append(f"物种不存在：{species_id}")
+        device_id = self._int(raw, "device_id", errors)
+        if device_id is not None and device_id not in self.device_ids:
+            errors.append(f"监测设备不存在：{device_id}")
+
+        time_value = raw.get("time")
+        observed_at = None
+        if _blank(time_value):
+            errors.append("time 不能为空")
+        else:
+            try:
+                text_value = str(time_value).strip()
+                if text_value[-1:] in ("Z", "z"):
+                    text_value = text_value[:-1] + "+00:00"
+                # 带时区的时间换算为服务器本地时间，与库中的监测时间一致
+                observed_at = local_naive(datetime.fromisoformat(text_value))
+            except (TypeError, ValueError, OverflowError):
+                errors.append(f"time 格式错误：{time_value}")
+            else:
+                if observed_at > self.now:
+                    errors.append("time 不能晚于当前时间")
+
+        latitude = self._float(raw, "latitude", errors, -90.0, 90.0)
+        longitude = self._float(raw, "longitude", errors, -180.0, 180.0)
+
+        method = raw.get("monitoring_method")
+        method = "红外相机" if _blank(method) else str(method).strip()
+        if method not in _METHODS:
+            errors.append(f"monitoring_method 无效：{method}")
+
+        state = raw.get("state")
+        state = DataStatus.PENDING_VERIFICATION.value if _blank(state) else str(state).strip()
+        if state not in _STATES:
+            errors.append(f"state 无效：{state}")
+
+        count = self._int(raw, "count", errors)
+        if count is not None and count < 0:
+            errors.append("count 不能为负数")
+
+        member = None
+        image = raw.get("image")
+        image_path = None if _blank(raw.get("image_path")) else str(raw["image_path"]).strip()
+        if not _blank(image):
+            image = str(image).strip()
+            if self.archive_names is None:
+                errors.append("清单引用了 image 但没有上传 ZIP 包")
+            else:
+                member = self.archive_names.get(image) or self.archive_names.get(image.rsplit("/", 1)[-1])
+                if member is None:
+                    errors.append(f"ZIP 包中找不到文件：{image}")
+        elif image_path is not None and len(image_path) > 500:
+            errors.append("image_path 超过 500 字符")
+
+        if errors:
+            return None, None, errors
+        behavior = raw.get("behavior")
+        return {
+            "species_id": species_id,
+            "device_id": device_id,
+            "time": observed_at,
+            "latitude": latitude,
+            "longitude": longitude,
+            "monitoring_method": method,
+            "image_path": image_path,
+            "count": count,
+            "behavior": None if _blank(behavior) else str(behavior),
+            "state": state,
+            "recorder_id": self.recorder_id,
+        }, member, []
+
+
+class _ArchiveMedia:
+    """ZIP 包内文件按需流式解压进媒体存储；同一文件只解压一次"""
+
+    def __init__(self, archive: zipfile.ZipFile):
+        self.archive = archive
+        self.extracted: Dict[str, Tuple[str, int, str]] = {}
+        self.new_images: Dict[str, str] = {}
+
+    @staticmethod
+    def index(archive: zipfile.ZipFile) -> Dict[str, str]:
+        """清单可以写完整路径或只写文件名；文件名重复时只能用完整路径引用"""
+        names: Dict[str, str] = {}
+        basenames = Counter()
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            names[info.filename] = info.filename
+            basenames[info.filename.rsplit("/", 1)[-1]] += 1
+        for info in archive.infolist():
+            base = info.filename.rsplit("/", 1)[-1]
+            if not info.is_dir() and basenames[base] == 1:
+                names.setdefault(base, info.filename)
+        return names
+
+    def ensure(self, member: str) -> Tuple[str, int, str]:
+        if member not in self.extracted:
+            with self.archive.open(member) as src:
+                tmp, size, sha256 = media_store.copy_to_temp(src, media_store.TMP_DIR, settings.upload_max_bytes)
+            content_type = media_store.guess_content_type(member, None)
+            # 元数据先单独提交：本批写入失败回滚时文件由清理任务回收
+            created = media_store.place_registered(tmp, sha256, size, content_type, member.rsplit("/", 1)[-1])
+            self.extracted[member] = (sha256, size, content_type)
+            if created:
+                self.new_images[sha256] = content_type
+        return self.extracted[member]
+
+    def link(self, db: Session, rows: List[Tuple[dict, Optional[str]]]) -> None:
+        """为本批记录填上媒体地址，并按本批引用次数登记"""
+        refs: Counter = Counter()
+        for values, member in rows:
+            if member is None:
+                continue
+            sha256, size, content_type = self.ensure(member)
+            values["image_path"] = media_store.media_url(sha256)
+            refs[member] += 1
+        for member, n in refs.items():
+            sha256, size, content_type = self.extracted[member]
+            media_store.register(db, sha256, size, content_type, member.rsplit("/", 1)[-1], refs=n)
+
+
+class RecordImportService:
+    @staticmethod
+    def run(
+        db: Session,
+        manifest: BinaryIO,
+        manifest_name: Optional[str],
+        recorder_id: int,
+        archive: Optional[BinaryIO] = None,
+        dry_run: bool = False,
+    ) -> dict:
+        started = datetime.now()
+        zf = zipfile.ZipFile(archive) if archive is not None else None
+        media = _ArchiveMedia(zf) if zf is not None else None
+        validator = _RowValidator(
+            BiodiversityQueries.list_species_ids(db),
+            BiodiversityQueries.list_device_ids(db),
+            recorder_id,
+            _ArchiveMedia.index(zf) if zf is not None else None,
+        )
+        dedup = BatchBurstDedup(db)
+        # 校验阶段不占用事务，释放读取物种/设备编号时开启的事务
+        db.rollback()
+
+        errors: List[dict] = []
+        truncated = False
+        failed = 0
+        total = 0
+        imported = 0
+        merged = 0
+        batch: List[Tuple[int, dict, Optional[str]]] = []
+        lines: List[int] = []  # 本批（含并入其他记录的行）的首末行号
+
+        def report(entry: dict) -> None:
+            nonlocal truncated
+            if len(errors) < settings.import_error_limit:
+                errors.append(entry)
+            else:
+                truncated = True
+
+        def flush() -> None:
+            nonlocal imported, merged, failed
+            if not lines:
+                return
+            try:
+                if media is not None:
+                    media.link(db, [(values, member) for _, values, member in batch])
+                for _, values, member in batch:
+                    if member is None and values["image_path"] is not None:
+                        media_store.acquire(db, values["image_path"])
+                merged_times = dedup.apply()
+                BiodiversityQueries.bulk_insert_monitoring_records(
+                    db, [values for _, values, _ in batch], dedup.extra_columns
+                )
+                summary = SummaryDelta()
+                for _, values, _ in batch:
+                    if values["state"] == "有效":
+                        summary.add(values["species_id"], values["time"], values["count"])
+                SpeciesSummaryService.apply(db, summary)
+                db.commit()
+                dedup.committed()
+                biodiversity_stats.records_added(
+                    (values["monitoring_method"], values["state"]) for _, values, _ in batch
+                )
+                taxonomy_tree.records_added(values["species_id"] for _, values, _ in batch)
+                diversity_engine.invalidate([values["time"] for _, values, _ in batch] + merged_times)
+                sighting_grid.invalidate((values["latitude"], values["longitude"]) for _, values, _ in batch)
+                # 多行 INSERT 不返回编号，导入了有效且有坐标的记录时分布点聚合整体重新加载
+                if any(values["state"] == "有效" and values["latitude"] is not None
+                       and values["longitude"] is not None for _, values, _ in batch):
+                    occurrence_clusters.invalidate()
+                imported += len(batch)
+                merged += dedup.merged
+            except Exception as e:
+                db.rollback()
+                logger.warning("监测记录批量导入失败（第 %s-%s 行）：%s", lines[0], lines[-1], e)
+                failed += len(batch) + dedup.merged
+                report({
+                    "rows": [lines[0], lines[-1]],
+                    "errors": [f"该批写入失败：{type(e).__name__}: {e}"[:500]],
+                })
+            batch.clear()
+            lines.clear()
+            dedup.reset()
+
+        try:
+            for line_no, raw in iter_manifest(manifest, manifest_name):
+                total += 1
+                values, member, row_errors = validator.validate(raw)
+                if row_errors:
+                    failed += 1
+                    report({"row": line_no, "errors": row_errors})
+                    continue
+                if dry_run:
+                    continue
+                if not lines:
+                    lines.append(line_no)
+                lines[1:] = [line_no]
+                if dedup.accept(values):
+                    continue
+                batch.append((line_no, values, member))
+                if len(batch) >= settings.import_batch_rows:
+                    flush()
+            flush()
+        except (UnicodeDecodeError, json.JSONDecodeError, csv.Error) as e:
+            # 解析失败之前已提交的批次保留，未提交的本批计为失败
+            failed += len(batch) + dedup.merged
+            batch.clear()
+            dedup.reset()
+            errors.append({"row": total + 1, "errors": [f"清单解析失败：{e}"]})
+        finally:
+            if zf is not None:
+                zf.close()
+
+        if media is not None:
+            for sha256, content_type in media.new_images.items():
+                derivative_worker.enqueue(sha256, content_type)
+
+        return {
+            "total": total,
+            "imported": imported,
+            "merged": merged,
+            "failed": failed,
+            "dry_run": dry_run,
+            "media_files": len(media.extracted) if media is not None else 0,
+            "errors": errors,
+            "errors_truncated": truncated,
+            "elapsed_ms": int((datetime.now() - started).total_seconds() * 1000),
+        }
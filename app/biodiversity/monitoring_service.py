@@ -1,18 +1,46 @@
-from typing import Any, Dict, Optional
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
 
 from fastapi import HTTPException, status
 from sqlalchemy import and_, desc, func, select
 from sqlalchemy.orm import Session
 
 from app.core.models import User
+from app.media import store as media_store
 from app.shared.models import 监测设备表, 区域表
 
-from .models import 物种表, 物种监测记录表, 区域物种关联表
+from .models import 物种表, 物种监测记录表
+from . import burst_dedup, spatial
+from .cluster_service import Occurrence, occurrence_clusters
+from .diversity_service import diversity_engine
+from .queries import BATCH_UPDATE_CHUNK, BiodiversityQueries
+from .review_queue import ReviewQueueService, claims_enabled
+from .species_summary import SpeciesSummaryService, SummaryDelta
+from .stats_cache import biodiversity_stats
+from .taxonomy_service import taxonomy_tree
+
+
+def _after_verify(rows: Sequence) -> None:
+    """待核实记录改为有效并提交后更新各内存统计；
+    rows 含 id, species_id, device_id, monitoring_method, time, latitude, longitude"""
+    if not rows:
+        return
+    biodiversity_stats.records_changed(((r.monitoring_method, "待核实"), (r.monitoring_method, "有效")) for r in rows)
+    diversity_engine.invalidate(r.time for r in rows)
+    spatial.sighting_grid.invalidate((r.latitude, r.longitude) for r in rows)
+    occurrence_clusters.add(Occurrence(r.id, r.species_id, r.latitude, r.longitude) for r in rows)
+    burst_dedup.burst_window.forget({r.device_id for r in rows})
 
 
 class MonitoringRecordService:
     @staticmethod
-    def create_record(db: Session, record_data, current_user_id: int) -> 物种监测记录表:
+    def create_record(
+        db: Session,
+        record_data,
+        current_user_id: int,
+        before_commit: Optional[Callable[[物种监测记录表], Any]] = None,
+    ) -> 物种监测记录表:
+        """before_commit 在记录写入后、提交前调用（如保存幂等响应），与记录在同一事务中提交"""
         species = db.get(物种表, record_data.species_id)
         if not species:
             raise HTTPException(status_code=404, detail="物种不存在")
@@ -33,6 +61,29 @@ class MonitoringRecordService:
         )
         state_value = record_data.state.value if hasattr(record_data.state, "value") else record_data.state
 
+        values = {
+            "species_id": record_data.species_id,
+            "device_id": record_data.device_id,
+            "time": record_data.time,
+            "latitude": record_data.latitude,
+            "longitude": record_data.longitude,
+            "monitoring_method": monitoring_method_value,
+            "count": record_data.count,
+            "state": state_value,
+        }
+        if burst_dedup.is_candidate(values):
+            # 同一次连拍：并入已有记录并返回该记录
+            merged_id = burst_dedup.merge_new_record(db, values, commit=False)
+            if merged_id is not None:
+                merged = db.get(物种监测记录表, merged_id)
+                db.refresh(merged)
+                if before_commit is not None:
+                    before_commit(merged)
+                db.commit()
+                if merged.state == "有效":
+                    diversity_engine.invalidate([merged.time])
+                return merged
+
         db_record = 物种监测记录表(
             species_id=record_data.species_id,
             device_id=record_data.device_id,
@@ -48,7 +99,24 @@ class MonitoringRecordService:
         )
 
         db.add(db_record)
+        media_store.acquire(db, db_record.image_path)
+        if db_record.state == "有效":
+            SpeciesSummaryService.apply(db, SummaryDelta.of([db_record]))
+        if before_commit is not None:
+            db.flush()
+            db.refresh(db_record)
+            before_commit(db_record)
         db.commit()
+        biodiversity_stats.record_added(db_record.monitoring_method, db_record.state)
+        taxonomy_tree.record_added(db_record.species_id)
+        diversity_engine.invalidate([db_record.time])
+        spatial.sighting_grid.invalidate([(db_record.latitude, db_record.longitude)])
+        if db_record.state == "有效":
+            occurrence_clusters.add([
+                Occurrence(db_record.id, db_record.species_id, db_record.latitude, db_record.longitude)
+            ])
+        if burst_dedup.is_candidate(values):
+            burst_dedup.burst_window.add([(db_record.device_id, burst_dedup.probe_of(values, db_record.id))])
         db.refresh(db_record)
         return db_record
 
@@ -89,14 +157,15 @@ class MonitoringRecordService:
         if query_params.end_date:
             conditions.append(物种监测记录表.time <= query_params.end_date)
 
+        lat_col, lng_col = 物种监测记录表.latitude, 物种监测记录表.longitude
         if query_params.area_id:
-            species_in_area = db.scalars(
-                select(区域物种关联表.species_id).where(区域物种关联表.area_id == query_params.area_id)
-            ).all()
-            if species_in_area:
-                conditions.append(物种监测记录表.species_id.in_(species_in_area))
-            else:
-                conditions.append(物种监测记录表.species_id == -1)
+            conditions.extend(spatial.area_conditions(db, lat_col, lng_col, query_params.area_id))
+        if query_params.bbox:
+            conditions.extend(spatial.bbox_conditions(db, lat_col, lng_col, query_params.bbox))
+        if query_params.radius_m is not None:
+            conditions.extend(spatial.near_conditions(
+                db, lat_col, lng_col, query_params.near_lat, query_params.near_lng, query_params.radius_m
+            ))
 
         base_query = select(物种监测记录表)
         if conditions:
@@ -136,11 +205,61 @@ class MonitoringRecordService:
         if not record:
             raise HTTPException(status_code=404, detail="监测记录不存在")
 
+        was_pending = record.state == "待核实"
         record.state = "有效"
+        if was_pending:
+            SpeciesSummaryService.apply(db, SummaryDelta.of([record]))
+        ReviewQueueService.complete(db, "verify", [record_id])
         db.commit()
+        if was_pending:
+            _after_verify([record])
         db.refresh(record)
         return record
 
+    @staticmethod
+    def batch_verify(
+        db: Session,
+        record_ids: Optional[List[int]] = None,
+        species_id: Optional[int] = None,
+        device_id: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """把符合条件的待核实记录改为有效；每块一条 UPDATE、一个事务"""
+        started = datetime.now()
+        verified = 0
+        chunks = 0
+        release_claims = claims_enabled(db)
+        if record_ids is not None:
+            ids = sorted(set(record_ids))
+            groups = [ids[i:i + BATCH_UPDATE_CHUNK] for i in range(0, len(ids), BATCH_UPDATE_CHUNK)]
+        else:
+            groups = [None]
+        for group in groups:
+            where, params = BiodiversityQueries.batch_where(group, species_id, device_id, start_date, end_date)
+            after_id = 0
+            while True:
+                rows = BiodiversityQueries.verify_pending_chunk(
+                    db, where, params, after_id, BATCH_UPDATE_CHUNK, release_claims=release_claims
+                )
+                SpeciesSummaryService.apply(db, SummaryDelta.of(rows))
+                db.commit()
+                if not rows:
+                    break
+                chunks += 1
+                verified += len(rows)
+                after_id = rows[-1].id
+                _after_verify(rows)
+                if len(rows) < BATCH_UPDATE_CHUNK:
+                    break
+
+        result = {"verified": verified, "chunks": chunks,
+                  "elapsed_ms": int((datetime.now() - started).total_seconds() * 1000)}
+        if record_ids is not None:
+            # 不存在或已是有效的记录不计入 verified
+            result["skipped"] = len(set(record_ids)) - verified
+        return result
+
     @staticmethod
     def update_record(db: Session, record_id: int, update_data, current_user_id: int) -> 物种监测记录表:
         record = db.get(物种监测记录表, record_id)
@@ -154,6 +273,13 @@ class MonitoringRecordService:
         if current_user.id != record.recorder_id and current_user.role_type != "数据分析师":
             raise HTTPException(status_code=403, detail="无权修改此记录")
 
+        old_key = (record.monitoring_method, record.state)
+        old_species_id = record.species_id
+        old_device_id = record.device_id
+        old_time = record.time
+        old_point = (record.latitude, record.longitude)
+        old_occurrence = (record.state, record.species_id, record.latitude, record.longitude)
+        old_summary = (record.state, record.species_id, record.time, record.count)
         for field, value in update_data.model_dump(exclude_unset=True).items():
             if value is None:
                 continue
@@ -161,9 +287,32 @@ class MonitoringRecordService:
                 value = value.value
             if field == "state" and hasattr(value, "value"):
                 value = value.value
+            if field == "image_path":
+                media_store.replace_reference(db, record.image_path, value)
             setattr(record, field, value)
+        new_key = (record.monitoring_method, record.state)
+        new_summary = (record.state, record.species_id, record.time, record.count)
+        if old_summary != new_summary:
+            # 先写入记录的修改，移除最近一条记录时汇总按表中现有记录重新取最近监测时间
+            db.flush()
+            delta = SummaryDelta()
+            if old_summary[0] == "有效":
+                delta.remove(*old_summary[1:])
+            if new_summary[0] == "有效":
+                delta.add(*new_summary[1:])
+            SpeciesSummaryService.apply(db, delta)
 
         db.commit()
+        biodiversity_stats.record_changed(old_key, new_key)
+        if record.species_id != old_species_id:
+            taxonomy_tree.record_removed(old_species_id)
+            taxonomy_tree.record_added(record.species_id)
+        diversity_engine.invalidate([old_time, record.time])
+        spatial.sighting_grid.invalidate([old_point, (record.latitude, record.longitude)])
+        occurrence_clusters.record_changed(
+            record.id, old_occurrence, (record.state, record.species_id, record.latitude, record.longitude)
+        )
+        burst_dedup.burst_window.forget([old_device_id, record.device_id])
         db.refresh(record)
         return record
 
@@ -180,29 +329,25 @@ class MonitoringRecordService:
         if current_user.id != record.recorder_id and current_user.role_type != "数据分析师":
             raise HTTPException(status_code=403, detail="无权删除此记录")
 
+        media_store.release(db, record.image_path)
+        key = (record.monitoring_method, record.state)
+        species_id = record.species_id
+        observed_at = record.time
+        point = (record.latitude, record.longitude)
+        record_id = record.id
+        device_id = record.device_id
+        removed = SummaryDelta.of([record], sign=-1) if record.state == "有效" else SummaryDelta()
         db.delete(record)
+        db.flush()
+        SpeciesSummaryService.apply(db, removed)
         db.commit()
+        biodiversity_stats.record_removed(*key)
+        taxonomy_tree.record_removed(species_id)
+        diversity_engine.invalidate([observed_at])
+        spatial.sighting_grid.invalidate([point])
+        occurrence_clusters.remove([record_id])
+        burst_dedup.burst_window.forget([device_id])
 
     @staticmethod
     def get_overall_stats(db: Session) -> Dict[str, Any]:
-        total_records = db.scalar(select(func.count()).select_from(物种监测记录表)) or 0
-        pending_records = (
-            db.scalar(select(func.count()).select_from(物种监测记录表).where(物种监测记录表.state == "待核实"))
-            or 0
-        )
-
-        method_stats: Dict[str, int] = {}
-        for method in ["红外相机", "人工巡查", "无人机"]:
-            cnt = (
-                db.scalar(
-                    select(func.count()).select_from(物种监测记录表).where(物种监测记录表.monitoring_method == method)
-                )
-                or 0
-            )
-            method_stats[method] = cnt
-
-        return {
-            "total_records": total_records,
-            "pending_records": pending_records,
-            "method_stats": method_stats,
-        }
+        return biodiversity_stats.record_stats(db)
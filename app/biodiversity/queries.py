@@ -1,14 +1,30 @@
 # dao/biodiversity_queries.py
 from __future__ import annotations
 
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Set
 
-from sqlalchemy import and_, desc, select, text
+from sqlalchemy import and_, desc, func, select, text
 from sqlalchemy.orm import Session
 
 from . import models
 
+# 批量核实 / 批量分析结论按编号列表处理时每条语句的编号数（< 2100 个参数上限）
+BATCH_UPDATE_CHUNK = 2000
+
+# 多行 INSERT 每条语句的参数数（< SQL Server 2100 个参数上限），行数按列数换算
+_RECORD_INSERT_PARAMS = 2000
+_RECORD_INSERT_COLUMNS = (
+    "species_id", "device_id", "time", "latitude", "longitude", "monitoring_method",
+    "image_path", "count", "behavior", "state", "recorder_id",
+)
+
+# 分析员工作队列中各队列的待处理条件（r 为物种监测记录表的别名）
+REVIEW_QUEUE_CONDITIONS = {
+    "verify": "r.state = N'待核实'",
+    "analysis": "r.state = N'有效' AND r.analysis_conclusion IS NULL",
+}
+
 
 class BiodiversityQueries:
     # ======================
@@ -205,6 +221,128 @@ class BiodiversityQueries:
         """)
         return db.execute(stmt).fetchall()
 
+    @staticmethod
+    def count_records_by_method_and_state(db: Session) -> List[tuple]:
+        """一次扫描返回 (监测方式, 状态, 数量)，总数、待核实数、各方式数量都由此汇总"""
+        stmt = text("""
+            SELECT monitoring_method, state, COUNT(*) as count
+            FROM 物种监测记录表
+            GROUP BY monitoring_method, state
+        """)
+        return db.execute(stmt).fetchall()
+
+    @staticmethod
+    def list_species_with_record_counts(db: Session) -> List[tuple]:
+        """分类树整体加载用：全部物种的分类字段及各自的监测记录数，一次查询"""
+        stmt = text("""
+            SELECT s.id, s.chinese_name, s.latin_name, s.kingdom, s.phylum, s.class_name, s.[order],
+                   s.family, s.genus, s.species, s.protect_level, ISNULL(r.cnt, 0) AS record_count
+            FROM 物种表 s
+            LEFT JOIN (
+                SELECT species_id, COUNT(*) AS cnt
+                FROM 物种监测记录表
+                GROUP BY species_id
+            ) r ON r.species_id = s.id
+        """)
+        return db.execute(stmt).fetchall()
+
+    @staticmethod
+    def aggregate_valid_records_by_area_month(
+        db: Session, start: datetime, end: datetime, end_inclusive: bool = False
+    ) -> List[tuple]:
+        """多样性指数用：[start, end)（end_inclusive 时为 [start, end]）内有效记录按 (部署区域, 月份, 物种)
+        汇总个体数和记录数；记录经监测设备的部署区域归属到区域，count 为空按 1 只计"""
+        stmt = text("""
+            SELECT d.deployment_area_id AS area_id,
+                   DATEFROMPARTS(YEAR(r.time), MONTH(r.time), 1) AS period,
+                   r.species_id,
+                   SUM(ISNULL(r.count, 1)) AS individuals,
+                   COUNT(*) AS records
+            FROM 物种监测记录表 r
+            JOIN 监测设备表 d ON d.id = r.device_id
+            WHERE r.state = N'有效'
+              AND r.time >= :start AND r.time {end_op} :end
+              AND d.deployment_area_id IS NOT NULL
+            GROUP BY d.deployment_area_id, DATEFROMPARTS(YEAR(r.time), MONTH(r.time), 1), r.species_id
+        """.format(end_op="<=" if end_inclusive else "<"))
+        return db.execute(stmt, {"start": start, "end": end}).fetchall()
+
+    @staticmethod
+    def get_area_boundary_extent(db: Session, area_id: int) -> Optional[tuple]:
+        """区域边界的外包矩形 (min_lat, min_lng, max_lat, max_lng)，没有边界时返回 None"""
+        row = db.execute(
+            text("SELECT MinLat, MinLng, MaxLat, MaxLng FROM dbo.AreaBoundaries WHERE AreaId = :a"),
+            {"a": area_id},
+        ).first()
+        return tuple(row) if row else None
+
+    @staticmethod
+    def upsert_area_boundary(db: Session, area_id: int, wkt: str, extent: tuple) -> None:
+        """写入区域边界；geography 多边形按左手规则，顶点顺序相反时取其补集，因此按外包角度纠正方向"""
+        min_lat, min_lng, max_lat, max_lng = extent
+        db.execute(
+            text("""
+                DECLARE @g GEOGRAPHY = geography::STGeomFromText(:wkt, 4326).MakeValid();
+                IF @g.EnvelopeAngle() > 90 SET @g = @g.ReorientObject();
+                MERGE dbo.AreaBoundaries WITH (HOLDLOCK) AS t
+                USING (SELECT :area_id AS AreaId) AS s ON t.AreaId = s.AreaId
+                WHEN MATCHED THEN UPDATE SET Boundary = @g, MinLat = :min_lat, MinLng = :min_lng,
+                    MaxLat = :max_lat, MaxLng = :max_lng, UpdatedAt = SYSUTCDATETIME()
+                WHEN NOT MATCHED THEN INSERT (AreaId, Boundary, MinLat, MinLng, MaxLat, MaxLng)
+                    VALUES (:area_id, @g, :min_lat, :min_lng, :max_lat, :max_lng);
+            """),
+            {"wkt": wkt, "area_id": area_id, "min_lat": min_lat, "min_lng": min_lng,
+             "max_lat": max_lat, "max_lng": max_lng},
+        )
+
+    @staticmethod
+    def get_area_boundary(db: Session, area_id: int) -> Optional[dict]:
+        row = db.execute(
+            text("""
+                SELECT AreaId, Boundary.STAsText() AS Wkt, MinLat, MinLng, MaxLat, MaxLng, UpdatedAt
+                FROM dbo.AreaBoundaries WHERE AreaId = :a
+            """),
+            {"a": area_id},
+        ).mappings().first()
+        return dict(row) if row else None
+
+    @staticmethod
+    def list_sightings_in_cell_ranges(db: Session, ranges: Sequence[tuple]) -> List[tuple]:
+        """地图内存网格加载：按网格编号区间读取点位（走 idx_grid_cell）"""
+        params = {}
+        clauses = []
+        for i, (lo, hi) in enumerate(ranges):
+            clauses.append(f"grid_cell BETWEEN :lo{i} AND :hi{i}")
+            params[f"lo{i}"] = lo
+            params[f"hi{i}"] = hi
+        stmt = text(f"""
+            SELECT id, species_id, latitude, longitude, time, state, [count]
+            FROM 物种监测记录表
+            WHERE {" OR ".join(clauses)}
+        """)
+        return db.execute(stmt, params).fetchall()
+
+    @staticmethod
+    def list_sightings_in_bbox(db: Session, bbox: tuple) -> List[tuple]:
+        min_lat, min_lng, max_lat, max_lng = bbox
+        stmt = text("""
+            SELECT id, species_id, latitude, longitude, time, state, [count]
+            FROM 物种监测记录表
+            WHERE latitude >= :min_lat AND latitude < :max_lat
+              AND longitude >= :min_lng AND longitude < :max_lng
+        """)
+        return db.execute(stmt, {"min_lat": min_lat, "min_lng": min_lng, "max_lat": max_lat, "max_lng": max_lng}).fetchall()
+
+    @staticmethod
+    def list_valid_occurrences(db: Session) -> List[tuple]:
+        """分布点聚合整体加载：有坐标的有效记录"""
+        stmt = text("""
+            SELECT id, species_id, latitude, longitude
+            FROM 物种监测记录表
+            WHERE state = N'有效' AND latitude IS NOT NULL AND longitude IS NOT NULL
+        """)
+        return db.execute(stmt).fetchall()
+
     @staticmethod
     def count_valid_records_last_30_days(db: Session) -> int:
         """过去30天有效监测记录数"""
@@ -216,3 +354,485 @@ class BiodiversityQueries:
                 models.物种监测记录表.time >= thirty_days_ago
             ))
         ) or 0
+
+    # ======================
+    # 物种监测汇总 (SpeciesSummary / SpeciesMonthlyCounts)
+    # ======================
+
+    @staticmethod
+    def apply_species_summary_delta(db: Session, species_rows: Sequence[tuple], month_rows: Sequence[tuple]) -> None:
+        """按增量更新汇总，调用方负责事务。
+        species_rows 为 (物种, 记录数, 数量之和, 有数量的记录数, 新增记录的最晚时间, 移除记录的最晚时间)，
+        month_rows 为 (物种, 月份, 记录数)；移除了不早于最近监测时间的记录时按监测记录重新取最近监测时间"""
+        for start in range(0, len(species_rows), 300):
+            chunk = species_rows[start:start + 300]
+            values = []
+            params: dict = {}
+            for i, row in enumerate(chunk):
+                values.append(f"(:s{i}, :r{i}, :cs{i}, :cn{i}, :am{i}, :rm{i})")
+                params.update({f"s{i}": row[0], f"r{i}": row[1], f"cs{i}": row[2], f"cn{i}": row[3],
+                               f"am{i}": row[4], f"rm{i}": row[5]})
+            db.execute(text(f"""
+                SET NOCOUNT ON;
+                DECLARE @d TABLE (
+                    SpeciesId INT PRIMARY KEY, Records INT, CountSum BIGINT, CountSamples INT,
+                    AddedMax DATETIME NULL, RemovedMax DATETIME NULL
+                );
+                INSERT INTO @d VALUES {', '.join(values)};
+                MERGE dbo.SpeciesSummary WITH (HOLDLOCK) AS t
+                USING @d AS d ON t.SpeciesId = d.SpeciesId
+                WHEN MATCHED THEN UPDATE SET
+                    Records = t.Records + d.Records,
+                    CountSum = t.CountSum + d.CountSum,
+                    CountSamples = t.CountSamples + d.CountSamples,
+                    LastSeen = CASE WHEN d.AddedMax > t.LastSeen OR t.LastSeen IS NULL THEN d.AddedMax ELSE t.LastSeen END,
+                    UpdatedAt = SYSUTCDATETIME()
+                WHEN NOT MATCHED AND d.Records > 0 THEN
+                    INSERT (SpeciesId, Records, CountSum, CountSamples, LastSeen)
+                    VALUES (d.SpeciesId, d.Records, d.CountSum, d.CountSamples, d.AddedMax);
+                UPDATE s SET LastSeen = (
+                    SELECT MAX(m.time) FROM 物种监测记录表 m WHERE m.species_id = s.SpeciesId AND m.state = N'有效'
+                )
+                FROM dbo.SpeciesSummary s
+                JOIN @d d ON d.SpeciesId = s.SpeciesId
+                WHERE d.RemovedMax IS NOT NULL AND s.LastSeen <= d.RemovedMax;
+            """), params)
+        for start in range(0, len(month_rows), 600):
+            chunk = month_rows[start:start + 600]
+            values = []
+            params = {}
+            for i, (species_id, month, records) in enumerate(chunk):
+                values.append(f"(:s{i}, :m{i}, :r{i})")
+                params.update({f"s{i}": species_id, f"m{i}": month, f"r{i}": records})
+            db.execute(text(f"""
+                SET NOCOUNT ON;
+                DECLARE @d TABLE (SpeciesId INT, Month DATE, Records INT, PRIMARY KEY (SpeciesId, Month));
+                INSERT INTO @d VALUES {', '.join(values)};
+                MERGE dbo.SpeciesMonthlyCounts WITH (HOLDLOCK) AS t
+                USING @d AS d ON t.SpeciesId = d.SpeciesId AND t.Month = d.Month
+                WHEN MATCHED THEN UPDATE SET Records = t.Records + d.Records
+                WHEN NOT MATCHED THEN INSERT (SpeciesId, Month, Records) VALUES (d.SpeciesId, d.Month, d.Records);
+                DELETE t FROM dbo.SpeciesMonthlyCounts t
+                JOIN @d d ON d.SpeciesId = t.SpeciesId AND d.Month = t.Month
+                WHERE t.Records <= 0;
+            """), params)
+
+    @staticmethod
+    def rebuild_species_summary(db: Session, species_ids: Optional[Sequence[int]] = None) -> int:
+        """按有效监测记录重建汇总（species_ids 为空时重建全部物种），返回汇总行数；调用方负责事务"""
+        params: dict = {}
+        if species_ids is not None:
+            if not species_ids:
+                return 0
+            names = []
+            for i, sid in enumerate(species_ids):
+                params[f"sid{i}"] = sid
+                names.append(f":sid{i}")
+            ids = ", ".join(names)
+            only_summary = f"WHERE SpeciesId IN ({ids})"
+            only_species = f"WHERE s.id IN ({ids})"
+            only_records = f"AND species_id IN ({ids})"
+        else:
+            only_summary = only_species = only_records = ""
+        stmt = text(f"""
+            SET NOCOUNT ON;
+            DELETE FROM dbo.SpeciesMonthlyCounts {only_summary};
+            DELETE FROM dbo.SpeciesSummary {only_summary};
+            INSERT INTO dbo.SpeciesSummary (SpeciesId, Records, CountSum, CountSamples, LastSeen)
+            SELECT s.id, COUNT(m.id), ISNULL(SUM(CAST(m.[count] AS BIGINT)), 0), COUNT(m.[count]), MAX(m.time)
+            FROM 物种表 s
+            LEFT JOIN 物种监测记录表 m ON m.species_id = s.id AND m.state = N'有效'
+            {only_species}
+            GROUP BY s.id;
+            INSERT INTO dbo.SpeciesMonthlyCounts (SpeciesId, Month, Records)
+            SELECT species_id, DATEFROMPARTS(YEAR(time), MONTH(time), 1), COUNT(*)
+            FROM 物种监测记录表
+            WHERE state = N'有效' {only_records}
+            GROUP BY species_id, DATEFROMPARTS(YEAR(time), MONTH(time), 1);
+            SELECT COUNT(*) FROM dbo.SpeciesSummary {only_summary};
+        """)
+        return db.execute(stmt, params).scalar() or 0
+
+    @staticmethod
+    def get_species_summaries(db: Session, species_ids: Sequence[int], since_month: datetime) -> List[tuple]:
+        """物种汇总及 since_month 以来的记录数"""
+        if not species_ids:
+            return []
+        params: dict = {"since": since_month}
+        names = []
+        for i, sid in enumerate(species_ids):
+            params[f"sid{i}"] = sid
+            names.append(f":sid{i}")
+        stmt = text(f"""
+            SELECT s.SpeciesId AS species_id, s.Records AS records, s.CountSum AS count_sum,
+                   s.CountSamples AS count_samples, s.LastSeen AS last_seen,
+                   ISNULL((
+                       SELECT SUM(c.Records) FROM dbo.SpeciesMonthlyCounts c
+                       WHERE c.SpeciesId = s.SpeciesId AND c.Month >= :since
+                   ), 0) AS recent_records
+            FROM dbo.SpeciesSummary s
+            WHERE s.SpeciesId IN ({', '.join(names)})
+        """)
+        return db.execute(stmt, params).fetchall()
+
+    @staticmethod
+    def get_species_monthly_counts(db: Session, species_id: int, since_month: datetime) -> List[tuple]:
+        return db.execute(
+            text("""
+                SELECT Month AS month, Records AS records FROM dbo.SpeciesMonthlyCounts
+                WHERE SpeciesId = :species_id AND Month >= :since
+                ORDER BY Month
+            """),
+            {"species_id": species_id, "since": since_month},
+        ).fetchall()
+
+    # ======================
+    # 批量核实 / 批量分析结论
+    # ======================
+
+    @staticmethod
+    def batch_where(
+        record_ids: Optional[Sequence[int]] = None,
+        species_id: Optional[int] = None,
+        device_id: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> tuple:
+        """批量操作的筛选条件：编号列表或 (物种, 设备, 时间范围)，返回 (SQL 片段, 参数)"""
+        clauses: List[str] = []
+        params: dict = {}
+        if record_ids is not None:
+            names = []
+            for i, rid in enumerate(record_ids):
+                params[f"rid{i}"] = rid
+                names.append(f":rid{i}")
+            clauses.append(f"id IN ({', '.join(names)})")
+        if species_id is not None:
+            clauses.append("species_id = :f_species_id")
+            params["f_species_id"] = species_id
+        if device_id is not None:
+            clauses.append("device_id = :f_device_id")
+            params["f_device_id"] = device_id
+        if start_date is not None:
+            clauses.append("time >= :f_start")
+            params["f_start"] = start_date
+        if end_date is not None:
+            clauses.append("time <= :f_end")
+            params["f_end"] = end_date
+        return " AND ".join(clauses) or "1 = 1", params
+
+    @staticmethod
+    def verify_pending_chunk(
+        db: Session, where: str, params: dict, after_id: int, limit: int, release_claims: bool = False
+    ) -> List[tuple]:
+        """按编号顺序核实一块待核实记录，返回被修改的记录（编号、物种、设备、方式、时间、坐标、数量）；
+        表上有触发器，OUTPUT 需写入表变量。release_claims 为 True 时同时删除这些记录在核实队列中的领取"""
+        release = (
+            "DELETE c FROM dbo.RecordReviewClaims c JOIN @changed ch ON ch.id = c.RecordId WHERE c.Queue = 'verify';"
+            if release_claims else ""
+        )
+        stmt = text(f"""
+            SET NOCOUNT ON;
+            DECLARE @changed TABLE (
+                id INT, species_id INT, device_id INT, monitoring_method NVARCHAR(20), time DATETIME,
+                latitude FLOAT, longitude FLOAT, [count] INT
+            );
+            WITH chunk AS (
+                SELECT TOP (:limit) *
+                FROM 物种监测记录表
+                WHERE state = N'待核实' AND id > :after_id AND {where}
+                ORDER BY id
+            )
+            UPDATE chunk SET state = N'有效', updated_at = GETDATE()
+            OUTPUT inserted.id, inserted.species_id, inserted.device_id, inserted.monitoring_method, inserted.time,
+                   inserted.latitude, inserted.longitude, inserted.[count]
+            INTO @changed;
+            {release}
+            SELECT id, species_id, device_id, monitoring_method, time, latitude, longitude, [count]
+            FROM @changed ORDER BY id;
+        """)
+        return db.execute(stmt, {**params, "after_id": after_id, "limit": limit}).fetchall()
+
+    @staticmethod
+    def conclude_valid_chunk(
+        db: Session,
+        where: str,
+        params: dict,
+        after_id: int,
+        limit: int,
+        conclusion: str,
+        confidence_level: str,
+        analyst_id: int,
+        analysis_time: datetime,
+        overwrite: bool,
+        release_claims: bool = False,
+    ) -> List[int]:
+        """为一块有效记录写入同一分析结论，返回被修改的编号；
+        release_claims 为 True 时同时删除这些记录在分析队列中的领取"""
+        only_new = "" if overwrite else "AND analysis_conclusion IS NULL"
+        release = (
+            "DELETE c FROM dbo.RecordReviewClaims c JOIN @changed ch ON ch.id = c.RecordId WHERE c.Queue = 'analysis';"
+            if release_claims else ""
+        )
+        stmt = text(f"""
+            SET NOCOUNT ON;
+            DECLARE @changed TABLE (id INT);
+            WITH chunk AS (
+                SELECT TOP (:limit) *
+                FROM 物种监测记录表
+                WHERE state = N'有效' AND id > :after_id AND {where} {only_new}
+                ORDER BY id
+            )
+            UPDATE chunk SET analysis_conclusion = :conclusion, confidence_level = :confidence_level,
+                             analyst_id = :analyst_id, analysis_time = :analysis_time
+            OUTPUT inserted.id INTO @changed;
+            {release}
+            SELECT id FROM @changed ORDER BY id;
+        """)
+        return [r[0] for r in db.execute(stmt, {
+            **params,
+            "after_id": after_id,
+            "limit": limit,
+            "conclusion": conclusion,
+            "confidence_level": confidence_level,
+            "analyst_id": analyst_id,
+            "analysis_time": analysis_time,
+        }).fetchall()]
+
+    # ======================
+    # 红外相机连拍去重
+    # ======================
+
+    @staticmethod
+    def list_burst_window(db: Session, device_id: int, start: datetime, end: datetime) -> List[tuple]:
+        """设备在时间段内的红外相机记录，按时间排序"""
+        return db.execute(
+            text("""
+                SELECT id, species_id, state, time, latitude, longitude
+                FROM 物种监测记录表
+                WHERE device_id = :device_id AND time BETWEEN :start AND :end
+                  AND monitoring_method = N'红外相机'
+                ORDER BY time, id
+            """),
+            {"device_id": device_id, "start": start, "end": end},
+        ).fetchall()
+
+    @staticmethod
+    def merge_burst_duplicates(
+        db: Session,
+        state: str,
+        count: Optional[int],
+        n: int,
+        with_duplicate_count: bool,
+        record_id: Optional[int] = None,
+        device_id: Optional[int] = None,
+        species_id: Optional[int] = None,
+        time: Optional[datetime] = None,
+    ) -> Optional[int]:
+        """把 n 条连拍记录并入已有记录（个体数取较大值），返回被并入的记录编号；
+        没有编号时按 (设备, 物种, 时间) 定位。记录已删除或状态已变化时返回 None"""
+        params: dict = {"state": state, "n": n}
+        if record_id is not None:
+            where = "id = :record_id"
+            params["record_id"] = record_id
+        else:
+            where = "device_id = :device_id AND species_id = :species_id AND time = :time AND monitoring_method = N'红外相机'"
+            params.update(device_id=device_id, species_id=species_id, time=time)
+        sets = ["updated_at = GETDATE()"]
+        if count is not None:
+            sets.append("[count] = CASE WHEN [count] IS NULL OR [count] < :count THEN :count ELSE [count] END")
+            params["count"] = count
+        if with_duplicate_count:
+            sets.append("duplicate_count = duplicate_count + :n")
+        stmt = text(f"""
+            SET NOCOUNT ON;
+            DECLARE @merged TABLE (id INT);
+            UPDATE TOP (1) 物种监测记录表 SET {', '.join(sets)}
+            OUTPUT inserted.id INTO @merged
+            WHERE {where} AND state = :state;
+            SELECT id FROM @merged;
+        """)
+        return db.execute(stmt, params).scalar()
+
+    @staticmethod
+    def list_burst_devices(
+        db: Session, device_id: Optional[int], start: Optional[datetime], end: Optional[datetime]
+    ) -> List[int]:
+        clauses = ["device_id IS NOT NULL", "monitoring_method = N'红外相机'"]
+        params: dict = {}
+        if device_id is not None:
+            clauses.append("device_id = :device_id")
+            params["device_id"] = device_id
+        if start is not None:
+            clauses.append("time >= :start")
+            params["start"] = start
+        if end is not None:
+            clauses.append("time <= :end")
+            params["end"] = end
+        return [r[0] for r in db.execute(
+            text(f"SELECT DISTINCT device_id FROM 物种监测记录表 WHERE {' AND '.join(clauses)} ORDER BY device_id"),
+            params,
+        ).fetchall()]
+
+    @staticmethod
+    def list_burst_sweep_rows(
+        db: Session,
+        device_id: int,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        with_duplicate_count: bool,
+    ) -> List[tuple]:
+        """历史重跑：设备的红外相机记录，按 (物种, 状态, 时间) 排序"""
+        clauses = ["device_id = :device_id", "monitoring_method = N'红外相机'"]
+        params: dict = {"device_id": device_id}
+        if start is not None:
+            clauses.append("time >= :start")
+            params["start"] = start
+        if end is not None:
+            clauses.append("time <= :end")
+            params["end"] = end
+        duplicate_count = "duplicate_count" if with_duplicate_count else "0 AS duplicate_count"
+        return db.execute(
+            text(f"""
+                SELECT id, species_id, state, time, latitude, longitude, [count], image_path, {duplicate_count}
+                FROM 物种监测记录表
+                WHERE {' AND '.join(clauses)}
+                ORDER BY species_id, state, time, id
+            """),
+            params,
+        ).fetchall()
+
+    @staticmethod
+    def apply_burst_merges(db: Session, updates: Sequence[tuple], with_duplicate_count: bool) -> None:
+        """updates 为 (编号, 个体数, 并入记录数)；每条语句 600 行 × 3 个参数"""
+        sets = "[count] = v.cnt" + (", duplicate_count = v.dup" if with_duplicate_count else "")
+        for start in range(0, len(updates), 600):
+            chunk = updates[start:start + 600]
+            values = []
+            params: dict = {}
+            for i, (record_id, count, duplicates) in enumerate(chunk):
+                values.append(f"(:id{i}, CAST(:cnt{i} AS INT), :dup{i})")
+                params.update({f"id{i}": record_id, f"cnt{i}": count, f"dup{i}": duplicates})
+            db.execute(text(f"""
+                UPDATE r SET {sets}, updated_at = GETDATE()
+                FROM 物种监测记录表 r
+                JOIN (VALUES {', '.join(values)}) AS v(id, cnt, dup) ON v.id = r.id
+            """), params)
+
+    @staticmethod
+    def delete_monitoring_records(db: Session, record_ids: Sequence[int]) -> int:
+        deleted = 0
+        for start in range(0, len(record_ids), BATCH_UPDATE_CHUNK):
+            chunk = record_ids[start:start + BATCH_UPDATE_CHUNK]
+            params = {f"rid{i}": rid for i, rid in enumerate(chunk)}
+            deleted += db.execute(
+                text(f"DELETE FROM 物种监测记录表 WHERE id IN ({', '.join(':' + k for k in params)})"), params
+            ).rowcount
+        return deleted
+
+    # ======================
+    # 分析员工作队列 (RecordReviewClaims)
+    # ======================
+
+    @staticmethod
+    def claim_review_records(db: Session, queue: str, analyst_id: int, limit: int, lease_seconds: int) -> int:
+        """按编号顺序领取最多 limit 条未被领取（或租约已过期）的记录，返回领取条数。
+        候选记录加 UPDLOCK 并以 READPAST 跳过其他分析员正在领取的行，
+        并发领取的分析员各自拿到不同的记录而不是互相等待"""
+        stmt = text(f"""
+            SET NOCOUNT ON;
+            DELETE FROM dbo.RecordReviewClaims WHERE Queue = :queue AND LeaseExpiresAt <= SYSUTCDATETIME();
+            INSERT INTO dbo.RecordReviewClaims (Queue, RecordId, AnalystId, ClaimedAt, LeaseExpiresAt)
+            SELECT TOP (:limit) :queue, r.id, :analyst_id, SYSUTCDATETIME(),
+                   DATEADD(SECOND, :lease_seconds, SYSUTCDATETIME())
+            FROM 物种监测记录表 r WITH (UPDLOCK, READPAST, ROWLOCK)
+            WHERE {REVIEW_QUEUE_CONDITIONS[queue]}
+              AND NOT EXISTS (
+                  SELECT 1 FROM dbo.RecordReviewClaims c WITH (READPAST)
+                  WHERE c.Queue = :queue AND c.RecordId = r.id
+              )
+            ORDER BY r.id;
+            SELECT @@ROWCOUNT;
+        """)
+        return db.execute(stmt, {
+            "queue": queue, "analyst_id": analyst_id, "limit": limit, "lease_seconds": lease_seconds,
+        }).scalar() or 0
+
+    @staticmethod
+    def list_review_claims(db: Session, queue: str, analyst_id: int) -> List[tuple]:
+        """分析员在队列中租约未过期、且记录仍待处理的领取（record_id, lease_expires_at）"""
+        stmt = text(f"""
+            SELECT c.RecordId AS record_id, c.LeaseExpiresAt AS lease_expires_at
+            FROM dbo.RecordReviewClaims c
+            JOIN 物种监测记录表 r ON r.id = c.RecordId
+            WHERE c.AnalystId = :analyst_id AND c.Queue = :queue
+              AND c.LeaseExpiresAt > SYSUTCDATETIME()
+              AND {REVIEW_QUEUE_CONDITIONS[queue]}
+            ORDER BY c.RecordId
+        """)
+        return db.execute(stmt, {"queue": queue, "analyst_id": analyst_id}).fetchall()
+
+    @staticmethod
+    def renew_review_claims(db: Session, queue: str, analyst_id: int, lease_seconds: int) -> int:
+        """延长分析员在队列中未过期的全部租约，返回续约条数"""
+        return db.execute(
+            text("""
+                UPDATE dbo.RecordReviewClaims
+                SET LeaseExpiresAt = DATEADD(SECOND, :lease_seconds, SYSUTCDATETIME())
+                WHERE AnalystId = :analyst_id AND Queue = :queue AND LeaseExpiresAt > SYSUTCDATETIME()
+            """),
+            {"queue": queue, "analyst_id": analyst_id, "lease_seconds": lease_seconds},
+        ).rowcount
+
+    @staticmethod
+    def delete_review_claims(
+        db: Session,
+        queue: str,
+        analyst_id: Optional[int] = None,
+        record_ids: Optional[Sequence[int]] = None,
+    ) -> int:
+        """删除领取：analyst_id 为空时不限分析员（记录已处理），record_ids 为空时不限记录"""
+        clauses = ["Queue = :queue"]
+        params: dict = {"queue": queue}
+        if analyst_id is not None:
+            clauses.append("AnalystId = :analyst_id")
+            params["analyst_id"] = analyst_id
+        if record_ids is not None:
+            if not record_ids:
+                return 0
+            names = []
+            for i, rid in enumerate(record_ids):
+                params[f"rid{i}"] = rid
+                names.append(f":rid{i}")
+            clauses.append(f"RecordId IN ({', '.join(names)})")
+        return db.execute(
+            text(f"DELETE FROM dbo.RecordReviewClaims WHERE {' AND '.join(clauses)}"), params
+        ).rowcount
+
+    # ======================
+    # 批量导入
+    # ======================
+
+    @staticmethod
+    def list_species_ids(db: Session) -> Set[int]:
+        return set(db.scalars(select(models.物种表.id)).all())
+
+    @staticmethod
+    def list_device_ids(db: Session) -> Set[int]:
+        return {r[0] for r in db.execute(text("SELECT id FROM 监测设备表")).all()}
+
+    @staticmethod
+    def bulk_insert_monitoring_records(db: Session, rows: Sequence[dict], extra_columns: Sequence[str] = ()) -> int:
+        """多行 INSERT 分块写入，调用方负责事务；extra_columns 为可选列（如 duplicate_count）"""
+        names = tuple(_RECORD_INSERT_COLUMNS) + tuple(extra_columns)
+        columns = ", ".join(f"[{c}]" for c in names)
+        chunk_rows = _RECORD_INSERT_PARAMS // len(names)
+        for start in range(0, len(rows), chunk_rows):
+            chunk = rows[start:start + chunk_rows]
+            values = []
+            params: dict = {}
+            for i, row in enumerate(chunk):
+                values.append("(" + ", ".join(f":{c}_{i}" for c in names) + ")")
+                params.update({f"{c}_{i}": row.get(c) for c in names})
+            db.execute(text(f"INSERT INTO 物种监测记录表 ({columns}) VALUES {', '.join(values)}"), params)
+        return len(rows)
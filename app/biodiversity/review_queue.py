@@ -0,0 +1,97 @@
+"""
+分析员工作队列
+多名分析员同时处理待核实记录（verify 队列）或待填写分析结论的有效记录（analysis 队列）时，
+每人先领取一批记录，领取带租约并记录在 RecordReviewClaims 表中：
+领取时跳过他人持有的记录（并发领取以 UPDLOCK + READPAST 互不等待），
+“我的记录”只列出自己持有的记录，不再对整个待处理集合分页和 COUNT。
+
+核实或填写结论（单条或批量）后对应的领取随之删除；租约到期未处理的记录在下一次领取时回到队列，
+分析员可以续约或主动释放。
+"""
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.schema_registry import schema
+
+from .models import 物种监测记录表
+from .queries import REVIEW_QUEUE_CONDITIONS, BiodiversityQueries
+
+CLAIMS_TABLE = "RecordReviewClaims"
+
+
+def claims_enabled(db: Session) -> bool:
+    return schema.ensure(db).has_table(CLAIMS_TABLE)
+
+
+class ReviewQueueService:
+    @staticmethod
+    def _check(db: Session, queue: str) -> None:
+        if queue not in REVIEW_QUEUE_CONDITIONS:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="工作队列不存在")
+        if not claims_enabled(db):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="工作队列未启用：缺少 RecordReviewClaims 表（sql_scripts/ddl/biodiversity_tables.sql）",
+            )
+
+    @staticmethod
+    def list_claimed(db: Session, queue: str, analyst_id: int, claimed: int = 0) -> Dict[str, Any]:
+        """分析员在队列中持有的记录；lease_expires_at 为其中最早到期的租约（UTC）"""
+        ReviewQueueService._check(db, queue)
+        claims = BiodiversityQueries.list_review_claims(db, queue, analyst_id)
+        records: List[物种监测记录表] = []
+        if claims:
+            records = db.scalars(
+                select(物种监测记录表)
+                .where(物种监测记录表.id.in_([c.record_id for c in claims]))
+                .order_by(物种监测记录表.id)
+            ).all()
+        return {
+            "queue": queue,
+            "claimed": claimed,
+            "total": len(records),
+            "lease_expires_at": min((c.lease_expires_at for c in claims), default=None),
+            "records": records,
+        }
+
+    @staticmethod
+    def claim(db: Session, queue: str, analyst_id: int, size: int) -> Dict[str, Any]:
+        """领取记录，使分析员持有的记录数补足到 size（不超过 review_max_claimed），返回持有的全部记录"""
+        ReviewQueueService._check(db, queue)
+        held = len(BiodiversityQueries.list_review_claims(db, queue, analyst_id))
+        want = min(size, settings.review_max_claimed) - held
+        claimed = 0
+        if want > 0:
+            claimed = BiodiversityQueries.claim_review_records(
+                db, queue, analyst_id, want, settings.review_lease_seconds
+            )
+            db.commit()
+        return ReviewQueueService.list_claimed(db, queue, analyst_id, claimed=claimed)
+
+    @staticmethod
+    def renew(db: Session, queue: str, analyst_id: int) -> Dict[str, Any]:
+        """续约持有的全部记录；已过期的租约不能续约，需重新领取"""
+        ReviewQueueService._check(db, queue)
+        renewed = BiodiversityQueries.renew_review_claims(db, queue, analyst_id, settings.review_lease_seconds)
+        db.commit()
+        return {"queue": queue, "renewed": renewed, "lease_seconds": settings.review_lease_seconds}
+
+    @staticmethod
+    def release(db: Session, queue: str, analyst_id: int, record_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """放回队列；record_ids 为空时释放持有的全部记录"""
+        ReviewQueueService._check(db, queue)
+        released = BiodiversityQueries.delete_review_claims(
+            db, queue, analyst_id=analyst_id, record_ids=sorted(set(record_ids)) if record_ids is not None else None
+        )
+        db.commit()
+        return {"queue": queue, "released": released}
+
+    @staticmethod
+    def complete(db: Session, queue: str, record_ids: List[int]) -> None:
+        """记录已核实 / 已填写结论：删除其领取（不论领取人），与记录的修改在同一事务中提交"""
+        if claims_enabled(db):
+            BiodiversityQueries.delete_review_claims(db, queue, record_ids=record_ids)
@@ -2,9 +2,11 @@ from __future__ import annotations
 
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, computed_field, model_validator
+
+from app.media.store import derivative_url
 
 
 class ProtectLevel(str, Enum):
@@ -24,6 +26,11 @@ class DataStatus(str, Enum):
     PENDING_VERIFICATION = "待核实"
 
 
+class ReviewQueue(str, Enum):
+    VERIFY = "verify"  # 待核实记录
+    ANALYSIS = "analysis"  # 尚无分析结论的有效记录
+
+
 class SpeciesBase(BaseModel):
     chinese_name: str = Field(..., min_length=1, max_length=100)
     latin_name: Optional[str] = Field(None, max_length=100)
@@ -62,8 +69,17 @@ class SpeciesUpdate(BaseModel):
     distribution_range: Optional[str] = None
 
 
+class SpeciesMonitoringSummary(BaseModel):
+    monitoring_count: int = 0  # 有效监测记录数
+    last_seen: Optional[datetime] = None
+    average_count: Optional[float] = None  # 平均观测数量（只计填写了数量的记录）
+    monthly_frequency: float = 0.0  # 最近若干个月的月均监测次数
+    by_month: Optional[Dict[str, int]] = None  # 仅物种详情：最近若干个月逐月记录数
+
+
 class SpeciesResponse(SpeciesBase):
     id: int
+    summary: Optional[SpeciesMonitoringSummary] = None  # 物种列表和详情返回，未建汇总表时为空
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -112,6 +128,16 @@ class MonitoringRecordResponse(MonitoringRecordBase):
     confidence_level: Optional[str] = None
     model_config = ConfigDict(from_attributes=True)
 
+    @computed_field
+    @property
+    def thumbnail_url(self) -> Optional[str]:
+        return derivative_url(self.image_path, "thumb")
+
+    @computed_field
+    @property
+    def preview_url(self) -> Optional[str]:
+        return derivative_url(self.image_path, "preview")
+
 
 class MonitoringRecordQueryParams(BaseModel):
     species_id: Optional[int] = None
@@ -122,6 +148,10 @@ class MonitoringRecordQueryParams(BaseModel):
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     area_id: Optional[int] = None
+    bbox: Optional[Tuple[float, float, float, float]] = None  # (min_lat, min_lng, max_lat, max_lng)
+    near_lat: Optional[float] = None
+    near_lng: Optional[float] = None
+    radius_m: Optional[float] = None
     page: int = 1
     page_size: int = 20
 
@@ -144,6 +174,73 @@ class AnalysisConclusionCreate(BaseModel):
     confidence_level: str = Field("中")
 
 
+class RecordBatchFilter(BaseModel):
+    species_id: Optional[int] = None
+    device_id: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+
+class RecordBatchTarget(BaseModel):
+    # 二选一：记录编号列表，或按物种 / 设备 / 时间范围筛选（至少一个条件）
+    record_ids: Optional[List[int]] = Field(None, min_length=1, max_length=100000)
+    filter: Optional[RecordBatchFilter] = None
+
+    @model_validator(mode="after")
+    def _one_target(self):
+        if (self.record_ids is None) == (self.filter is None):
+            raise ValueError("record_ids 与 filter 需且只需提供一个")
+        if self.filter is not None and not any(
+            v is not None for v in self.filter.model_dump().values()
+        ):
+            raise ValueError("filter 至少需要一个条件")
+        return self
+
+
+class BatchVerifyRequest(RecordBatchTarget):
+    pass
+
+
+class BatchConclusionRequest(RecordBatchTarget):
+    conclusion: str = Field(..., min_length=1)
+    confidence_level: str = Field("中", pattern=r"^(高|中|低)$")
+    overwrite: bool = False  # 为 False 时跳过已有分析结论的记录
+
+
+class BurstDedupRequest(BaseModel):
+    device_id: Optional[int] = None  # 为空时处理全部设备
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    dry_run: bool = True  # 为 True 时只统计将合并的记录，不修改数据
+
+
+class ReviewClaimRequest(BaseModel):
+    size: int = Field(20, ge=1, le=200)  # 领取后持有的记录数
+
+
+class ReviewReleaseRequest(BaseModel):
+    record_ids: Optional[List[int]] = Field(None, min_length=1, max_length=2000)  # 为空时释放全部
+
+
+class ClaimedRecords(BaseModel):
+    queue: ReviewQueue
+    claimed: int  # 本次新领取的条数
+    total: int  # 当前持有的条数
+    lease_expires_at: Optional[datetime] = None  # 最早到期的租约（UTC）
+    records: List[MonitoringRecordResponse]
+
+
+class AreaBoundaryUpdate(BaseModel):
+    # GeoJSON 顺序：[[经度, 纬度], ...]，首尾可闭合也可不闭合
+    coordinates: List[List[float]] = Field(..., min_length=3)
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    total_size: int = Field(..., gt=0)
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$")
+
+
 class PaginatedResponse(BaseModel):
     total: int
     page: int
@@ -0,0 +1,279 @@
+"""
+监测记录空间查询
+物种监测记录表.grid_cell 是经纬度按 GRID_DEG 分格后的行优先编号（持久化计算列，写入时由数据库维护，
+公式见 sql_scripts/ddl/biodiversity_tables.sql），并建有索引。按视野范围（bbox）、按点和半径（near）、
+按区域边界多边形筛选时，先把范围换算成若干段连续的网格编号区间做索引查找，再用精确条件过滤。
+
+地图视图另有内存网格 SightingGrid：以 TILE_CELLS × TILE_CELLS 个基础网格为一块，
+按块从数据库加载点位并按最近使用保留 sighting_grid_max_tiles 块，视野查询只读取视野内的块；
+监测记录写入、修改、删除后使所在块失效，每块最多保留 sighting_grid_ttl_seconds（见 app/local_cache.py）。
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import literal_column, or_, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.local_cache import expired
+from app.schema_registry import schema
+
+from .queries import BiodiversityQueries
+
+GRID_DEG = 0.01
+GRID_SCALE = 100  # 1 / GRID_DEG，与建表公式一致使用乘法
+GRID_COLS = 360 * GRID_SCALE
+TILE_CELLS = 10  # 内存网格每块的边长（基础网格数），约 10 公里
+
+EARTH_RADIUS_M = 6371008.8
+_MAX_RANGES = 200  # 网格区间过多（视野过大）时不再使用网格预筛选
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lng, max_lat, max_lng)
+
+
+def grid_row(latitude: float) -> int:
+    return math.floor((latitude + 90) * GRID_SCALE)
+
+
+def grid_col(longitude: float) -> int:
+    return math.floor((longitude + 180) * GRID_SCALE)
+
+
+def grid_cell(latitude: float, longitude: float) -> int:
+    return grid_row(latitude) * GRID_COLS + grid_col(longitude)
+
+
+def cell_ranges(bbox: BBox) -> Optional[List[Tuple[int, int]]]:
+    """视野覆盖的网格编号区间，每个网格行一段；区间过多时返回 None"""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    r0, r1 = grid_row(min_lat), grid_row(max_lat)
+    c0, c1 = grid_col(min_lng), grid_col(max_lng)
+    if r1 - r0 + 1 > _MAX_RANGES:
+        return None
+    return [(r * GRID_COLS + c0, r * GRID_COLS + c1) for r in range(r0, r1 + 1)]
+
+
+def bbox_around(latitude: float, longitude: float, radius_m: float) -> BBox:
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    d_lng = min(math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat)), 180.0)
+    return (max(latitude - d_lat, -90.0), max(longitude - d_lng, -180.0),
+            min(latitude + d_lat, 90.0), min(longitude + d_lng, 180.0))
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def validate_bbox(bbox: BBox) -> None:
+    min_lat, min_lng, max_lat, max_lng = bbox
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= max_lng <= 180):
+        raise ValueError("视野范围无效")
+
+
+# ---------- list_records 的筛选条件 ----------
+
+def _has_grid(db: Session) -> bool:
+    return schema.ensure(db).has_column("物种监测记录表", "grid_cell")
+
+
+def bbox_conditions(db: Session, latitude_col, longitude_col, bbox: BBox) -> list:
+    """网格区间（走 idx_grid_cell）+ 精确的经纬度范围"""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    conditions = [latitude_col.between(min_lat, max_lat), longitude_col.between(min_lng, max_lng)]
+    ranges = cell_ranges(bbox) if _has_grid(db) else None
+    if ranges:
+        grid = literal_column("grid_cell")
+        conditions.insert(0, or_(*[grid.between(lo, hi) for lo, hi in ranges]))
+    return conditions
+
+
+def near_conditions(db: Session, latitude_col, longitude_col, latitude: float, longitude: float, radius_m: float) -> list:
+    conditions = bbox_conditions(db, latitude_col, longitude_col, bbox_around(latitude, longitude, radius_m))
+    conditions.append(
+        text(
+            "2 * :earth_r * ASIN(SQRT("
+            "POWER(SIN(RADIANS(latitude - :near_lat) / 2), 2)"
+            " + COS(RADIANS(:near_lat)) * COS(RADIANS(latitude)) * POWER(SIN(RADIANS(longitude - :near_lng) / 2), 2)"
+            ")) <= :near_radius"
+        ).bindparams(earth_r=EARTH_RADIUS_M, near_lat=latitude, near_lng=longitude, near_radius=radius_m)
+    )
+    return conditions
+
+
+def area_conditions(db: Session, latitude_col, longitude_col, area_id: int) -> list:
+    """有边界多边形的区域按点是否落在多边形内筛选；没有边界时按监测设备的部署区域筛选"""
+    boundary = None
+    if schema.ensure(db).has_table("AreaBoundaries"):
+        boundary = BiodiversityQueries.get_area_boundary_extent(db, area_id)
+    if boundary is None:
+        return [
+            text("device_id IN (SELECT id FROM 监测设备表 WHERE deployment_area_id = :device_area_id)").bindparams(
+                device_area_id=area_id
+            )
+        ]
+    conditions = bbox_conditions(db, latitude_col, longitude_col, boundary)
+    conditions.append(
+        text(
+            "EXISTS (SELECT 1 FROM dbo.AreaBoundaries b WHERE b.AreaId = :boundary_area_id"
+            " AND b.Boundary.STIntersects(geography::Point(latitude, longitude, 4326)) = 1)"
+        ).bindparams(boundary_area_id=area_id)
+    )
+    return conditions
+
+
+def polygon_wkt(coordinates: Sequence[Sequence[float]]) -> Tuple[str, BBox]:
+    """[[lng, lat], ...]（GeoJSON 顺序）转为闭合的 WKT POLYGON 及外包矩形"""
+    points = [(float(p[0]), float(p[1])) for p in coordinates]
+    if points and points[0] == points[-1]:
+        points = points[:-1]
+    if len(set(points)) < 3:
+        raise ValueError("边界至少需要 3 个不同的点")
+    for lng, lat in points:
+        if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+            raise ValueError(f"坐标超出范围：{lng}, {lat}")
+    ring = points + [points[0]]
+    wkt = "POLYGON((" + ", ".join(f"{lng!r} {lat!r}" for lng, lat in ring) + "))"
+    lats = [lat for _, lat in points]
+    lngs = [lng for lng, _ in points]
+    return wkt, (min(lats), min(lngs), max(lats), max(lngs))
+
+
+# ---------- 地图视图的内存网格 ----------
+
+class Sighting(NamedTuple):
+    record_id: int
+    species_id: int
+    latitude: float
+    longitude: float
+    time: datetime
+    state: str
+    count: Optional[int]
+
+
+Tile = Tuple[int, int]
+
+
+def tile_of(latitude: float, longitude: float) -> Tile:
+    return (grid_row(latitude) // TILE_CELLS, grid_col(longitude) // TILE_CELLS)
+
+
+class SightingGrid:
+    def __init__(self, max_tiles: int, ttl_seconds: float):
+        self.max_tiles = max_tiles
+        self.ttl_seconds = ttl_seconds
+        self._tiles: "OrderedDict[Tile, Tuple[float, List[Sighting]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def invalidate(self, points: Iterable[Tuple[Optional[float], Optional[float]]]) -> None:
+        """监测记录写入后调用，传入受影响记录的坐标（修改坐标时新旧坐标都要传）"""
+        tiles = {tile_of(lat, lng) for lat, lng in points if lat is not None and lng is not None}
+        if not tiles:
+            return
+        with self._lock:
+            for tile in tiles:
+                self._tiles.pop(tile, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tiles.clear()
+
+    @staticmethod
+    def _tile_ranges(tiles: Iterable[Tile]) -> List[Tuple[int, int]]:
+        """同一块行中相邻的块合并，每个基础网格行一段区间"""
+        by_row: Dict[int, List[int]] = {}
+        for ty, tx in tiles:
+            by_row.setdefault(ty, []).append(tx)
+        ranges = []
+        for ty, cols in by_row.items():
+            cols.sort()
+            runs = [[cols[0], cols[0]]]
+            for tx in cols[1:]:
+                if tx == runs[-1][1] + 1:
+                    runs[-1][1] = tx
+                else:
+                    runs.append([tx, tx])
+            for r in range(ty * TILE_CELLS, (ty + 1) * TILE_CELLS):
+                for first, last in runs:
+                    ranges.append((r * GRID_COLS + first * TILE_CELLS, r * GRID_COLS + (last + 1) * TILE_CELLS - 1))
+        return ranges
+
+    @staticmethod
+    def _batches(db: Session, tiles: List[Tile]):
+        if _has_grid(db):
+            ranges = SightingGrid._tile_ranges(tiles)
+            for i in range(0, len(ranges), _MAX_RANGES):
+                yield BiodiversityQueries.list_sightings_in_cell_ranges(db, ranges[i:i + _MAX_RANGES])
+        else:
+            # 未执行网格列迁移时按所有缺失块的外包矩形查询
+            rows = [ty for ty, _ in tiles]
+            cols = [tx for _, tx in tiles]
+            span = TILE_CELLS / GRID_SCALE
+            yield BiodiversityQueries.list_sightings_in_bbox(db, (
+                min(rows) * span - 90, min(cols) * span - 180,
+                (max(rows) + 1) * span - 90, (max(cols) + 1) * span - 180,
+            ))
+
+    def _load(self, db: Session, tiles: List[Tile]) -> Dict[Tile, List[Sighting]]:
+        loaded: Dict[Tile, List[Sighting]] = {tile: [] for tile in tiles}
+        for rows in self._batches(db, tiles):
+            for row in rows:
+                bucket = loaded.get(tile_of(row.latitude, row.longitude))
+                if bucket is not None:
+                    bucket.append(Sighting(row.id, row.species_id, row.latitude, row.longitude,
+                                           row.time, row.state, row.count))
+        return loaded
+
+    def query(
+        self,
+        db: Session,
+        bbox: BBox,
+        species_id: Optional[int] = None,
+        state: Optional[str] = None,
+    ) -> List[Sighting]:
+        min_lat, min_lng, max_lat, max_lng = bbox
+        (ty0, tx0), (ty1, tx1) = tile_of(min_lat, min_lng), tile_of(max_lat, max_lng)
+        needed = [(ty, tx) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+        if len(needed) > self.max_tiles:
+            raise ValueError("视野范围过大，请缩小地图范围")
+
+        now = time.monotonic()
+        with self._lock:
+            missing = [t for t in needed if expired(self._tiles.get(t, (None,))[0], self.ttl_seconds)]
+        if missing:
+            loaded = self._load(db, missing)
+            with self._lock:
+                for tile, points in loaded.items():
+                    self._tiles[tile] = (now, points)
+
+        result: List[Sighting] = []
+        with self._lock:
+            for tile in needed:
+                entry = self._tiles.get(tile)
+                if entry is None:
+                    continue
+                self._tiles.move_to_end(tile)
+                inner = tile[0] not in (ty0, ty1) and tile[1] not in (tx0, tx1)
+                for p in entry[1]:
+                    if species_id is not None and p.species_id != species_id:
+                        continue
+                    if state is not None and p.state != state:
+                        continue
+                    # 视野内部的块不必逐点比较经纬度
+                    if inner or (min_lat <= p.latitude <= max_lat and min_lng <= p.longitude <= max_lng):
+                        result.append(p)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        return result
+
+
+sighting_grid = SightingGrid(
+    max_tiles=settings.sighting_grid_max_tiles,
+    ttl_seconds=settings.sighting_grid_ttl_seconds,
+)
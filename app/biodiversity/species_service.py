@@ -5,6 +5,8 @@ from sqlalchemy import and_, desc, func, select
 from sqlalchemy.orm import Session
 
 from .models import 物种表, 区域物种关联表
+from .stats_cache import biodiversity_stats
+from .taxonomy_service import taxonomy_tree
 
 
 class SpeciesService:
@@ -40,6 +42,8 @@ class SpeciesService:
 
         db.add(db_species)
         db.commit()
+        biodiversity_stats.species_added(db_species.protect_level)
+        taxonomy_tree.species_upserted(db_species)
         db.refresh(db_species)
         return db_species
 
@@ -88,14 +92,18 @@ class SpeciesService:
         if not species:
             raise HTTPException(status_code=404, detail="物种不存在")
 
+        old_level = species.protect_level
         for field, value in update_data.model_dump(exclude_unset=True).items():
             if value is None:
                 continue
             if field == "protect_level" and hasattr(value, "value"):
                 value = value.value
             setattr(species, field, value)
+        new_level = species.protect_level
 
         db.commit()
+        biodiversity_stats.species_changed(old_level, new_level)
+        taxonomy_tree.species_upserted(species)
         db.refresh(species)
         return species
 
@@ -119,54 +127,20 @@ class SpeciesService:
         if (has_associations or 0) > 0:
             raise HTTPException(status_code=400, detail="该物种关联到区域，无法删除")
 
+        level = species.protect_level
         db.delete(species)
         db.commit()
+        biodiversity_stats.species_removed(level)
+        taxonomy_tree.species_removed(species_id)
 
     @staticmethod
     def get_protected_species_stats(db: Session) -> Dict[str, int]:
-        stats: Dict[str, int] = {}
-        for level in ["国家一级", "国家二级", "无"]:
-            count = db.scalar(select(func.count()).select_from(物种表).where(物种表.protect_level == level)) or 0
-            stats[level] = count
-
-        total = db.scalar(select(func.count()).select_from(物种表)) or 0
-        stats["总物种数"] = total
-        stats["受保护物种"] = total - stats.get("无", 0)
-        return stats
+        return biodiversity_stats.protected_species_stats(db)
 
     @staticmethod
     def get_species_taxonomy_stats(db: Session) -> Dict[str, Dict[str, int]]:
-        stats: Dict[str, Dict[str, int]] = {
-            "by_class": {},
-            "by_order": {},
-            "by_family": {},
+        return {
+            "by_class": taxonomy_tree.rank_counts(db, "class_name"),
+            "by_order": taxonomy_tree.rank_counts(db, "order"),
+            "by_family": taxonomy_tree.rank_counts(db, "family"),
         }
-
-        class_results = db.execute(
-            select(物种表.class_name, func.count().label("count"))
-            .where(物种表.class_name.isnot(None))
-            .group_by(物种表.class_name)
-        ).all()
-        for class_name, count in class_results:
-            if class_name:
-                stats["by_class"][class_name] = int(count)
-
-        order_results = db.execute(
-            select(物种表.order, func.count().label("count"))
-            .where(物种表.order.isnot(None))
-            .group_by(物种表.order)
-        ).all()
-        for order_name, count in order_results:
-            if order_name:
-                stats["by_order"][order_name] = int(count)
-
-        family_results = db.execute(
-            select(物种表.family, func.count().label("count"))
-            .where(物种表.family.isnot(None))
-            .group_by(物种表.family)
-        ).all()
-        for family_name, count in family_results:
-            if family_name:
-                stats["by_family"][family_name] = int(count)
-
-        return stats
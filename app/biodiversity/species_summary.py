@@ -0,0 +1,128 @@
+"""
+物种监测汇总
+物种列表和详情中的监测次数、最近监测时间、平均观测数量和月均监测频率原先来自
+V_物种综合信息 视图（每次读取都聚合全部监测记录）和逐行调用的 FN_计算物种监测频率。
+现在由应用维护 SpeciesSummary（每个物种一行）和 SpeciesMonthlyCounts（物种 × 月份的记录数）：
+有效记录新增、核实、修改、删除时在写入记录的同一事务中按增量更新，读取时只按主键取当前页的物种。
+
+与视图一致只统计状态为“有效”的记录；月均监测频率 = 最近 species_frequency_months 个月（含本月）的记录数 / 月数。
+首次部署或数据修复时调用 POST /biodiversity/species/summary/rebuild 按监测记录全部重建。
+"""
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.schema_registry import schema
+
+from .diversity_service import add_months, month_start
+from .queries import BiodiversityQueries
+
+
+def summary_enabled(db: Session) -> bool:
+    return schema.ensure(db).has_table("SpeciesSummary") and schema.ensure(db).has_table("SpeciesMonthlyCounts")
+
+
+class SummaryDelta:
+    """一个事务内有效记录的增减，按物种和 (物种, 月份) 汇总"""
+
+    def __init__(self):
+        # 物种 -> [记录数, 数量之和, 有数量的记录数, 新增记录的最晚时间, 移除记录的最晚时间]
+        self._species: Dict[int, list] = {}
+        self._months: Counter = Counter()
+
+    @classmethod
+    def of(cls, records: Iterable, sign: int = 1) -> "SummaryDelta":
+        """records 含 species_id, time, count"""
+        delta = cls()
+        for r in records:
+            delta.add(r.species_id, r.time, r.count, sign)
+        return delta
+
+    def add(self, species_id: int, time: datetime, count: Optional[int], sign: int = 1) -> None:
+        entry = self._species.setdefault(species_id, [0, 0, 0, None, None])
+        entry[0] += sign
+        if count is not None:
+            entry[1] += sign * count
+            entry[2] += sign
+        slot = 3 if sign > 0 else 4
+        if entry[slot] is None or time > entry[slot]:
+            entry[slot] = time
+        self._months[(species_id, month_start(time))] += sign
+
+    def remove(self, species_id: int, time: datetime, count: Optional[int]) -> None:
+        self.add(species_id, time, count, -1)
+
+    def __bool__(self) -> bool:
+        return bool(self._species)
+
+    def species_rows(self) -> List[tuple]:
+        return [(species_id, *entry) for species_id, entry in sorted(self._species.items())]
+
+    def month_rows(self) -> List[tuple]:
+        return [(species_id, month, n) for (species_id, month), n in sorted(self._months.items()) if n]
+
+
+def _since() -> date:
+    return add_months(month_start(datetime.now()), 1 - settings.species_frequency_months)
+
+
+class SpeciesSummaryService:
+    @staticmethod
+    def apply(db: Session, delta: SummaryDelta) -> None:
+        """在写入监测记录的事务中调用（提交前），未建汇总表时忽略"""
+        if delta and summary_enabled(db):
+            BiodiversityQueries.apply_species_summary_delta(db, delta.species_rows(), delta.month_rows())
+
+    @staticmethod
+    def refresh(db: Session, species_ids: Iterable[int]) -> None:
+        """按监测记录重新计算部分物种（增量难以确定时使用），调用方负责提交"""
+        species_ids = sorted(set(species_ids))
+        if species_ids and summary_enabled(db):
+            for start in range(0, len(species_ids), 2000):
+                BiodiversityQueries.rebuild_species_summary(db, species_ids[start:start + 2000])
+
+    @staticmethod
+    def rebuild(db: Session) -> Dict[str, Any]:
+        if not summary_enabled(db):
+            return {"enabled": False, "species": 0}
+        started = datetime.now()
+        species = BiodiversityQueries.rebuild_species_summary(db)
+        db.commit()
+        return {
+            "enabled": True,
+            "species": species,
+            "elapsed_ms": int((datetime.now() - started).total_seconds() * 1000),
+        }
+
+    @staticmethod
+    def summaries(db: Session, species_ids: Sequence[int], with_months: bool = False) -> Dict[int, dict]:
+        """物种编号 -> 汇总；没有汇总行的物种按未监测返回，未建汇总表时返回空字典"""
+        if not species_ids or not summary_enabled(db):
+            return {}
+        since = _since()
+        months = settings.species_frequency_months
+        result = {
+            sid: {"monitoring_count": 0, "last_seen": None, "average_count": None, "monthly_frequency": 0.0}
+            for sid in species_ids
+        }
+        for row in BiodiversityQueries.get_species_summaries(db, list(species_ids), since):
+            result[row.species_id] = {
+                "monitoring_count": row.records,
+                "last_seen": row.last_seen,
+                "average_count": round(row.count_sum / row.count_samples, 2) if row.count_samples else None,
+                "monthly_frequency": round(row.recent_records / months, 2),
+            }
+        if with_months:
+            for sid in species_ids:
+                counts = {
+                    month_start(r.month).strftime("%Y-%m"): r.records
+                    for r in BiodiversityQueries.get_species_monthly_counts(db, sid, since)
+                }
+                result[sid]["by_month"] = {
+                    m.strftime("%Y-%m"): counts.get(m.strftime("%Y-%m"), 0)
+                    for m in (add_months(since, i) for i in range(months))
+                }
+        return result
@@ -0,0 +1,121 @@
+"""
+生物多样性总体统计计数快照
+看板每次加载都要读取记录总数、待核实数、各监测方式数量和各保护级别物种数。
+计数保存在进程内存中：第一次读取时用两条 GROUP BY 查询整体加载，
+之后在记录新增 / 核实 / 修改 / 删除、物种新增 / 修改 / 删除提交成功后增量调整，
+读取时不再查询数据库；超过 biodiversity_stats_reconcile_seconds 后整体重新加载（见 app/local_cache.py）。
+"""
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.local_cache import ReconciledCache
+
+from .queries import BiodiversityQueries
+
+_METHODS = ("红外相机", "人工巡查", "无人机")
+_PROTECT_LEVELS = ("国家一级", "国家二级", "无")
+_PENDING = "待核实"
+
+RecordKey = Tuple[Optional[str], Optional[str]]
+
+
+class BiodiversityStatsCache(ReconciledCache):
+    def __init__(self, reconcile_seconds: float):
+        super().__init__(reconcile_seconds)
+        self._records: Counter = Counter()  # (监测方式, 状态) -> 记录数
+        self._species: Counter = Counter()  # 保护级别 -> 物种数
+
+    def _rebuild(self, db: Session) -> Dict[str, object]:
+        records = Counter()
+        for method, state, count in BiodiversityQueries.count_records_by_method_and_state(db):
+            records[(method, state)] += int(count)
+        species = Counter()
+        for level, count in BiodiversityQueries.count_species_by_protect_level(db):
+            species[level] += int(count)
+        return {"_records": records, "_species": species}
+
+    # ---------- 增量调整（在事务提交成功后调用） ----------
+
+    def _adjust(self, counter_name: str, key, delta: int) -> None:
+        with self._lock:
+            if not self.loaded:
+                return
+            counter: Counter = getattr(self, counter_name)
+            counter[key] += delta
+            if counter[key] <= 0:
+                del counter[key]
+
+    def record_added(self, method: Optional[str], state: Optional[str], n: int = 1) -> None:
+        self._adjust("_records", (method, state), n)
+
+    def records_added(self, keys: Iterable[RecordKey]) -> None:
+        """批量导入用：一批记录按 (监测方式, 状态) 合并后调整"""
+        for key, n in Counter(keys).items():
+            self._adjust("_records", key, n)
+
+    def record_removed(self, method: Optional[str], state: Optional[str]) -> None:
+        self._adjust("_records", (method, state), -1)
+
+    def record_changed(self, old: RecordKey, new: RecordKey) -> None:
+        if old != new:
+            self._adjust("_records", old, -1)
+            self._adjust("_records", new, 1)
+
+    def records_changed(self, changes: Iterable[Tuple[RecordKey, RecordKey]]) -> None:
+        """批量核实用：(旧键, 新键) 合并后调整"""
+        delta: Counter = Counter()
+        for old, new in changes:
+            if old != new:
+                delta[old] -= 1
+                delta[new] += 1
+        for key, n in delta.items():
+            if n:
+                self._adjust("_records", key, n)
+
+    def species_added(self, level: Optional[str]) -> None:
+        self._adjust("_species", level, 1)
+
+    def species_removed(self, level: Optional[str]) -> None:
+        self._adjust("_species", level, -1)
+
+    def species_changed(self, old: Optional[str], new: Optional[str]) -> None:
+        if old != new:
+            self._adjust("_species", old, -1)
+            self._adjust("_species", new, 1)
+
+    # ---------- 读取 ----------
+
+    def record_stats(self, db: Session) -> Dict[str, object]:
+        self._ensure(db)
+        with self._lock:
+            items = list(self._records.items())
+        method_stats: Dict[str, int] = {method: 0 for method in _METHODS}
+        total = 0
+        pending = 0
+        for (method, state), count in items:
+            total += count
+            if state == _PENDING:
+                pending += count
+            if method in method_stats:
+                method_stats[method] += count
+        return {
+            "total_records": total,
+            "pending_records": pending,
+            "method_stats": method_stats,
+        }
+
+    def protected_species_stats(self, db: Session) -> Dict[str, int]:
+        self._ensure(db)
+        with self._lock:
+            species = dict(self._species)
+        stats: Dict[str, int] = {level: species.get(level, 0) for level in _PROTECT_LEVELS}
+        total = sum(species.values())
+        stats["总物种数"] = total
+        stats["受保护物种"] = total - stats["无"]
+        return stats
+
+
+biodiversity_stats = BiodiversityStatsCache(reconcile_seconds=settings.biodiversity_stats_reconcile_seconds)
@@ -0,0 +1,218 @@
+"""
+物种分类树
+界→门→纲→目→科→属→物种 整棵树由一条查询（物种表 LEFT JOIN 按物种汇总的监测记录数）构建，
+每个节点记录下属物种数和监测记录数，保存在进程内存中。
+物种新增 / 修改 / 删除、监测记录新增 / 删除提交成功后增量调整对应路径上的计数，
+浏览分类树（按节点逐层展开）和 /stats/taxonomy 都不再查询数据库。
+
+分类字段为空的层级归入“未分类”节点，/stats/taxonomy 与原先按字段 GROUP BY 一致，不统计“未分类”。
+分类树超过 taxonomy_tree_reconcile_seconds 后整体重新加载（见 app/local_cache.py）。
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.local_cache import ReconciledCache
+
+from .queries import BiodiversityQueries
+
+RANKS = ("kingdom", "phylum", "class_name", "order", "family", "genus")
+UNRANKED = "未分类"
+PATH_SEP = "/"
+
+Path = Tuple[str, ...]
+
+
+class _Node:
+    __slots__ = ("name", "rank", "parent", "children", "species_ids", "species_count", "record_count")
+
+    def __init__(self, name: str, rank: str, parent: Optional["_Node"]):
+        self.name = name
+        self.rank = rank
+        self.parent = parent
+        self.children: Dict[str, _Node] = {}
+        self.species_ids: set = set()  # 仅属节点：下属物种
+        self.species_count = 0
+        self.record_count = 0
+
+
+def _path_of(values: dict) -> Path:
+    return tuple((values.get(rank) or "").strip() or UNRANKED for rank in RANKS)
+
+
+def _leaf(species_id: int, values: dict, record_count: int) -> dict:
+    return {
+        "id": species_id,
+        "chinese_name": values.get("chinese_name"),
+        "latin_name": values.get("latin_name"),
+        "species": values.get("species"),
+        "protect_level": values.get("protect_level"),
+        "record_count": record_count,
+    }
+
+
+class TaxonomyTree(ReconciledCache):
+    def __init__(self, reconcile_seconds: float):
+        super().__init__(reconcile_seconds)
+        self._root = _Node("", "root", None)
+        self._species: Dict[int, Tuple[Path, dict]] = {}
+
+    # ---------- 构建与路径维护（调用方持有锁） ----------
+
+    def _walk(self, root: _Node, path: Path, create: bool) -> List[_Node]:
+        """返回从根到属节点的各节点；create=False 且路径不存在时返回空列表"""
+        nodes = [root]
+        node = root
+        for rank, name in zip(RANKS, path):
+            child = node.children.get(name)
+            if child is None:
+                if not create:
+                    return []
+                child = node.children[name] = _Node(name, rank, node)
+            nodes.append(child)
+            node = child
+        return nodes
+
+    def _insert(self, root: _Node, index: Dict[int, Tuple[Path, dict]], path: Path, leaf: dict) -> None:
+        nodes = self._walk(root, path, create=True)
+        for node in nodes:
+            node.species_count += 1
+            node.record_count += leaf["record_count"]
+        nodes[-1].species_ids.add(leaf["id"])
+        index[leaf["id"]] = (path, leaf)
+
+    def _remove(self, species_id: int) -> Optional[dict]:
+        entry = self._species.pop(species_id, None)
+        if entry is None:
+            return None
+        path, leaf = entry
+        nodes = self._walk(self._root, path, create=False)
+        if not nodes:
+            return leaf
+        nodes[-1].species_ids.discard(species_id)
+        for node in nodes:
+            node.species_count -= 1
+            node.record_count -= leaf["record_count"]
+        # 自下而上移除已没有物种的节点
+        for node in reversed(nodes[1:]):
+            if node.species_count > 0:
+                break
+            del node.parent.children[node.name]
+        return leaf
+
+    def _add_records(self, species_id: int, n: int) -> None:
+        entry = self._species.get(species_id)
+        if entry is None:
+            return
+        path, leaf = entry
+        leaf["record_count"] = max(leaf["record_count"] + n, 0)
+        for node in self._walk(self._root, path, create=False):
+            node.record_count = max(node.record_count + n, 0)
+
+    def _rebuild(self, db: Session) -> Dict[str, object]:
+        root = _Node("", "root", None)
+        index: Dict[int, Tuple[Path, dict]] = {}
+        for row in BiodiversityQueries.list_species_with_record_counts(db):
+            values = dict(row._mapping)
+            self._insert(root, index, _path_of(values), _leaf(values["id"], values, int(values["record_count"])))
+        return {"_root": root, "_species": index}
+
+    # ---------- 增量调整（在事务提交成功后调用；尚未加载时忽略） ----------
+
+    def species_upserted(self, species) -> None:
+        """物种新增或分类字段修改：从旧路径移除后挂到新路径，记录数随物种带走"""
+        values = {
+            "chinese_name": species.chinese_name,
+            "latin_name": species.latin_name,
+            "species": species.species,
+            "protect_level": species.protect_level,
+            **{rank: getattr(species, rank) for rank in RANKS},
+        }
+        with self._lock:
+            if not self.loaded:
+                return
+            old = self._remove(species.id)
+            leaf = _leaf(species.id, values, old["record_count"] if old else 0)
+            self._insert(self._root, self._species, _path_of(values), leaf)
+
+    def species_removed(self, species_id: int) -> None:
+        with self._lock:
+            if self.loaded:
+                self._remove(species_id)
+
+    def record_added(self, species_id: int) -> None:
+        with self._lock:
+            if self.loaded:
+                self._add_records(species_id, 1)
+
+    def records_added(self, species_ids: Iterable[int]) -> None:
+        with self._lock:
+            if not self.loaded:
+                return
+            for species_id, n in Counter(species_ids).items():
+                self._add_records(species_id, n)
+
+    def record_removed(self, species_id: int) -> None:
+        with self._lock:
+            if self.loaded:
+                self._add_records(species_id, -1)
+
+    # ---------- 读取 ----------
+
+    @staticmethod
+    def _node_path(node: _Node) -> str:
+        names = []
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        return PATH_SEP.join(reversed(names))
+
+    def _describe(self, node: _Node, depth: int) -> dict:
+        data = {
+            "name": node.name,
+            "rank": node.rank,
+            "path": self._node_path(node),
+            "species_count": node.species_count,
+            "record_count": node.record_count,
+            "has_children": bool(node.children or node.species_ids),
+        }
+        if depth <= 0:
+            return data
+        children = sorted(node.children.values(), key=lambda c: (-c.species_count, c.name))
+        data["children"] = [self._describe(child, depth - 1) for child in children]
+        if node.species_ids:
+            leaves = [dict(self._species[sid][1]) for sid in node.species_ids if sid in self._species]
+            data["species"] = sorted(leaves, key=lambda leaf: (-leaf["record_count"], leaf["chinese_name"] or ""))
+        return data
+
+    def subtree(self, db: Session, node: Optional[str] = None, depth: int = 1) -> Optional[dict]:
+        """node 为以“/”连接的分类路径（如 动物界/脊索动物门/哺乳纲），为空表示根；
+        返回该节点及向下 depth 层子节点，节点不存在时返回 None"""
+        self._ensure(db)
+        path = tuple(part for part in (node or "").split(PATH_SEP) if part)
+        if len(path) > len(RANKS):
+            return None
+        with self._lock:
+            nodes = self._walk(self._root, path, create=False)
+            if not nodes:
+                return None
+            return self._describe(nodes[-1], depth)
+
+    def rank_counts(self, db: Session, rank: str) -> Dict[str, int]:
+        """某一分类层级各名称的物种数（同名节点跨上级合并，不含“未分类”）"""
+        self._ensure(db)
+        level = RANKS.index(rank) + 1
+        counts: Counter = Counter()
+        with self._lock:
+            frontier = [self._root]
+            for _ in range(level):
+                frontier = [child for node in frontier for child in node.children.values()]
+            for node in frontier:
+                if node.name != UNRANKED:
+                    counts[node.name] += node.species_count
+        return dict(counts)
+
+
+taxonomy_tree = TaxonomyTree(reconcile_seconds=settings.taxonomy_tree_reconcile_seconds)
@@ -0,0 +1,172 @@
+"""
+监测记录媒体文件上传
+红外相机照片、无人机视频等文件按固定块大小（upload_copy_chunk_bytes）流式写入磁盘，
+文件读写都在线程池中执行，不阻塞事件循环，内存占用与文件大小无关；写入的同时计算 SHA-256，
+超过大小上限立即中止。写完的文件按内容地址原子地放入媒体存储（app.media.store），不会出现写了一半的文件。
+
+大视频使用分块续传：创建上传会话后按偏移量逐块 PUT 原始字节，中断后查询已接收的字节数继续上传，
+全部上传后提交完成。会话状态保存在 upload_staging_dir 下的文件中，多进程部署时同样可用。
+"""
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.media import store
+
+STAGING_DIR = Path(settings.upload_staging_dir).resolve()
+
+_SESSION_SUFFIX = ".json"
+_PART_SUFFIX = ".part"
+
+
+class UploadService:
+    @staticmethod
+    async def save_upload(db: Session, file, max_bytes: Optional[int] = None) -> dict:
+        """表单上传：流式写入媒体存储（相同内容只保存一份），调用方负责提交"""
+        limit = settings.upload_max_bytes if max_bytes is None else max_bytes
+        return await store.store_upload(db, file, limit)
+
+    # ---------- 分块续传 ----------
+
+    @staticmethod
+    def _session_paths(upload_id: str) -> Tuple[Path, Path]:
+        try:
+            uuid.UUID(hex=upload_id)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="上传会话不存在")
+        return STAGING_DIR / f"{upload_id}{_SESSION_SUFFIX}", STAGING_DIR / f"{upload_id}{_PART_SUFFIX}"
+
+    @staticmethod
+    def _purge_expired() -> None:
+        cutoff = time.time() - settings.upload_session_ttl_hours * 3600
+        for p in STAGING_DIR.glob(f"*{_SESSION_SUFFIX}"):
+            try:
+                if p.stat().st_mtime < cutoff:
+                    store.unlink(p.with_suffix(_PART_SUFFIX))
+                    store.unlink(p)
+            except OSError:
+                continue
+
+    @staticmethod
+    def create_session(record_id: int, user_id: int, filename: str, total_size: int,
+                       sha256: Optional[str] = None) -> dict:
+        if total_size > settings.upload_resumable_max_bytes:
+            raise store.too_large(settings.upload_resumable_max_bytes)
+        STAGING_DIR.mkdir(parents=True, exist_ok=True)
+        UploadService._purge_expired()
+
+        upload_id = uuid.uuid4().hex
+        meta_path, part_path = UploadService._session_paths(upload_id)
+        meta = {
+            "upload_id": upload_id,
+            "record_id": record_id,
+            "user_id": user_id,
+            "filename": filename,
+            "total_size": total_size,
+            "sha256": sha256.lower() if sha256 else None,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        part_path.touch()
+        meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        return UploadService.session_status(meta)
+
+    @staticmethod
+    def load_session(upload_id: str, user_id: int) -> dict:
+        meta_path, _ = UploadService._session_paths(upload_id)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+        if meta["user_id"] != user_id:
+            raise HTTPException(status_code=403, detail="无权访问该上传会话")
+        return meta
+
+    @staticmethod
+    def session_status(meta: dict) -> dict:
+        _, part_path = UploadService._session_paths(meta["upload_id"])
+        try:
+            received = part_path.stat().st_size
+        except FileNotFoundError:
+            received = 0
+        return {
+            "upload_id": meta["upload_id"],
+            "record_id": meta["record_id"],
+            "total_size": meta["total_size"],
+            "received": received,
+            "chunk_size": settings.upload_part_bytes,
+        }
+
+    @staticmethod
+    async def write_chunk(meta: dict, offset: int, stream: AsyncIterator[bytes],
+                          content_length: Optional[int] = None) -> dict:
+        """
+        把请求体写入到 offset 处。offset 不能超过已接收的字节数；小于时覆盖重写
+        （上一块已写入但客户端没收到响应的重试），写入后截断到本块末尾。
+        """
+        meta_path, part_path = UploadService._session_paths(meta["upload_id"])
+        total = meta["total_size"]
+        received = part_path.stat().st_size if part_path.exists() else 0
+        if offset < 0 or offset > received:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "偏移量与已接收的数据不连续", "received": received},
+            )
+        if content_length is not None and offset + content_length > total:
+            raise HTTPException(status_code=413, detail="分块超出声明的文件大小")
+
+        buffer_size = settings.upload_copy_chunk_bytes
+        f = await run_in_threadpool(open, part_path, "r+b")
+        try:
+            await run_in_threadpool(f.seek, offset)
+            written = 0
+            buf = bytearray()
+            async for piece in stream:
+                written += len(piece)
+                if offset + written > total:
+                    raise HTTPException(status_code=413, detail="分块超出声明的文件大小")
+                buf += piece
+                if len(buf) >= buffer_size:
+                    await run_in_threadpool(f.write, bytes(buf))
+                    buf.clear()
+            if buf:
+                await run_in_threadpool(f.write, bytes(buf))
+            await run_in_threadpool(f.truncate, offset + written)
+        finally:
+            await run_in_threadpool(f.close)
+        # 续期：会话按最后一次写入时间过期
+        os.utime(meta_path)
+        return UploadService.session_status(meta)
+
+    @staticmethod
+    async def complete_session(db: Session, meta: dict) -> dict:
+        """校验大小和摘要后放入媒体存储并删除会话，调用方负责提交"""
+        meta_path, part_path = UploadService._session_paths(meta["upload_id"])
+        size = part_path.stat().st_size if part_path.exists() else 0
+        if size != meta["total_size"]:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "文件尚未上传完整", "received": size, "total_size": meta["total_size"]},
+            )
+        sha256 = await run_in_threadpool(store.file_sha256, part_path)
+        if meta.get("sha256") and meta["sha256"] != sha256:
+            UploadService.abort_session(meta)
+            raise HTTPException(status_code=422, detail="文件校验失败（SHA-256 不一致），请重新上传")
+
+        saved = await run_in_threadpool(store.store_file, db, str(part_path), size, sha256, meta["filename"])
+        store.unlink(meta_path)
+        return saved
+
+    @staticmethod
+    def abort_session(meta: dict) -> None:
+        meta_path, part_path = UploadService._session_paths(meta["upload_id"])
+        store.unlink(part_path)
+        store.unlink(meta_path)
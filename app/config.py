@@ -29,6 +29,92 @@ class Settings(BaseSettings):
     data_quality_threshold: float = 0.95  # 数据质量阈值
     abnormal_data_retention_days: int = 30  # 异常数据保留天数
 
+    # 游客身份缓存
+    visitor_identity_cache_size: int = 10000  # 身份证号 -> VisitorId 缓存条数上限
+
+    # 预约配额
+    reservation_slot_capacity: int = 500  # 每个公园/日期/时段的默认可预约人数
+
+    # 预约自动审核
+    reservation_auto_approve_enabled: bool = False
+    reservation_auto_approve_interval: float = 300.0  # 自动审核运行间隔（秒）
+    reservation_auto_approve_max_party_size: int = 10  # 超过该人数的团体预约仍需人工审核
+
+    # 预约等候室
+    waiting_room_enabled: bool = True
+    waiting_room_admit_rate: float = 20.0  # 每秒放行进入数据库的预约数（单进程）
+    waiting_room_token_ttl: int = 1800  # 排队令牌有效期（秒）
+
+    # 电子入园票
+    entry_ticket_key: str = ""  # 闸机验签密钥，为空时由 app_secret_key 派生
+    entry_ticket_noon_hour: int = 12  # 上午票在该时刻之前入园，下午票在该时刻及之后入园
+    entry_time_max_skew_seconds: int = 300  # 入园接口上报的入园时间与服务器时间最多相差（秒）
+    gate_manifest_refresh_seconds: int = 300  # 闸机入园名单整体重载间隔（秒）
+
+    # 轨迹压缩
+    track_simplify_tolerance_m: float = 5.0  # Douglas-Peucker 抽稀容差（米）
+    track_max_gap_seconds: int = 300  # 相邻定位点间隔超过该值视为定位中断，两侧点原样保留
+
+    # 游客实时位置
+    live_position_cell_deg: float = 0.01  # 网格索引边长（度），约 1 公里
+    live_position_ttl_seconds: int = 1800  # 超过该时间未上报定位视为离线
+
+    # 游客密度热力图
+    heatmap_cell_deg: float = 0.001  # 基础网格边长（度），约 100 米
+    heatmap_bucket_minutes: int = 15  # 时间桶长度（分钟），需能整除 60
+    heatmap_flush_seconds: float = 10.0  # 内存计数写入数据库的间隔（秒）
+
+    # 监测记录媒体上传
+    upload_max_bytes: int = 200 * 1024 * 1024  # 单次表单上传的大小上限
+    upload_resumable_max_bytes: int = 20 * 1024 * 1024 * 1024  # 分块续传（无人机视频）的大小上限
+    upload_copy_chunk_bytes: int = 1024 * 1024  # 流式复制的块大小
+    upload_part_bytes: int = 8 * 1024 * 1024  # 建议客户端每次 PUT 的分块大小
+    upload_staging_dir: str = "./media_store/staging"  # 分块续传的临时目录，应与媒体存储在同一文件系统
+    upload_session_ttl_hours: int = 48  # 分块续传会话无写入后的保留时间（小时）
+
+    # 媒体存储（内容寻址）
+    media_store_dir: str = "./media_store"
+    media_gc_grace_hours: int = 24  # 引用计数归零后保留多久再删除文件
+    media_derivative_workers: int = 2  # 生成缩略图/预览图的进程数
+    media_thumbnail_px: int = 320  # 缩略图最长边（像素）
+    media_preview_px: int = 1280  # 网页预览图最长边（像素）
+    media_derivative_quality: int = 82  # 派生图 JPEG 质量
+
+    # 监测记录批量导入
+    import_batch_rows: int = 5000  # 每个事务写入的记录数
+    import_max_bytes: int = 4 * 1024 * 1024 * 1024  # 导入清单与 ZIP 包的请求大小上限
+    import_error_limit: int = 1000  # 返回的逐行错误条数上限
+
+    # 生物多样性总体统计
+    biodiversity_stats_reconcile_seconds: int = 300  # 计数快照整体重新加载的间隔（秒）
+    taxonomy_tree_reconcile_seconds: int = 600  # 物种分类树整体重新加载的间隔（秒）
+    diversity_cache_seconds: int = 3600  # 区域×月份多样性指数缓存的最长保留时间（秒）
+    diversity_max_months: int = 120  # 单次查询的月份数上限
+    species_frequency_months: int = 12  # 物种月均监测频率统计的月份数（含本月）
+
+    # 监测记录地图
+    sighting_grid_max_tiles: int = 4096  # 内存网格保留的块数（每块约 10 公里见方），也是单次视野的块数上限
+    sighting_grid_ttl_seconds: int = 600  # 内存网格每块的最长保留时间（秒）
+    sighting_map_max_points: int = 20000  # 地图接口单次返回的点数上限
+    cluster_cell_px: int = 64  # 分布点聚合的网格边长（屏幕像素）
+    cluster_max_zoom: int = 18  # 超过该缩放级别按该级别聚合
+    cluster_reconcile_seconds: int = 900  # 分布点整体重新加载的间隔（秒）
+
+    # 红外相机连拍去重
+    burst_dedup_enabled: bool = True  # 写入监测记录时把同一次连拍并入已有记录
+    burst_window_seconds: int = 60  # 同一设备、同一物种相隔不超过该秒数的记录视为同一次连拍
+    burst_distance_m: float = 50.0  # 且坐标相距不超过该距离（米）；任一条没有坐标时只比较时间
+    burst_preload_minutes: int = 60  # 从数据库加载设备时间窗时前后各多取的分钟数
+    burst_max_devices: int = 2000  # 内存中保留时间窗的设备数
+
+    # 分析员工作队列
+    review_lease_seconds: int = 1800  # 领取记录的租约时长（秒），过期未处理的记录可被他人领取
+    review_max_claimed: int = 200  # 每名分析员在一个队列中同时持有的记录数上限
+
+    # 幂等键
+    idempotency_cache_size: int = 20000  # 进程内缓存的已完成响应条数
+    idempotency_ttl_hours: int = 24  # 幂等键记录保留时间（小时）
+
     class Config:
         env_file = ".env"
         extra = "ignore"
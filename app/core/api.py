@@ -16,6 +16,7 @@ from itsdangerous import URLSafeSerializer
 from app.db import get_db
 from app.core import models, schemas
 from app.config import settings
+from app.schema_registry import schema
 # 导入security.py的核心函数
 from app.core.security import hash_password_sha256, register_user as security_register_user
 
@@ -784,6 +785,44 @@ def get_system_info():
     }
 
 
+# ========== 数据库结构能力API ==========
+@router.get("/schema")
+def get_schema_capabilities(
+        current_user: models.User = Depends(get_current_user)
+):
+    """
+    查看启动时探测到的数据库结构和缺失对象
+
+    需要权限：系统管理员
+    """
+    if current_user.role_type != "系统管理员":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="需要系统管理员权限"
+        )
+    return schema.report()
+
+
+@router.post("/schema/refresh")
+def refresh_schema_capabilities(
+        db: Session = Depends(get_db),
+        current_user: models.User = Depends(get_current_user)
+):
+    """
+    执行迁移脚本后重新探测数据库结构
+
+    需要权限：系统管理员
+    """
+    if current_user.role_type != "系统管理员":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="需要系统管理员权限"
+        )
+    schema.probe(db)
+    schema.log_report()
+    return schema.report()
+
+
 # ========== 健康检查API（保留） ==========
 @router.get("/health")
 def health_check():
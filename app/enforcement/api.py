@@ -4,7 +4,7 @@
 支持系统管理员、公园管理人员、执法人员等角色
 """
 from typing import List, Dict, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, UploadFile, File
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func, desc, and_
 from datetime import datetime, timedelta
@@ -12,6 +12,9 @@ from datetime import datetime, timedelta
 from app.db import get_db
 from app.core import models  # 导入核心模型（User）
 from app.core.api import get_current_user  # 复用core的认证依赖
+from app.config import settings
+from app.media import store as media_store
+from app.media.derivatives import derivative_worker
 
 # 导入本地模块
 from . import schemas
@@ -271,6 +274,28 @@ def delete_record(
     return {"success": True}
 
 
+@router.post("/records/{record_id}/evidence", response_model=schemas.IllegalRecord)
+async def upload_evidence(
+    record_id: str,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """上传证据文件（图片/视频），写入媒体存储并更新 evidence_path"""
+    _require_roles(current_user, ["系统管理员", "公园管理人员", "执法人员"], "需要执法人员/管理人员权限")
+    record = EnforcementQueries.get_illegal_record(db, record_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="记录不存在")
+
+    saved = await media_store.store_upload(db, file, settings.upload_max_bytes)
+    media_store.release(db, record.evidence_path)
+    record.evidence_path = saved["file_path"]
+    db.commit()
+    derivative_worker.enqueue(saved["sha256"], saved["content_type"])
+    db.refresh(record)
+    return record
+
+
 # ========== 执法调度接口 ==========
 @router.get("/dispatch", response_model=List[schemas.Dispatch])
 def query_dispatches(
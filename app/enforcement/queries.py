@@ -6,6 +6,8 @@ from typing import List, Optional
 from sqlalchemy import desc, select, text
 from sqlalchemy.orm import Session
 
+from app.media import store as media_store
+
 from . import models
 
 
@@ -150,6 +152,7 @@ class EnforcementQueries:
             monitor_point_id=payload.monitor_point_id,
         )
         db.add(record)
+        media_store.acquire(db, record.evidence_path)
         db.commit()
         db.refresh(record)
         return record
@@ -189,6 +192,8 @@ class EnforcementQueries:
         # 更新其他普通字段
         for field in ["behavior_type", "evidence_path", "law_enforcement_id", "handle_result", "punishment_basis"]:
             if field in update_data and update_data[field] is not None:
+                if field == "evidence_path":
+                    media_store.replace_reference(db, record.evidence_path, update_data[field])
                 setattr(record, field, update_data[field])
 
         db.commit()
@@ -200,6 +205,7 @@ class EnforcementQueries:
         record = db.get(models.非法行为记录表, record_id)
         if not record:
             return False
+        media_store.release(db, record.evidence_path)
         db.delete(record)
         db.commit()
         return True
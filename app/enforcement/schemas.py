@@ -4,7 +4,9 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, computed_field
+
+from app.media.store import derivative_url
 
 
 class StaffBase(BaseModel):
@@ -99,6 +101,16 @@ class IllegalRecord(BaseModel):
     class Config:
         from_attributes = True
 
+    @computed_field
+    @property
+    def evidence_thumbnail_url(self) -> Optional[str]:
+        return derivative_url(self.evidence_path, "thumb")
+
+    @computed_field
+    @property
+    def evidence_preview_url(self) -> Optional[str]:
+        return derivative_url(self.evidence_path, "preview")
+
 
 class Dispatch(BaseModel):
     dispatch_id: str
@@ -7,6 +7,7 @@ from uuid import uuid4
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
 
+from app import idempotency
 from app.core.api import get_current_user, verify_token
 from app.core.models import User
 from app.db import get_db
@@ -133,12 +134,14 @@ async def get_devices_needing_calibration(db: Session = Depends(get_db)):
 @router.post("/environment-data", response_model=schemas.EnvironmentData)
 async def create_environment_data(
     data: schemas.EnvironmentDataCreate,
+    idem: idempotency.IdempotencyGuard = Depends(idempotency.guard(get_optional_user)),
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_user),
 ):
     if current_user is not None:
         _require_roles(current_user, ["公园管理人员", "系统管理员"], "需要公园管理人员权限")
 
+    idem.reserve(db)
     if not data.data_id:
         data.data_id = f"ED_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid4().hex[:8]}"
 
@@ -146,7 +149,10 @@ async def create_environment_data(
     if existing:
         raise HTTPException(status_code=400, detail="数据编号已存在")
 
-    return EnvironmentQueries.create_environment_data(db, data)
+    created = EnvironmentQueries.create_environment_data(db, data, commit=False)
+    result = idem.complete(db, schemas.EnvironmentData.model_validate(created), commit=False)
+    db.commit()
+    return result
 
 
 @router.get("/environment-data/{data_id}", response_model=schemas.EnvironmentData)
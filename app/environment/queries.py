@@ -121,7 +121,7 @@ class EnvironmentQueries:
         return result
 
     @staticmethod
-    def create_environment_data(db: Session, data) -> 环境监测数据表:
+    def create_environment_data(db: Session, data, commit: bool = True) -> 环境监测数据表:
         monitor_index = db.get(环境监测指标表, data.index_id)
         is_abnormal = 0
         abnormal_reason = None
@@ -148,7 +148,10 @@ class EnvironmentQueries:
             updated_at=datetime.now(),
         )
         db.add(db_data)
-        db.commit()
+        if commit:
+            db.commit()
+        else:
+            db.flush()
         db.refresh(db_data)
         return db_data
 
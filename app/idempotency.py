@@ -0,0 +1,200 @@
+"""
+创建类接口的幂等键（Idempotency-Key 请求头）
+客户端重试时携带同一个键，服务端直接返回第一次的响应，不再访问业务表。
+
+- 键与业务写入在同一事务中占位（INSERT dbo.IdempotencyKeys），业务回滚时占位随之消失，
+  并发重放会在主键上等待第一次请求提交，不会产生重复数据；
+- 响应写回该行，并放入进程内 LRU 缓存，重放命中缓存时不访问数据库；
+- 同一个键配不同的请求体返回 422，第一次请求仍在处理时返回 409；
+- 记录保留 idempotency_ttl_hours 小时，过期后分批清理。
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import Depends, Header, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.api import get_current_user
+from app.db import get_db
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+_PURGE_INTERVAL_SECONDS = 600
+
+
+class IdempotentReplay(Exception):
+    """命中已完成的幂等键，由 replay_handler 直接返回缓存的响应"""
+
+    def __init__(self, status_code: int, body: Any):
+        self.status_code = status_code
+        self.body = body
+
+
+async def replay_handler(request: Request, exc: IdempotentReplay) -> JSONResponse:
+    return JSONResponse(status_code=exc.status_code, content=exc.body, headers={"Idempotent-Replayed": "true"})
+
+
+class _ResponseCache:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items: "OrderedDict[Tuple[str, str], Tuple[str, int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[Tuple[str, int, Any]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key: Tuple[str, str], value: Tuple[str, int, Any]) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+
+_cache = _ResponseCache(settings.idempotency_cache_size)
+_last_purge = 0.0
+
+
+def _load(db: Session, scope: str, key: str) -> Optional[dict]:
+    return db.execute(
+        text(
+            "SELECT RequestHash, StatusCode, ResponseBody, CreatedAt FROM dbo.IdempotencyKeys "
+            "WHERE Scope = :scope AND IdempotencyKey = :key"
+        ),
+        {"scope": scope, "key": key},
+    ).mappings().first()
+
+
+def _replay_or_conflict(fingerprint: str, stored_hash: str, status_code: Optional[int], body: Any) -> None:
+    if stored_hash != fingerprint:
+        raise HTTPException(status_code=422, detail="该 Idempotency-Key 已用于不同的请求内容")
+    if status_code is None:
+        raise HTTPException(
+            status_code=409,
+            detail="相同 Idempotency-Key 的请求正在处理，请稍后重试",
+            headers={"Retry-After": "1"},
+        )
+    raise IdempotentReplay(status_code, body)
+
+
+def _purge_expired(db: Session) -> None:
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < _PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = now
+    db.execute(
+        text("DELETE TOP (1000) FROM dbo.IdempotencyKeys WHERE CreatedAt < :cutoff"),
+        {"cutoff": datetime.utcnow() - timedelta(hours=settings.idempotency_ttl_hours)},
+    )
+
+
+class IdempotencyGuard:
+    def __init__(self, scope: Optional[str] = None, key: Optional[str] = None, fingerprint: Optional[str] = None):
+        self.scope = scope
+        self.key = key
+        self.fingerprint = fingerprint
+
+    @property
+    def active(self) -> bool:
+        return self.key is not None
+
+    def reserve(self, db: Session) -> None:
+        """在当前事务中占位（接口处理开始时调用）；并发的相同请求会在此等待第一次请求提交或回滚"""
+        if not self.active:
+            return
+        try:
+            db.execute(
+                text(
+                    "INSERT INTO dbo.IdempotencyKeys(Scope, IdempotencyKey, RequestHash) "
+                    "VALUES (:scope, :key, :hash)"
+                ),
+                {"scope": self.scope, "key": self.key, "hash": self.fingerprint},
+            )
+        except IntegrityError:
+            db.rollback()
+            row = _load(db, self.scope, self.key)
+            if row is None:
+                raise HTTPException(status_code=409, detail="请求冲突，请重试")
+            body = json.loads(row["ResponseBody"]) if row["ResponseBody"] is not None else None
+            _replay_or_conflict(self.fingerprint, row["RequestHash"], row["StatusCode"], body)
+
+    def complete(self, db: Session, response: Any, status_code: int = 200, commit: bool = True) -> Any:
+        """
+        保存响应。commit=False 时由调用方随业务写入一起提交（键与响应同一事务），
+        此时不放入缓存（事务可能回滚），首次重放从数据库读取后再缓存。
+        """
+        if not self.active:
+            return response
+        body = jsonable_encoder(response)
+        db.execute(
+            text(
+                "UPDATE dbo.IdempotencyKeys SET StatusCode = :code, ResponseBody = :body, CompletedAt = SYSUTCDATETIME() "
+                "WHERE Scope = :scope AND IdempotencyKey = :key"
+            ),
+            {
+                "code": status_code,
+                "body": json.dumps(body, ensure_ascii=False),
+                "scope": self.scope,
+                "key": self.key,
+            },
+        )
+        _purge_expired(db)
+        if commit:
+            db.commit()
+            _cache.put((self.scope, self.key), (self.fingerprint, status_code, body))
+        return body
+
+
+async def _request_fingerprint(request: Request) -> str:
+    body = await request.body()
+    return hashlib.sha256(request.method.encode("ascii") + b" " + request.url.path.encode("utf-8") + b"\n" + body).hexdigest()
+
+
+def guard(user_dependency: Callable = get_current_user) -> Callable:
+    """
+    生成接口依赖：命中已完成的键时直接重放响应，否则返回 IdempotencyGuard，
+    接口在写入前调用 reserve、写入后调用 complete；未携带 Idempotency-Key 时两者都不做任何处理。
+    user_dependency 用于按用户隔离键空间（允许匿名的接口传入可选用户依赖）。
+    """
+
+    def dependency(
+        request: Request,
+        fingerprint: str = Depends(_request_fingerprint),
+        idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, max_length=100),
+        db: Session = Depends(get_db),
+        current_user=Depends(user_dependency),
+    ) -> IdempotencyGuard:
+        if not idempotency_key:
+            return IdempotencyGuard()
+
+        user_part = f"u{current_user.id}" if current_user is not None else "anon"
+        scope = f"{user_part}:{request.method} {request.url.path}"[:150]
+
+        cached = _cache.get((scope, idempotency_key))
+        if cached is not None:
+            _replay_or_conflict(fingerprint, *cached)
+
+        row = _load(db, scope, idempotency_key)
+        if row is not None:
+            body = json.loads(row["ResponseBody"]) if row["ResponseBody"] is not None else None
+            if row["StatusCode"] is not None:
+                _cache.put((scope, idempotency_key), (row["RequestHash"], row["StatusCode"], body))
+            _replay_or_conflict(fingerprint, row["RequestHash"], row["StatusCode"], body)
+
+        return IdempotencyGuard(scope=scope, key=idempotency_key, fingerprint=fingerprint)
+
+    return dependency
@@ -0,0 +1,54 @@
+"""
+进程内缓存的定期重新加载
+生物多样性计数、物种分类树、分布点聚合、多样性指数、地图网格、连拍时间窗和游客实时位置
+都保存在进程内存中，写入接口提交成功后增量调整或使对应部分失效，读取时不再查询数据库。
+
+多进程部署时每个进程只能感知经自己写入的变化，其他进程的写入和直接在数据库中修改的数据
+不会反映到本进程的缓存上，因此缓存只保留一段时间：
+整体加载的快照（ReconciledCache）超过 reconcile_seconds 后在下一次读取时整体重新加载，
+按月、按块加载的缓存用 expired() 判断单项是否超时，偏差最多保留一个周期。
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+
+def expired(loaded_at: Optional[float], ttl_seconds: float) -> bool:
+    return loaded_at is None or time.monotonic() - loaded_at >= ttl_seconds
+
+
+class ReconciledCache:
+    """整体加载的进程内快照；子类实现 _rebuild 返回要替换的属性，增量调整在 self._lock 内进行"""
+
+    def __init__(self, reconcile_seconds: float):
+        self.reconcile_seconds = reconcile_seconds
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _rebuild(self, db: Session) -> Dict[str, object]:
+        raise NotImplementedError
+
+    @property
+    def loaded(self) -> bool:
+        """尚未加载时增量调整可以忽略，第一次读取会整体加载"""
+        return self._loaded_at is not None
+
+    def reconcile(self, db: Session) -> None:
+        """整体重新加载；查询和构建在锁外进行，完成后一次性替换"""
+        state = self._rebuild(db)
+        with self._lock:
+            for name, value in state.items():
+                setattr(self, name, value)
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure(self, db: Session) -> None:
+        with self._lock:
+            stale = expired(self._loaded_at, self.reconcile_seconds)
+        if stale:
+            self.reconcile(db)
@@ -1,5 +1,7 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_redoc_html
 from fastapi.staticfiles import StaticFiles
@@ -9,7 +11,15 @@ from starlette.middleware.base import BaseHTTPMiddleware
 
 from app.core.api import router as core_router
 from app.visitor.api import router as visitor_router
+from app.media.api import router as media_router
+from app.media.derivatives import derivative_worker
+from app.visitor import manifest_service
+from app.visitor import live_positions
+from app.visitor.heatmap_service import heatmap_accumulator
+from app.visitor.approval_service import auto_approver
 from app.config import settings
+from app import schema_registry
+from app import idempotency
 
 
 class NoCacheMiddleware(BaseHTTPMiddleware):
@@ -21,28 +31,71 @@ class NoCacheMiddleware(BaseHTTPMiddleware):
             response.headers["Expires"] = "0"
         return response
 
+
+class UploadSizeLimitMiddleware(BaseHTTPMiddleware):
+    """表单上传在读取请求体之前按 Content-Length 拒绝超限文件，不必先把整个文件缓存到临时文件"""
+
+    # multipart 边界和表单字段的额外开销
+    _OVERHEAD = 1024 * 1024
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method == "POST" and request.headers.get("content-type", "").startswith("multipart/form-data"):
+            length = request.headers.get("content-length")
+            # 批量导入（清单 + ZIP 包）使用单独的上限
+            limit = settings.import_max_bytes if request.url.path.endswith("/records/import") else settings.upload_max_bytes
+            if length and length.isdigit() and int(length) > limit + self._OVERHEAD:
+                return JSONResponse(
+                    status_code=413,
+                    content={"detail": f"文件超过大小上限（{limit // (1024 * 1024)} MB），大文件请使用分块续传"},
+                )
+        return await call_next(request)
+
 def _optional_router(module_path: str):
     try:
         mod = import_module(module_path)
         return getattr(mod, "router", None)
-    except Exception:
+    except Exception as e:
+        # 不再静默丢弃：记录原因，启动日志和 /api/core/schema 中可见
+        schema_registry.schema.router_errors[module_path] = f"{type(e).__name__}: {e}"
         return None
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动/关闭时的后台任务"""
+    schema_registry.probe_at_startup()
+    heatmap_accumulator.start()
+    manifest_service.preload()
+    live_positions.preload()
+    if settings.reservation_auto_approve_enabled:
+        auto_approver.start()
+    yield
+    auto_approver.stop()
+    derivative_worker.stop()
+    heatmap_accumulator.stop()
+
+
 app = FastAPI(
     title="国家公园智慧管理与生态保护系统 API",
     description="基于FastAPI的国家公园智慧管理系统 - 支持8种用户角色",
     version="1.0.0",
     docs_url="/api/docs",
     redoc_url=None,
+    lifespan=lifespan,
 )
 
 frontend_dir = (Path(__file__).resolve().parent.parent / "frontend").resolve()
 if frontend_dir.exists():
     app.mount("/web", StaticFiles(directory=str(frontend_dir), html=True), name="web")
 
+# 幂等键重放：直接返回第一次请求的响应
+app.add_exception_handler(idempotency.IdempotentReplay, idempotency.replay_handler)
+
 # 添加缓存控制中间件
 app.add_middleware(NoCacheMiddleware)
 
+# 上传大小限制
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # 添加CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -55,6 +108,7 @@ app.add_middleware(
 # 注册所有路由
 app.include_router(core_router, prefix="/api")
 app.include_router(visitor_router, prefix="/api")
+app.include_router(media_router, prefix="/api")
 
 biodiversity_router = _optional_router("app.biodiversity.api")
 if biodiversity_router:
@@ -0,0 +1,152 @@
+from typing import Iterator, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.api import get_current_user
+from app.core.models import User
+from app.db import get_db
+
+from . import store
+from .derivatives import derivative_worker, resolve
+
+router = APIRouter(prefix="/media", tags=["媒体存储"])
+
+
+def _require_roles(current_user: User, allowed_roles, detail: str = "权限不足"):
+    if current_user.role_type not in allowed_roles:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """只支持单个区间（bytes=a-b / bytes=a- / bytes=-n），返回闭区间 (start, end)；多区间按整文件返回"""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    try:
+        if first == "":
+            length = int(last)
+            if length <= 0:
+                raise ValueError
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="请求的范围无效",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, min(end, size - 1)
+
+
+def _iter_file(path, start: int, length: int) -> Iterator[bytes]:
+    chunk_size = settings.upload_copy_chunk_bytes
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@router.get("/stats")
+def media_stats(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """存储对象数、实际占用与去重前的逻辑大小"""
+    _require_roles(current_user, ["系统管理员"], "需要系统管理员权限")
+    return store.stats(db)
+
+
+@router.post("/gc")
+def media_gc(
+    limit: int = 500,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """删除引用计数归零且超过宽限期的文件"""
+    _require_roles(current_user, ["系统管理员"], "需要系统管理员权限")
+    return store.collect_garbage(db, limit=limit)
+
+
+@router.post("/derivatives")
+def rebuild_derivatives(
+    limit: int = Query(500, ge=1, le=5000),
+    after: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """为缺少缩略图/预览图的图片补提交派生任务（分批，返回下一批的起点 next_after）"""
+    _require_roles(current_user, ["系统管理员"], "需要系统管理员权限")
+    rows = store.list_image_objects(db, limit, after)
+    queued = sum(1 for r in rows if derivative_worker.enqueue(r["Sha256"], r["ContentType"]))
+    return {
+        "scanned": len(rows),
+        "queued": queued,
+        "pending": derivative_worker.pending(),
+        "next_after": rows[-1]["Sha256"] if len(rows) == limit else None,
+    }
+
+
+@router.get("/{sha256}")
+def get_media(
+    sha256: str,
+    request: Request,
+    variant: Optional[str] = Query(None, pattern="^(thumb|preview)$"),
+    db: Session = Depends(get_db),
+):
+    """
+    按内容地址读取文件，支持 Range 请求（视频拖动播放）和 ETag 缓存；
+    variant=thumb/preview 读取缩略图/预览图，尚未生成时返回原文件且不允许长期缓存
+    """
+    sha256 = sha256.lower()
+    obj = store.get_object(db, sha256) if store.is_sha256(sha256) else None
+    path = store.object_path(sha256) if obj else None
+    if obj is None or not path.exists():
+        raise HTTPException(status_code=404, detail="文件不存在")
+
+    content_type = obj["ContentType"]
+    size = int(obj["SizeBytes"])
+    etag = f'"{sha256}"'
+    # 内容寻址：同一地址的内容永远不变
+    cache_control = "public, max-age=31536000, immutable"
+    if variant:
+        derived = resolve(sha256, variant)
+        if derived != path:
+            path, content_type, size = derived, "image/jpeg", derived.stat().st_size
+            etag = f'"{sha256}-{variant}"'
+        else:
+            derivative_worker.enqueue(sha256, content_type)
+            cache_control = "no-cache"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Cache-Control": cache_control,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = _parse_range(request.headers.get("range"), size) if size else None
+    if byte_range is None:
+        start, length, code = 0, size, status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        length, code = end - start + 1, status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(
+        _iter_file(path, start, length),
+        status_code=code,
+        media_type=content_type,
+        headers=headers,
+    )
@@ -0,0 +1,123 @@
+"""
+媒体派生图（缩略图 / 网页预览图）
+图片上传后把缩放任务提交到进程池，在子进程中用 Pillow 生成 JPEG 派生图，
+与原文件放在同一分片目录（<sha256>.thumb.jpg / <sha256>.preview.jpg），
+列表页加载几十 KB 的缩略图而不是几 MB 的原图，CPU 密集的缩放也不会占用处理请求的进程。
+
+派生图尚未生成（或未安装 Pillow、原文件不是图片）时，读取接口回退到原文件。
+"""
+import logging
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from app.config import settings
+
+from . import store
+
+logger = logging.getLogger(__name__)
+
+
+def _render(src: str, targets: Dict[str, tuple], quality: int) -> Dict[str, int]:
+    """子进程中执行：按最长边缩放并写出 JPEG，先写临时文件再重命名"""
+    from PIL import Image, ImageOps
+
+    largest = max(size for _, size in targets.values())
+    written = {}
+    with Image.open(src) as im:
+        # JPEG 按接近目标的尺寸解码，大图不必完整解码
+        im.draft("RGB", (largest, largest))
+        im = ImageOps.exif_transpose(im)
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+        # 先生成大的，再在其基础上缩小，避免每个尺寸都从原图重采样
+        for variant, (path, size) in sorted(targets.items(), key=lambda kv: -kv[1][1]):
+            im.thumbnail((size, size), Image.LANCZOS)
+            tmp = f"{path}.tmp{os.getpid()}"
+            im.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+            os.replace(tmp, path)
+            written[variant] = os.path.getsize(path)
+    return written
+
+
+class DerivativeWorker:
+    """进程池由第一次提交时创建；同一内容同时只提交一次"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._available: Optional[bool] = None
+
+    def _pillow_available(self) -> bool:
+        if self._available is None:
+            try:
+                import PIL  # noqa: F401
+                self._available = True
+            except ImportError:
+                logger.warning("未安装 Pillow，不生成缩略图和预览图")
+                self._available = False
+        return self._available
+
+    def _sizes(self) -> Dict[str, int]:
+        return {"thumb": settings.media_thumbnail_px, "preview": settings.media_preview_px}
+
+    def missing(self, sha256: str) -> Dict[str, tuple]:
+        return {
+            variant: (str(store.derivative_path(sha256, variant)), size)
+            for variant, size in self._sizes().items()
+            if not store.derivative_path(sha256, variant).exists()
+        }
+
+    def enqueue(self, sha256: str, content_type: Optional[str]) -> bool:
+        """提交派生任务；不是图片、派生图已存在或任务已在队列中时返回 False"""
+        if not content_type or not content_type.startswith("image/") or not self._pillow_available():
+            return False
+        targets = self.missing(sha256)
+        if not targets:
+            return False
+        with self._lock:
+            if sha256 in self._pending:
+                return False
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._pending.add(sha256)
+            future = self._pool.submit(
+                _render, str(store.object_path(sha256)), targets, settings.media_derivative_quality
+            )
+        future.add_done_callback(lambda f, sha=sha256: self._done(sha, f))
+        return True
+
+    def _done(self, sha256: str, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(sha256)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logger.warning("生成派生图失败 %s：%s", sha256, error)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stop(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+derivative_worker = DerivativeWorker(max_workers=settings.media_derivative_workers)
+
+
+def resolve(sha256: str, variant: Optional[str]) -> Path:
+    """读取接口用：派生图存在时返回派生图路径，否则返回原文件路径"""
+    if variant in store.DERIVATIVE_VARIANTS:
+        path = store.derivative_path(sha256, variant)
+        if path.exists():
+            return path
+    return store.object_path(sha256)
@@ -0,0 +1,20 @@
+from sqlalchemy import BigInteger, CheckConstraint, Column, DateTime, Integer, String
+from sqlalchemy.sql import func
+
+from app.db import Base
+
+
+class MediaObject(Base):
+    __tablename__ = "MediaObjects"
+
+    Sha256 = Column(String(64), primary_key=True)
+    SizeBytes = Column(BigInteger, nullable=False)
+    ContentType = Column(String(100), nullable=False)
+    OriginalName = Column(String(255))
+    RefCount = Column(Integer, nullable=False, default=0)
+    CreatedAt = Column(DateTime, nullable=False, server_default=func.sysutcdatetime())
+    LastReferencedAt = Column(DateTime, nullable=False, server_default=func.sysutcdatetime())
+
+    __table_args__ = (
+        CheckConstraint("RefCount >= 0", name="CK_MediaObjects_RefCount"),
+    )
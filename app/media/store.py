@@ -0,0 +1,334 @@
+"""
+内容寻址媒体存储
+文件以 SHA-256 命名，存放在 media_store_dir/ab/cd/<sha256> 两级分片目录下，每级最多 256 个子目录，
+单个目录的文件数不会随总量线性增长；相同内容（红外相机重复上传的同一帧）只保存一份。
+dbo.MediaObjects 记录大小、类型和引用计数，业务表保存 /api/media/<sha256> 形式的地址，
+写入、替换或删除地址时增减引用计数；引用计数归零超过 media_gc_grace_hours 的文件由清理任务删除。
+
+放置新文件前先在独立的短事务中登记元数据（引用计数不变），再在业务事务中增加引用：
+业务事务回滚时文件仍有一行引用计数为 0 的元数据，由清理任务按宽限期删除，不会成为孤立文件。
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import SessionLocal
+
+MEDIA_URL_PREFIX = "/api/media/"
+ROOT = Path(settings.media_store_dir).resolve()
+TMP_DIR = ROOT / "tmp"
+
+DERIVATIVE_VARIANTS = ("thumb", "preview")
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+# ---------- 文件操作（同步，在线程池中调用） ----------
+
+def unlink(path) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"文件超过大小上限（{limit // (1024 * 1024)} MB）")
+
+
+def copy_to_temp(src: BinaryIO, dest_dir: Path, max_bytes: float) -> Tuple[str, int, str]:
+    """分块复制到目标目录下的临时文件，同时计算 SHA-256，返回 (临时文件, 字节数, sha256)"""
+    chunk_size = settings.upload_copy_chunk_bytes
+    digest = hashlib.sha256()
+    size = 0
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest_dir, prefix=".upload_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large(int(max_bytes))
+                digest.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        unlink(tmp)
+        raise
+    return tmp, size, digest.hexdigest()
+
+
+def move_into(src: str, dest: Path) -> None:
+    """原子地放到目标位置；跨文件系统时先复制到目标目录的临时文件再重命名"""
+    try:
+        os.replace(src, dest)
+        return
+    except OSError:
+        pass
+    with open(src, "rb") as f:
+        tmp, _, _ = copy_to_temp(f, dest.parent, float("inf"))
+    os.replace(tmp, dest)
+    unlink(src)
+
+
+def file_sha256(path: Path) -> str:
+    chunk_size = settings.upload_copy_chunk_bytes
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def object_path(sha256: str) -> Path:
+    return ROOT / sha256[:2] / sha256[2:4] / sha256
+
+
+def derivative_path(sha256: str, variant: str) -> Path:
+    """缩略图/预览图与原文件放在同一分片目录"""
+    return object_path(sha256).with_name(f"{sha256}.{variant}.jpg")
+
+
+def place(tmp: str, sha256: str) -> bool:
+    """把临时文件放到内容地址；内容已存在时丢弃临时文件。返回是否为新文件"""
+    dest = object_path(sha256)
+    if dest.exists():
+        unlink(tmp)
+        return False
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    move_into(tmp, dest)
+    return True
+
+
+# ---------- 地址与引用计数 ----------
+
+def is_sha256(value: str) -> bool:
+    return bool(_SHA256_RE.match(value))
+
+
+def media_url(sha256: str) -> str:
+    return f"{MEDIA_URL_PREFIX}{sha256}"
+
+
+def sha_from_url(path: Optional[str]) -> Optional[str]:
+    """业务表中的地址是媒体存储地址时返回其 sha256，否则（旧的 uploads 路径、外部地址）返回 None"""
+    if not path or not path.startswith(MEDIA_URL_PREFIX):
+        return None
+    sha256 = path[len(MEDIA_URL_PREFIX):].split("?", 1)[0].lower()
+    return sha256 if is_sha256(sha256) else None
+
+
+def derivative_url(path: Optional[str], variant: str) -> Optional[str]:
+    """业务表中的媒体地址对应的派生图地址；旧的 uploads 路径等原样返回"""
+    if not path or sha_from_url(path) is None:
+        return path or None
+    return f"{path}?variant={variant}"
+
+
+def guess_content_type(filename: Optional[str], declared: Optional[str]) -> str:
+    if declared and declared != "application/octet-stream":
+        return declared[:100]
+    guessed, _ = mimetypes.guess_type(filename or "")
+    return guessed or "application/octet-stream"
+
+
+def register(db: Session, sha256: str, size: int, content_type: str,
+             filename: Optional[str] = None, refs: int = 1) -> None:
+    """新内容插入元数据，已有内容引用计数加 refs（HOLDLOCK 避免并发上传同一内容时重复插入）"""
+    db.execute(
+        text(
+            """
+            MERGE dbo.MediaObjects WITH (HOLDLOCK) AS t
+            USING (SELECT :sha AS Sha256) AS s ON t.Sha256 = s.Sha256
+            WHEN MATCHED THEN
+                UPDATE SET RefCount = t.RefCount + :refs, LastReferencedAt = SYSUTCDATETIME()
+            WHEN NOT MATCHED THEN
+                INSERT (Sha256, SizeBytes, ContentType, OriginalName, RefCount)
+                VALUES (:sha, :size, :ctype, :name, :refs);
+            """
+        ),
+        {"sha": sha256, "size": size, "ctype": content_type, "name": (filename or "")[:255] or None, "refs": refs},
+    )
+
+
+def place_registered(tmp: str, sha256: str, size: int, content_type: str, filename: Optional[str] = None) -> bool:
+    """
+    先在独立事务中登记元数据（引用计数不变，刷新 LastReferencedAt 使清理任务在宽限期内不删除），
+    再放置文件，返回是否为新文件。调用方当前事务不能已锁定同一内容的元数据行。
+    """
+    own = SessionLocal()
+    try:
+        register(own, sha256, size, content_type, filename, refs=0)
+        own.commit()
+    finally:
+        own.close()
+    return place(tmp, sha256)
+
+
+def _saved(sha256: str, size: int, content_type: str, created: bool) -> dict:
+    return {
+        "file_path": media_url(sha256),
+        "size": size,
+        "sha256": sha256,
+        "content_type": content_type,
+        "deduplicated": not created,
+    }
+
+
+def store_file(db: Session, tmp: str, size: int, sha256: str,
+               filename: Optional[str] = None, content_type: Optional[str] = None) -> dict:
+    """
+    把已写好并计算过摘要的临时文件放入存储，并增加一次引用；调用方负责提交。
+    文件放置前元数据已单独提交，调用方事务回滚时文件由清理任务回收。
+    """
+    content_type = guess_content_type(filename, content_type)
+    created = place_registered(tmp, sha256, size, content_type, filename)
+    register(db, sha256, size, content_type, filename)
+    return _saved(sha256, size, content_type, created)
+
+
+async def store_upload(db: Session, file, max_bytes: int) -> dict:
+    """表单上传：UploadFile 已缓存在临时文件中，分块复制到存储临时目录后按内容地址放置"""
+    tmp, size, sha256 = await run_in_threadpool(copy_to_temp, file.file, TMP_DIR, max_bytes)
+    content_type = guess_content_type(file.filename, file.content_type)
+    try:
+        created = await run_in_threadpool(place_registered, tmp, sha256, size, content_type, file.filename)
+    except BaseException:
+        unlink(tmp)
+        raise
+    register(db, sha256, size, content_type, file.filename)
+    return _saved(sha256, size, content_type, created)
+
+
+def acquire(db: Session, path: Optional[str]) -> None:
+    sha256 = sha_from_url(path)
+    if sha256 is None:
+        return
+    db.execute(
+        text(
+            "UPDATE dbo.MediaObjects SET RefCount = RefCount + 1, LastReferencedAt = SYSUTCDATETIME() "
+            "WHERE Sha256 = :sha"
+        ),
+        {"sha": sha256},
+    )
+
+
+def release(db: Session, path: Optional[str]) -> None:
+    sha256 = sha_from_url(path)
+    if sha256 is None:
+        return
+    db.execute(
+        text(
+            "UPDATE dbo.MediaObjects SET RefCount = RefCount - 1, LastReferencedAt = SYSUTCDATETIME() "
+            "WHERE Sha256 = :sha AND RefCount > 0"
+        ),
+        {"sha": sha256},
+    )
+
+
+def replace_reference(db: Session, old_path: Optional[str], new_path: Optional[str]) -> None:
+    """业务记录的文件地址从 old_path 改为 new_path 时调用（新地址已由 store_* 计入引用的除外）"""
+    if old_path == new_path:
+        return
+    acquire(db, new_path)
+    release(db, old_path)
+
+
+def get_object(db: Session, sha256: str) -> Optional[dict]:
+    return db.execute(
+        text("SELECT Sha256, SizeBytes, ContentType, RefCount FROM dbo.MediaObjects WHERE Sha256 = :sha"),
+        {"sha": sha256},
+    ).mappings().first()
+
+
+def list_image_objects(db: Session, limit: int, after: Optional[str] = None) -> list:
+    return db.execute(
+        text(
+            """
+            SELECT TOP (:limit) Sha256, ContentType FROM dbo.MediaObjects
+            WHERE ContentType LIKE 'image/%' AND RefCount > 0 AND Sha256 > :after
+            ORDER BY Sha256
+            """
+        ),
+        {"limit": limit, "after": after or ""},
+    ).mappings().all()
+
+
+def stats(db: Session) -> dict:
+    row = db.execute(
+        text(
+            """
+            SELECT COUNT(*) AS Objects,
+                   ISNULL(SUM(SizeBytes), 0) AS StoredBytes,
+                   ISNULL(SUM(CAST(RefCount AS BIGINT)), 0) AS Refs,
+                   ISNULL(SUM(SizeBytes * CAST(RefCount AS BIGINT)), 0) AS LogicalBytes,
+                   SUM(CASE WHEN RefCount = 0 THEN 1 ELSE 0 END) AS Unreferenced
+            FROM dbo.MediaObjects
+            """
+        )
+    ).mappings().first()
+    return {
+        "objects": int(row["Objects"]),
+        "stored_bytes": int(row["StoredBytes"]),
+        "references": int(row["Refs"]),
+        "logical_bytes": int(row["LogicalBytes"]),
+        "unreferenced": int(row["Unreferenced"] or 0),
+    }
+
+
+def collect_garbage(db: Session, limit: int = 500) -> dict:
+    """
+    删除引用计数归零超过宽限期的文件。文件先在事务内移到临时目录，提交后再删除：
+    并发上传同一内容时 MERGE 会等待该行锁释放，之后发现文件不存在会重新放置。
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=settings.media_gc_grace_hours)
+    deleted = db.execute(
+        text(
+            """
+            DELETE TOP (:limit) FROM dbo.MediaObjects
+            OUTPUT deleted.Sha256, deleted.SizeBytes
+            WHERE RefCount = 0 AND LastReferencedAt < :cutoff
+            """
+        ),
+        {"limit": limit, "cutoff": cutoff},
+    ).mappings().all()
+
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    trash = []
+    try:
+        for r in deleted:
+            src = object_path(r["Sha256"])
+            dest = TMP_DIR / f"{r['Sha256']}.gc"
+            try:
+                os.replace(src, dest)
+                trash.append(dest)
+            except FileNotFoundError:
+                continue
+        db.commit()
+    except BaseException:
+        db.rollback()
+        for dest in trash:
+            os.replace(dest, object_path(dest.stem))
+        raise
+
+    for dest in trash:
+        unlink(dest)
+    for r in deleted:
+        for variant in DERIVATIVE_VARIANTS:
+            unlink(derivative_path(r["Sha256"], variant))
+    return {"deleted": len(deleted), "freed_bytes": sum(int(r["SizeBytes"]) for r in deleted)}
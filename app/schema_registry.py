@@ -0,0 +1,184 @@
+"""
+数据库结构能力登记
+启动时一次性读取 dbo 下的表、列、视图、存储过程/函数和触发器，接口按缓存的结果判断
+某个表或列是否存在，不再在每次请求时查询 INFORMATION_SCHEMA；
+管理员可通过刷新接口在执行迁移脚本后重新探测。启动时会把缺失的结构和未能加载的模块写入日志。
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class Requirement(NamedTuple):
+    kind: str  # table / column / view / procedure / function / trigger
+    name: str
+    column: Optional[str]
+    feature: str
+    required: bool
+
+
+def _req(kind: str, name: str, feature: str, column: Optional[str] = None, required: bool = True) -> Requirement:
+    return Requirement(kind, name, column, feature, required)
+
+
+# 各模块依赖的数据库对象。只有 required=False 的对象在接口中按探测结果分支，缺失时相关功能降级；
+# required=True 的对象（如 Reservations.ParkName / UserId）代码直接使用，缺失时只在启动日志中报错，
+# 相关接口会在执行 SQL 时失败，需先执行对应的迁移脚本
+REQUIREMENTS: List[Requirement] = [
+    _req("table", "用户", "用户与登录"),
+    _req("table", "用户会话", "登录会话"),
+    _req("table", "Visitors", "游客管理"),
+    _req("table", "Reservations", "预约管理"),
+    _req("column", "Reservations", "预约公园名称（fix_reservations_parkname.sql）", column="ParkName"),
+    _req("column", "Reservations", "预约所属用户（fix_reservations_parkname.sql）", column="UserId"),
+    _req("table", "Visits", "入园记录"),
+    _req("table", "VisitorTracks", "游客轨迹"),
+    _req("column", "VisitorTracks", "越界轨迹处理状态", column="Status", required=False),
+    _req("table", "FlowControls", "区域流量控制"),
+    _req("view", "v_AreaFlowControlStatus", "区域流量状态"),
+    _req("procedure", "sp_RecalcFlowControl", "流量重算"),
+    _req("trigger", "TR_Visits_FlowControl", "入园/出园自动重算流量"),
+    _req("table", "Alerts", "预警列表", required=False),
+    _req("table", "ReservationQuotas", "预约配额"),
+    _req("table", "VisitSyncEvents", "闸机批量同步"),
+    _req("table", "TicketCheckIns", "电子票核销"),
+    _req("table", "VisitorTrackArchives", "轨迹压缩归档"),
+    _req("table", "VisitorHeatmapBins", "游客密度热力图"),
+    _req("table", "IdempotencyKeys", "创建接口幂等键"),
+    _req("table", "MediaObjects", "媒体存储"),
+    _req("table", "物种表", "物种管理"),
+    _req("table", "物种监测记录表", "物种监测记录"),
+    _req("column", "物种监测记录表", "监测记录空间网格筛选", column="grid_cell", required=False),
+    _req("table", "AreaBoundaries", "按区域边界筛选监测记录", required=False),
+    _req("column", "物种监测记录表", "连拍去重计数", column="duplicate_count", required=False),
+    _req("table", "RecordReviewClaims", "分析员工作队列（领取待核实 / 待分析记录）", required=False),
+    _req("table", "SpeciesSummary", "物种监测汇总", required=False),
+    _req("table", "SpeciesMonthlyCounts", "物种月度监测记录数", required=False),
+    _req("view", "V_物种综合信息", "物种综合信息"),
+]
+
+_PROBE_SQL = """
+    SELECT o.name AS ObjectName, RTRIM(o.type) AS ObjectType, c.name AS ColumnName
+    FROM sys.objects o
+    LEFT JOIN sys.columns c ON c.object_id = o.object_id AND o.type IN ('U', 'V')
+    WHERE o.schema_id = SCHEMA_ID(N'dbo')
+      AND o.type IN ('U', 'V', 'P', 'FN', 'IF', 'TF', 'TR')
+"""
+
+_KIND_BY_TYPE = {
+    "U": "table",
+    "V": "view",
+    "P": "procedure",
+    "FN": "function",
+    "IF": "function",
+    "TF": "function",
+    "TR": "trigger",
+}
+
+
+class SchemaCapabilities:
+    def __init__(self):
+        self.loaded_at: Optional[datetime] = None
+        self._objects: Dict[str, Set[str]] = {kind: set() for kind in set(_KIND_BY_TYPE.values())}
+        self._columns: Dict[str, Set[str]] = {}
+        self.router_errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str) -> str:
+        # SQL Server 默认排序规则不区分大小写
+        return name.lower()
+
+    def probe(self, db: Session) -> None:
+        objects: Dict[str, Set[str]] = {kind: set() for kind in set(_KIND_BY_TYPE.values())}
+        columns: Dict[str, Set[str]] = {}
+        for r in db.execute(text(_PROBE_SQL)).mappings():
+            kind = _KIND_BY_TYPE[r["ObjectType"]]
+            name = self._key(r["ObjectName"])
+            objects[kind].add(name)
+            if r["ColumnName"] is not None:
+                columns.setdefault(name, set()).add(self._key(r["ColumnName"]))
+        with self._lock:
+            self._objects = objects
+            self._columns = columns
+            self.loaded_at = datetime.now()
+
+    def ensure(self, db: Session) -> "SchemaCapabilities":
+        """启动探测失败时在第一次使用时补做一次"""
+        if self.loaded_at is None:
+            self.probe(db)
+        return self
+
+    def has(self, kind: str, name: str) -> bool:
+        return self._key(name) in self._objects.get(kind, ())
+
+    def has_table(self, name: str) -> bool:
+        return self.has("table", name)
+
+    def has_view(self, name: str) -> bool:
+        return self.has("view", name)
+
+    def has_procedure(self, name: str) -> bool:
+        return self.has("procedure", name)
+
+    def has_column(self, table: str, column: str) -> bool:
+        return self._key(column) in self._columns.get(self._key(table), ())
+
+    def satisfied(self, req: Requirement) -> bool:
+        if req.kind == "column":
+            return self.has_column(req.name, req.column)
+        return self.has(req.kind, req.name)
+
+    def missing(self) -> List[dict]:
+        return [
+            {
+                "kind": r.kind,
+                "name": f"{r.name}.{r.column}" if r.column else r.name,
+                "feature": r.feature,
+                "required": r.required,
+            }
+            for r in REQUIREMENTS
+            if not self.satisfied(r)
+        ]
+
+    def report(self) -> dict:
+        return {
+            "loaded_at": self.loaded_at.isoformat(timespec="seconds") if self.loaded_at else None,
+            "counts": {kind: len(names) for kind, names in self._objects.items()},
+            "missing": self.missing(),
+            "router_errors": dict(self.router_errors),
+        }
+
+    def log_report(self) -> None:
+        for module, error in self.router_errors.items():
+            logger.error("模块 %s 未加载：%s", module, error)
+        if self.loaded_at is None:
+            return
+        for item in self.missing():
+            if item["required"]:
+                logger.error("数据库缺少%s %s（%s）", item["kind"], item["name"], item["feature"])
+            else:
+                logger.warning("数据库缺少%s %s，%s功能将降级", item["kind"], item["name"], item["feature"])
+
+
+schema = SchemaCapabilities()
+
+
+def probe_at_startup() -> None:
+    """启动时探测数据库结构；数据库不可用时不阻止启动，首次使用时再探测"""
+    db = SessionLocal()
+    try:
+        schema.probe(db)
+    except Exception:
+        logger.exception("数据库结构探测失败")
+    finally:
+        db.close()
+    schema.log_report()
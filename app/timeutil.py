@@ -0,0 +1,13 @@
+"""
+时间工具
+库中的时间列（EntryTime、LocateTime、监测时间等）均为服务器本地时间、不带时区，
+接口收到带时区的时间（...Z、+08:00）时先换算为本地时间再去掉时区，避免与不带时区的时间比较时报错。
+"""
+from datetime import datetime
+from typing import Optional
+
+
+def local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
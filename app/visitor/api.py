@@ -1,15 +1,34 @@
+import logging
+from datetime import date, datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.db import get_db
+from app.schema_registry import schema
+from app.timeutil import local_naive
+from app import idempotency
 from app.core.api import get_current_user
 from app.core import models as core_models
 from app.visitor import schemas
 from app.visitor import queries
+from app.visitor import identity_service
+from app.visitor import quota_service
+from app.visitor import waiting_room
+from app.visitor import ticket_service
+from app.visitor import visit_sync
+from app.visitor import approval_service
+from app.visitor import track_service
+from app.visitor import live_positions
+from app.visitor import heatmap_service
+from app.visitor.manifest_service import gate_manifest
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/visitor", tags=["游客智能管理"])
 
 
@@ -46,22 +65,41 @@ def list_my_reservations_api(
     return queries.list_my_reservations(db, current_user.id)
 
 
+@router.post("/queue/join", response_model=schemas.QueueStatusOut)
+def join_booking_queue():
+    """进入预约等候室，获取排队令牌（不访问数据库）"""
+    return waiting_room.join()
+
+
+@router.get("/queue/status", response_model=schemas.QueueStatusOut)
+def get_booking_queue_status(queue_token: str):
+    """查询排位与预计等待时间（不访问数据库）"""
+    return waiting_room.get_status(queue_token)
+
+
 @router.post("/reservations", response_model=dict)
 def create_reservation(
     payload: schemas.ReservationCreate,
+    idem: idempotency.IdempotencyGuard = Depends(idempotency.guard()),
     db: Session = Depends(get_db),
     current_user: core_models.User = Depends(get_current_user),
+    _admission: None = Depends(waiting_room.admit_booking),
 ):
     _require_role(current_user, {"游客", "公园管理人员", "系统管理员"})
 
+    idem.reserve(db)
     try:
         phone = payload.phone or current_user.phone
-        visitor_id = queries.get_or_create_visitor_id(db, payload.visitor_name, payload.id_card_no, phone)
+        visitor_id = identity_service.resolve_visitor_id(db, payload.id_card_no, payload.visitor_name, phone)
 
         ticket_amount = payload.ticket_amount
         if ticket_amount is None:
             ticket_amount = float(payload.party_size) * 120.0
 
+        if not quota_service.take(db, payload.park_name, payload.reserve_date, payload.time_slot, payload.party_size):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="该日期/时段预约名额不足")
+
         reservation_id = queries.create_reservation(
             db,
             visitor_id=visitor_id,
@@ -74,8 +112,13 @@ def create_reservation(
             user_id=current_user.id,
         )
 
+        result = idem.complete(
+            db, {"reservation_id": reservation_id, "ticket_amount": ticket_amount, "status": "待审核"}, commit=False
+        )
         db.commit()
-        return {"reservation_id": reservation_id, "ticket_amount": ticket_amount, "status": "待审核"}
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"预约创建失败: {str(e)}")
@@ -89,17 +132,19 @@ def cancel_my_reservation(
     current_user: core_models.User = Depends(get_current_user),
 ):
     _require_role(current_user, {"游客"})
-    visitor_id = db.execute(
-        text("SELECT VisitorId FROM dbo.Visitors WHERE IdCardNo = :idc"),
-        {"idc": id_card_no},
-    ).scalar()
+    visitor_id = identity_service.lookup_visitor_id(db, id_card_no)
     if not visitor_id:
         raise HTTPException(status_code=404, detail="游客不存在")
 
-    changed = queries.cancel_reservation(db, reservation_id, int(visitor_id))
-    db.commit()
-    if changed == 0:
+    cancelled = queries.cancel_reservation(db, reservation_id, int(visitor_id))
+    if not cancelled:
+        db.rollback()
         raise HTTPException(status_code=400, detail="取消失败：订单不存在或状态不可取消")
+    quota_service.release(
+        db, cancelled["ParkName"], cancelled["ReserveDate"], cancelled["TimeSlot"], int(cancelled["PartySize"])
+    )
+    db.commit()
+    gate_manifest.remove(reservation_id)
     return {"success": True}
 
 
@@ -110,33 +155,88 @@ def enter_park(
     current_user: core_models.User = Depends(get_current_user),
 ):
     _require_role(current_user, {"公园管理人员", "系统管理员"})
-    visitor_row = db.execute(
-        text("SELECT VisitorId, VisitorName, Phone FROM dbo.Visitors WHERE IdCardNo = :idc"),
-        {"idc": payload.id_card_no},
-    ).mappings().first()
-    if not visitor_row:
-        raise HTTPException(status_code=404, detail="游客不存在，请先创建游客/预约")
 
-    # 验证预约编号是否存在且属于该游客
+    # 入园时间以服务器时间为准，只接受小幅时钟偏差；离线闸机的事件走批量同步接口
+    now = datetime.now()
+    entry_time = local_naive(payload.entry_time) or now
+    if abs((entry_time - now).total_seconds()) > settings.entry_time_max_skew_seconds:
+        raise HTTPException(status_code=400, detail="入园时间与服务器时间相差过大，离线记录请使用闸机批量同步")
+
+    # 电子票入园：本地验签，按主键确认预约仍有效，入园记录与核销在同一事务中写入
+    if payload.ticket:
+        try:
+            claims = ticket_service.verify(payload.ticket, at=entry_time)
+        except ticket_service.TicketError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        row = queries.get_reservation(db, claims.reservation_id)
+        if not row or row["ReserveStatus"] != "已确认" or int(row["VisitorId"]) != claims.visitor_id:
+            raise HTTPException(status_code=400, detail="预约已取消或未确认")
+        try:
+            visit_id = queries.create_visit(
+                db,
+                visitor_id=claims.visitor_id,
+                area_id=payload.area_id,
+                entry_method=payload.entry_method,
+                reservation_id=claims.reservation_id,
+                entry_time=entry_time,
+            )
+            if not queries.claim_ticket_check_in(db, claims.reservation_id, claims.reserve_date, visit_id):
+                db.rollback()
+                raise HTTPException(status_code=409, detail="该电子票今日已入园")
+            db.commit()
+        except HTTPException:
+            raise
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"入园登记失败: {str(e)}")
+        return {
+            "visit_id": visit_id,
+            "reservation_id": claims.reservation_id,
+            "party_size": claims.party_size,
+        }
+
+    if not payload.id_card_no:
+        raise HTTPException(status_code=400, detail="请提供身份证号或电子票")
+
+    # 按当日入园名单（内存）确定游客，未命中时回源数据库
     reservation_id = payload.reservation_id
+    gate_manifest.ensure_loaded(db)
+    visitor_id = None
     if reservation_id is not None:
-        res_check = db.execute(
-            text("SELECT ReservationId, VisitorId FROM dbo.Reservations WHERE ReservationId = :rid"),
-            {"rid": reservation_id}
-        ).mappings().first()
-        if not res_check:
+        entry = gate_manifest.get(reservation_id)
+        if entry is not None:
+            if entry.id_card_no != payload.id_card_no:
+                raise HTTPException(status_code=400, detail="预约编号与游客身份证不匹配")
+            visitor_id = entry.visitor_id
+    else:
+        entries = gate_manifest.find_by_id_card(payload.id_card_no)
+        if entries:
+            visitor_id = entries[0].visitor_id
+
+    if visitor_id is None:
+        visitor_id = identity_service.lookup_visitor_id(db, payload.id_card_no)
+        if not visitor_id:
+            raise HTTPException(status_code=404, detail="游客不存在，请先创建游客/预约")
+
+    # 预约状态总按主键回源确认：名单定期重载，其他进程取消的预约在重载前仍在名单中
+    if reservation_id is not None:
+        row = queries.get_reservation(db, reservation_id)
+        if not row:
             raise HTTPException(status_code=400, detail="预约编号不存在")
-        if int(res_check["VisitorId"]) != int(visitor_row["VisitorId"]):
+        if int(row["VisitorId"]) != visitor_id:
             raise HTTPException(status_code=400, detail="预约编号与游客身份证不匹配")
+        if row["ReserveStatus"] == "已取消":
+            gate_manifest.remove(reservation_id)
+            raise HTTPException(status_code=400, detail="预约已取消")
 
     try:
         visit_id = queries.create_visit(
             db,
-            visitor_id=int(visitor_row["VisitorId"]),
+            visitor_id=visitor_id,
             area_id=payload.area_id,
             entry_method=payload.entry_method,
             reservation_id=reservation_id,
-            entry_time=payload.entry_time,
+            entry_time=entry_time,
         )
         db.commit()
         return {"visit_id": visit_id}
@@ -156,34 +256,49 @@ def exit_park(
     db.commit()
     if changed == 0:
         raise HTTPException(status_code=404, detail="入园记录不存在")
+    live_positions.position_index.evict_visit(visit_id)
     return {"success": True}
 
 
+@router.post("/visits/sync", response_model=dict)
+def sync_visits(
+    payload: schemas.VisitSyncRequest,
+    db: Session = Depends(get_db),
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """闸机批量/离线同步入园出园事件：整批一个事务，每个受影响区域只重算一次流量"""
+    _require_role(current_user, {"公园管理人员", "系统管理员"})
+    try:
+        result = visit_sync.sync_events(db, payload.events, device_id=payload.device_id)
+        db.commit()
+        return result
+    except IntegrityError:
+        # 同一批事件被并发重放，幂等键主键冲突
+        db.invalidate()
+        raise HTTPException(status_code=409, detail="事件正在被其它请求同步，请稍后重试")
+    except Exception:
+        # 连接上可能残留暂停流量重算的会话标记，直接废弃该连接；错误细节只写日志
+        logger.exception("闸机事件同步失败：DeviceId=%s", payload.device_id)
+        db.invalidate()
+        raise HTTPException(status_code=500, detail="同步失败，请稍后重试")
+
+
 @router.post("/tracks", response_model=dict)
 def create_track(
     payload: schemas.TrackCreate,
+    idem: idempotency.IdempotencyGuard = Depends(idempotency.guard()),
     db: Session = Depends(get_db),
     current_user: core_models.User = Depends(get_current_user),
 ):
     _require_role(current_user, {"游客", "公园管理人员", "系统管理员"})
+    idem.reserve(db)
 
-    visitor_row = db.execute(
-        text("SELECT VisitorId, VisitorName, Phone FROM dbo.Visitors WHERE IdCardNo = :idc"),
-        {"idc": payload.id_card_no},
-    ).mappings().first()
-    if not visitor_row:
-        # 自动创建游客记录（用于模拟轨迹测试）
-        visitor_id = queries.get_or_create_visitor_id(
-            db,
-            visitor_name="模拟游客",
-            id_card_no=payload.id_card_no,
-            phone=None,
-        )
-        visitor_row = {"VisitorId": visitor_id}
+    # 游客不存在时自动创建（用于模拟轨迹测试）
+    visitor_id = identity_service.ensure_visitor_id(db, payload.id_card_no, default_name="模拟游客")
 
     track_id = queries.create_track(
         db,
-        visitor_id=int(visitor_row["VisitorId"]),
+        visitor_id=visitor_id,
         visit_id=payload.visit_id,
         locate_time=payload.locate_time,
         latitude=payload.latitude,
@@ -191,8 +306,77 @@ def create_track(
         area_id=payload.area_id,
         is_out_of_route=payload.is_out_of_route,
     )
+    result = idem.complete(db, {"track_id": track_id}, commit=False)
+    db.commit()
+    live_positions.record(
+        visitor_id=visitor_id,
+        visit_id=payload.visit_id,
+        latitude=payload.latitude,
+        longitude=payload.longitude,
+        area_id=payload.area_id,
+        locate_time=payload.locate_time,
+        is_out_of_route=payload.is_out_of_route,
+    )
+    heatmap_service.heatmap_accumulator.add(payload.locate_time or datetime.now(), payload.latitude, payload.longitude)
+    return result
+
+
+@router.get("/live-positions", response_model=dict)
+def get_live_positions(
+    min_lat: float = None,
+    min_lng: float = None,
+    max_lat: float = None,
+    max_lng: float = None,
+    area_id: int = None,
+    out_of_route_only: bool = False,
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """在园游客最新位置（内存索引），可按视野范围 bbox 过滤，不查询数据库"""
+    _require_role(current_user, {"公园管理人员", "系统管理员"})
+    bbox_args = (min_lat, min_lng, max_lat, max_lng)
+    if any(v is not None for v in bbox_args) and any(v is None for v in bbox_args):
+        raise HTTPException(status_code=400, detail="视野范围需同时提供 min_lat/min_lng/max_lat/max_lng")
+    bbox = bbox_args if min_lat is not None else None
+
+    positions = live_positions.position_index.query(bbox=bbox, area_id=area_id, out_of_route_only=out_of_route_only)
+    return {
+        "count": len(positions),
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "positions": [schemas.LivePositionOut(**p._asdict()) for p in positions],
+    }
+
+
+@router.get("/heatmap", response_model=dict)
+def get_visitor_heatmap(
+    from_time: datetime = Query(..., alias="from"),
+    to_time: datetime = Query(..., alias="to"),
+    resolution: int = Query(1, ge=1, le=100, description="合并网格边长，基础网格的倍数"),
+    db: Session = Depends(get_db),
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """游客密度热力图：读取预聚合网格，不扫描原始轨迹"""
+    _require_role(current_user, {"公园管理人员", "系统管理员"})
+    from_time, to_time = local_naive(from_time), local_naive(to_time)
+    if to_time <= from_time:
+        raise HTTPException(status_code=400, detail="结束时间必须晚于开始时间")
+    return heatmap_service.get_heatmap(db, from_time, to_time, resolution=resolution)
+
+
+@router.post("/heatmap/rebuild", response_model=dict)
+def rebuild_visitor_heatmap(
+    from_time: datetime = Query(..., alias="from"),
+    to_time: datetime = Query(..., alias="to"),
+    db: Session = Depends(get_db),
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """按原始轨迹重建时间范围内的热力图网格（首次部署或数据修复时使用）"""
+    _require_role(current_user, {"系统管理员"})
+    from_time, to_time = local_naive(from_time), local_naive(to_time)
+    if to_time <= from_time:
+        raise HTTPException(status_code=400, detail="结束时间必须晚于开始时间")
+    result = heatmap_service.rebuild(db, from_time, to_time)
     db.commit()
-    return {"track_id": track_id}
+    return result
 
 
 @router.get("/tracks/out-of-route", response_model=list[schemas.OutOfRouteTrackOut])
@@ -272,16 +456,133 @@ def confirm_reservation(
     if payload.status not in ["已确认", "已取消", "已完成"]:
         raise HTTPException(status_code=400, detail="无效的状态值")
     
-    result = db.execute(
-        text("UPDATE dbo.Reservations SET ReserveStatus = :st WHERE ReservationId = :rid"),
-        {"st": payload.status, "rid": reservation_id}
+    previous = queries.set_reservation_status(db, reservation_id, payload.status)
+    if not previous:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="预约记录不存在")
+
+    if not quota_service.apply_status_change(db, previous["ReserveStatus"], payload.status, previous):
+        db.rollback()
+        raise HTTPException(status_code=409, detail="该日期/时段预约名额不足，无法恢复预约")
+    db.commit()
+    gate_manifest.on_status_change(db, reservation_id, previous["ReserveDate"], payload.status)
+
+    result = {"success": True, "new_status": payload.status}
+    if payload.status == "已确认":
+        result["ticket"] = ticket_service.ticket_for_row(previous)
+    return result
+
+
+@router.post("/reservations/approve", response_model=dict)
+def approve_reservations(
+    payload: schemas.ReservationBatchApprove,
+    db: Session = Depends(get_db),
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """批量审核待审核预约：一条集合式语句完成，按配额容量决定每条预约能否通过"""
+    _require_role(current_user, {"公园管理人员", "系统管理员"})
+    if not payload.reservation_ids and payload.reserve_date is None:
+        raise HTTPException(status_code=400, detail="请指定预约编号列表或预约日期")
+
+    result = approval_service.approve(
+        db,
+        reservation_ids=payload.reservation_ids,
+        reserve_date=payload.reserve_date,
+        park_name=payload.park_name,
+        time_slot=payload.time_slot,
+        max_party_size=payload.max_party_size,
     )
     db.commit()
-    
-    if result.rowcount == 0:
+    approval_service.refresh_manifest(db, result.pop("approved_dates"))
+    return result
+
+
+@router.post("/reservations/auto-approve", response_model=dict)
+def run_auto_approve(
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """立即按自动审核规则运行一次"""
+    _require_role(current_user, {"公园管理人员", "系统管理员"})
+    return {"summary": approval_service.auto_approver.run_once()}
+
+
+@router.get("/gate/manifest", response_model=dict)
+def download_gate_manifest(
+    park_name: str = None,
+    time_slot: str = None,
+    reload: bool = False,
+    db: Session = Depends(get_db),
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """下载当日闸机入园名单（紧凑格式，身份证号仅含摘要）"""
+    _require_role(current_user, {"公园管理人员", "系统管理员"})
+    if reload:
+        gate_manifest.load(db)
+    else:
+        gate_manifest.ensure_loaded(db)
+    return gate_manifest.export_compact(park_name=park_name, time_slot=time_slot)
+
+
+@router.get("/reservations/{reservation_id}/ticket", response_model=schemas.EntryTicketOut)
+def get_reservation_ticket(
+    reservation_id: int,
+    db: Session = Depends(get_db),
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """获取已确认预约的电子入园票（二维码内容）"""
+    _require_role(current_user, {"游客", "公园管理人员", "系统管理员"})
+    row = queries.get_reservation(db, reservation_id)
+    if not row:
         raise HTTPException(status_code=404, detail="预约记录不存在")
-    
-    return {"success": True, "new_status": payload.status}
+    if current_user.role_type == "游客" and row["UserId"] != current_user.id:
+        raise HTTPException(status_code=403, detail="无权访问该预约")
+    if row["ReserveStatus"] != "已确认":
+        raise HTTPException(status_code=400, detail="预约尚未确认，无法生成电子票")
+    return {
+        "reservation_id": row["ReservationId"],
+        "reserve_date": row["ReserveDate"],
+        "time_slot": row["TimeSlot"],
+        "party_size": row["PartySize"],
+        "ticket": ticket_service.ticket_for_row(row),
+    }
+
+
+@router.get("/quotas", response_model=list[schemas.ReservationQuotaOut])
+def list_reservation_quotas(
+    reserve_date: date = None,
+    park_name: str = None,
+    db: Session = Depends(get_db),
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """查询预约配额（容量/剩余名额）"""
+    _require_role(current_user, {"游客", "公园管理人员", "系统管理员"})
+    return quota_service.list_quotas(db, reserve_date=reserve_date, park_name=park_name)
+
+
+@router.put("/quotas", response_model=dict)
+def set_reservation_quota(
+    payload: schemas.ReservationQuotaSet,
+    db: Session = Depends(get_db),
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """设置某公园某日期时段的预约容量"""
+    _require_role(current_user, {"公园管理人员", "系统管理员"})
+    quota_service.set_capacity(db, payload.park_name, payload.reserve_date, payload.time_slot, payload.capacity)
+    db.commit()
+    return {"success": True}
+
+
+@router.post("/quotas/reconcile", response_model=dict)
+def reconcile_reservation_quotas(
+    from_date: date = None,
+    db: Session = Depends(get_db),
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """按实际预约对账剩余名额"""
+    _require_role(current_user, {"公园管理人员", "系统管理员"})
+    fixed = quota_service.reconcile(db, from_date=from_date)
+    db.commit()
+    return {"success": True, "fixed": [dict(r) for r in fixed]}
 
 
 @router.get("/alerts", response_model=list)
@@ -293,12 +594,8 @@ def list_alerts(
     """获取预警列表"""
     _require_role(current_user, {"公园管理人员", "系统管理员"})
     
-    # 检查Alerts表是否存在
-    table_exists = db.execute(
-        text("SELECT 1 FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'Alerts'")
-    ).scalar()
-    
-    if not table_exists:
+    # Alerts 表是否存在以启动时探测的结果为准
+    if not schema.ensure(db).has_table("Alerts"):
         return []
     
     try:
@@ -349,7 +646,7 @@ def handle_alert(
         source_table = alert_row.get("SourceTable")
         source_id = alert_row.get("SourceId")
         
-        if source_table == "VisitorTracks" and source_id:
+        if source_table == "VisitorTracks" and source_id and schema.ensure(db).has_column("VisitorTracks", "Status"):
             db.execute(
                 text("""
                     UPDATE dbo.VisitorTracks 
@@ -373,10 +670,11 @@ def handle_alert(
 def list_tracks(
     visitor_id: int = None,
     visit_id: int = None,
+    raw: bool = False,
     db: Session = Depends(get_db),
     current_user: core_models.User = Depends(get_current_user),
 ):
-    """获取游客轨迹列表"""
+    """获取游客轨迹列表，默认返回抽稀后的轨迹，raw=true 时返回全部原始定位点"""
     _require_role(current_user, {"公园管理人员", "系统管理员"})
     
     if visitor_id:
@@ -410,7 +708,29 @@ def list_tracks(
                 ORDER BY t.LocateTime DESC
             """)
         ).mappings().all()
-    return [dict(r) for r in rows]
+    rows = [dict(r) for r in rows]
+    if raw:
+        return track_service.with_archived_points(
+            db, rows, visitor_id=visitor_id, visit_id=visit_id, limit=500 if visitor_id or visit_id else 200
+        )
+    return track_service.simplify_rows(rows)
+
+
+@router.post("/tracks/compact", response_model=dict)
+def compact_tracks(
+    visit_id: int = None,
+    limit: int = 200,
+    tolerance_m: float = None,
+    db: Session = Depends(get_db),
+    current_user: core_models.User = Depends(get_current_user),
+):
+    """压缩已出园游客的轨迹（指定 visit_id 时只压缩该次入园），可由定时任务调用"""
+    _require_role(current_user, {"公园管理人员", "系统管理员"})
+    if visit_id is not None:
+        result = track_service.compact_visit(db, visit_id, tolerance_m=tolerance_m)
+        db.commit()
+        return result or {"visit_id": visit_id, "skipped": True}
+    return track_service.compact_finished_visits(db, limit=limit, tolerance_m=tolerance_m)
 
 # ========== 新增：区域列表接口（供前端地图/下拉框） ==========
 @router.get("/areas", response_model=list[dict])
@@ -0,0 +1,127 @@
+"""
+预约批量审核
+待审核预约按编号列表或筛选条件一次性审核：一个批处理内完成锁定、容量校验和状态更新，
+返回每个预约的处理结果；另提供按规则定时运行的自动审核线程（默认关闭）。
+"""
+import logging
+import threading
+from datetime import date
+from typing import List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.visitor import queries, ticket_service
+from app.visitor.manifest_service import gate_manifest
+from app.visitor.quota_service import quota_park_key
+
+logger = logging.getLogger(__name__)
+
+
+def approve(
+    db: Session,
+    reservation_ids: Optional[Sequence[int]] = None,
+    reserve_date: Optional[date] = None,
+    reserve_date_from: Optional[date] = None,
+    park_name: Optional[str] = None,
+    time_slot: Optional[str] = None,
+    max_party_size: Optional[int] = None,
+    with_tickets: bool = True,
+) -> dict:
+    """批量审核通过，调用方负责提交；待审核预约已占用名额，审核通过不再变动配额"""
+    rows = queries.approve_pending_reservations(
+        db,
+        default_capacity=settings.reservation_slot_capacity,
+        reservation_ids=reservation_ids,
+        reserve_date=reserve_date,
+        reserve_date_from=reserve_date_from,
+        park_name=quota_park_key(park_name) if park_name is not None else None,
+        time_slot=time_slot,
+        max_party_size=max_party_size,
+    )
+
+    results: List[dict] = []
+    approved_dates = set()
+    for r in rows:
+        item = {"reservation_id": r["ReservationId"], "outcome": r["Outcome"], "status": r["ReserveStatus"]}
+        if r["Outcome"] == "approved":
+            approved_dates.add(r["ReserveDate"])
+            if with_tickets:
+                item["ticket"] = ticket_service.ticket_for_row(r)
+        results.append(item)
+
+    if reservation_ids:
+        found = {r["ReservationId"] for r in rows}
+        results.extend(
+            {"reservation_id": rid, "outcome": "not_found", "status": None}
+            for rid in dict.fromkeys(reservation_ids)
+            if rid not in found
+        )
+
+    summary = {}
+    for item in results:
+        summary[item["outcome"]] = summary.get(item["outcome"], 0) + 1
+    return {"summary": summary, "results": results, "approved_dates": approved_dates}
+
+
+def refresh_manifest(db: Session, approved_dates) -> None:
+    """当日有预约通过审核时整体重载闸机名单（提交之后调用）"""
+    if gate_manifest.day is not None and gate_manifest.day in approved_dates:
+        gate_manifest.load(db)
+
+
+class AutoApprover:
+    """按规则定时自动审核：未来日期、人数不超过上限的待审核预约在容量范围内自动通过"""
+
+    def __init__(self, interval: float, max_party_size: int):
+        self.interval = interval
+        self.max_party_size = max_party_size
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def run_once(self) -> dict:
+        db = SessionLocal()
+        try:
+            result = approve(
+                db,
+                reserve_date_from=date.today(),
+                max_party_size=self.max_party_size,
+                with_tickets=False,
+            )
+            db.commit()
+            refresh_manifest(db, result["approved_dates"])
+            return result["summary"]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                summary = self.run_once()
+                if summary.get("approved"):
+                    logger.info("自动审核预约：%s", summary)
+            except Exception:
+                logger.exception("自动审核预约失败")
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="reservation-auto-approver", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+auto_approver = AutoApprover(
+    interval=settings.reservation_auto_approve_interval,
+    max_party_size=settings.reservation_auto_approve_max_party_size,
+)
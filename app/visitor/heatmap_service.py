@@ -0,0 +1,180 @@
+"""
+游客密度热力图
+轨迹点按固定经纬度网格（heatmap_cell_deg）和时间桶（heatmap_bucket_minutes）计数，
+写入轨迹时在内存中累加，由后台线程定期合并进 dbo.VisitorHeatmapBins；
+查询时只读取时间范围内的预聚合网格，按请求分辨率合并，响应时间与原始轨迹量无关。
+时间桶按服务器本地时间划分，带时区的时间先换算为本地时间。
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.timeutil import local_naive
+from app.visitor import queries
+from app.visitor.track_service import decode_archive
+
+logger = logging.getLogger(__name__)
+
+BinKey = Tuple[datetime, int, int]
+
+
+def bucket_start(t: datetime) -> datetime:
+    """时间桶起点；heatmap_bucket_minutes 需能整除 60"""
+    floored = t.replace(second=0, microsecond=0)
+    return floored - timedelta(minutes=floored.minute % settings.heatmap_bucket_minutes)
+
+
+def histogram(times: Sequence[datetime], lats, lngs) -> Dict[BinKey, int]:
+    """向量化分箱：同一时间桶、同一网格的点计数合并"""
+    if len(times) == 0:
+        return {}
+    cell = settings.heatmap_cell_deg
+    cy = np.floor(np.asarray(lats, dtype=np.float64) / cell).astype(np.int64)
+    cx = np.floor(np.asarray(lngs, dtype=np.float64) / cell).astype(np.int64)
+    buckets = [bucket_start(t) for t in times]
+    bucket_values = sorted(set(buckets))
+    bucket_index = {b: i for i, b in enumerate(bucket_values)}
+    bi = np.fromiter((bucket_index[b] for b in buckets), dtype=np.int64, count=len(buckets))
+
+    keys = np.stack([bi, cy, cx], axis=1)
+    unique, counts = np.unique(keys, axis=0, return_counts=True)
+    return {
+        (bucket_values[int(b)], int(y), int(x)): int(c)
+        for (b, y, x), c in zip(unique, counts)
+    }
+
+
+class HeatmapAccumulator:
+    """写入轨迹时的增量计数，后台线程定期合并入库"""
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._pending: Dict[BinKey, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, locate_time: datetime, latitude: float, longitude: float) -> None:
+        cell = settings.heatmap_cell_deg
+        key = (bucket_start(local_naive(locate_time)), int(np.floor(latitude / cell)), int(np.floor(longitude / cell)))
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + 1
+
+    def pending_between(self, start: datetime, end: datetime) -> Dict[Tuple[int, int], int]:
+        with self._lock:
+            items = list(self._pending.items())
+        merged: Dict[Tuple[int, int], int] = {}
+        for (b, y, x), c in items:
+            if start <= b < end:
+                merged[(y, x)] = merged.get((y, x), 0) + c
+        return merged
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            db = SessionLocal()
+            try:
+                queries.add_heatmap_bins(db, pending)
+                db.commit()
+                return len(pending)
+            except Exception:
+                db.rollback()
+                # 写库失败时放回缓冲，下次重试
+                with self._lock:
+                    for k, c in pending.items():
+                        self._pending[k] = self._pending.get(k, 0) + c
+                raise
+            finally:
+                db.close()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("热力图计数写入失败")
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="heatmap-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("热力图计数写入失败")
+
+
+heatmap_accumulator = HeatmapAccumulator(flush_interval=settings.heatmap_flush_seconds)
+
+
+def get_heatmap(db: Session, start: datetime, end: datetime, resolution: int = 1) -> dict:
+    """读取预聚合网格并按分辨率（基础网格边长的倍数）合并"""
+    start, end = bucket_start(local_naive(start)), local_naive(end)
+    rows = queries.sum_heatmap_bins(db, start, end)
+    cells: Dict[Tuple[int, int], int] = {(r["CellLat"], r["CellLng"]): int(r["PointCount"]) for r in rows}
+    for key, c in heatmap_accumulator.pending_between(start, end).items():
+        cells[key] = cells.get(key, 0) + c
+
+    cell = settings.heatmap_cell_deg
+    size = cell * resolution
+    out: List[list] = []
+    if cells:
+        arr = np.array([(y, x, c) for (y, x), c in cells.items()], dtype=np.int64)
+        ky = np.floor_divide(arr[:, 0], resolution)
+        kx = np.floor_divide(arr[:, 1], resolution)
+        unique, inverse = np.unique(np.stack([ky, kx], axis=1), axis=0, return_inverse=True)
+        totals = np.bincount(inverse.ravel(), weights=arr[:, 2]).astype(np.int64)
+        out = [
+            [round((int(y) + 0.5) * size, 6), round((int(x) + 0.5) * size, 6), int(c)]
+            for (y, x), c in zip(unique, totals)
+        ]
+    return {
+        "from": start.isoformat(timespec="minutes"),
+        "to": end.isoformat(timespec="minutes"),
+        "cell_deg": round(size, 6),
+        "max": max((c[2] for c in out), default=0),
+        "columns": ["latitude", "longitude", "count"],
+        "cells": out,
+    }
+
+
+def rebuild(db: Session, start: datetime, end: datetime) -> dict:
+    """按原始轨迹（含已压缩归档的原始点）重建时间范围内的网格，调用方负责提交"""
+    start, end = bucket_start(local_naive(start)), local_naive(end)
+    if bucket_start(end) != end:
+        end = bucket_start(end) + timedelta(minutes=settings.heatmap_bucket_minutes)
+    # 先把内存计数写入，避免重建后再次叠加
+    heatmap_accumulator.flush()
+    tracks = queries.list_track_points_between(db, start, end)
+    times = [r["LocateTime"] for r in tracks]
+    lats = [float(r["Latitude"]) for r in tracks]
+    lngs = [float(r["Longitude"]) for r in tracks]
+    for a in queries.list_track_archives_between(db, start, end):
+        for p in decode_archive(a["RawPoints"]):
+            if start <= p["LocateTime"] < end:
+                times.append(p["LocateTime"])
+                lats.append(p["Latitude"])
+                lngs.append(p["Longitude"])
+
+    bins = histogram(times, lats, lngs)
+    queries.delete_heatmap_bins(db, start, end)
+    queries.add_heatmap_bins(db, bins)
+    return {"points": len(times), "bins": len(bins)}
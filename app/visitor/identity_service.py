@@ -0,0 +1,123 @@
+"""
+游客身份解析服务
+身份证号 -> VisitorId 的有界 LRU 缓存，配合单语句 MERGE 写入，
+所有游客接口统一通过这里解析游客身份
+"""
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.visitor import queries
+
+# 本事务内写入的身份，提交成功后才进入缓存，避免缓存回滚掉的 VisitorId
+_PENDING_KEY = "visitor_identity_pending"
+
+
+class VisitorIdentity(NamedTuple):
+    visitor_id: int
+    visitor_name: Optional[str]
+    phone: Optional[str]
+
+
+class _LruCache:
+    """线程安全的有界 LRU（同步接口运行在线程池中）"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(1, int(maxsize))
+        self._data: "OrderedDict[str, VisitorIdentity]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[VisitorIdentity]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: VisitorIdentity) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+_cache = _LruCache(settings.visitor_identity_cache_size)
+
+
+def _remember_after_commit(db: Session, id_card_no: str, identity: VisitorIdentity) -> None:
+    db.info.setdefault(_PENDING_KEY, {})[id_card_no] = identity
+
+
+def _pending(db: Session, id_card_no: str) -> Optional[VisitorIdentity]:
+    return db.info.get(_PENDING_KEY, {}).get(id_card_no)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        for id_card_no, identity in pending.items():
+            _cache.put(id_card_no, identity)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        # 回滚后无法确定这些身份证号在库中的状态，同时清掉旧缓存
+        for id_card_no in pending:
+            _cache.discard(id_card_no)
+
+
+def lookup_visitor_id(db: Session, id_card_no: str) -> Optional[int]:
+    """只读查询游客ID，不存在返回 None"""
+    identity = _pending(db, id_card_no) or _cache.get(id_card_no)
+    if identity is not None:
+        return identity.visitor_id
+
+    row = queries.get_visitor_id_by_id_card(db, id_card_no)
+    if not row:
+        return None
+    identity = VisitorIdentity(int(row["VisitorId"]), row["VisitorName"], row["Phone"])
+    _cache.put(id_card_no, identity)
+    return identity.visitor_id
+
+
+def resolve_visitor_id(db: Session, id_card_no: str, visitor_name: str, phone: Optional[str]) -> int:
+    """获取或创建游客；姓名/电话与已知信息一致时不访问数据库"""
+    known = _pending(db, id_card_no) or _cache.get(id_card_no)
+    if known is not None and known.visitor_name == visitor_name and known.phone == phone:
+        return known.visitor_id
+
+    visitor_id = queries.upsert_visitor(db, visitor_name, id_card_no, phone)
+    _remember_after_commit(db, id_card_no, VisitorIdentity(visitor_id, visitor_name, phone))
+    return visitor_id
+
+
+def ensure_visitor_id(db: Session, id_card_no: str, default_name: str) -> int:
+    """获取游客ID，不存在时以默认姓名创建；不会覆盖已有游客信息"""
+    visitor_id = lookup_visitor_id(db, id_card_no)
+    if visitor_id is not None:
+        return visitor_id
+
+    visitor_id = queries.insert_visitor_if_absent(db, default_name, id_card_no, None)
+    # 并发场景下可能是别人插入的记录，姓名未知，下次按需回源
+    _remember_after_commit(db, id_card_no, VisitorIdentity(visitor_id, None, None))
+    return visitor_id
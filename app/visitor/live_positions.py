@@ -0,0 +1,166 @@
+"""
+园内游客实时位置
+内存维护每位游客的最新定位（VisitorId -> 位置），轨迹写入时更新、出园时移除，
+并按经纬度网格建立索引，实时地图按视野范围查询时只访问视野内的网格，不查询数据库。
+索引只包含经本进程写入的定位（见 app/local_cache.py）；超过 live_position_ttl_seconds 未更新的位置视为离线并移除。
+"""
+import logging
+import math
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.config import settings
+from app.db import SessionLocal
+from app.timeutil import local_naive
+from app.visitor import queries
+
+logger = logging.getLogger(__name__)
+
+Cell = Tuple[int, int]
+
+
+class LivePosition(NamedTuple):
+    visitor_id: int
+    visit_id: Optional[int]
+    latitude: float
+    longitude: float
+    area_id: int
+    locate_time: datetime
+    is_out_of_route: bool
+
+
+class LivePositionIndex:
+    def __init__(self, cell_deg: float, ttl_seconds: int):
+        self.cell_deg = cell_deg
+        self.ttl_seconds = ttl_seconds
+        self._positions: Dict[int, LivePosition] = {}
+        self._cells: Dict[Cell, Set[int]] = {}
+        self._by_visit: Dict[int, int] = {}
+        self._last_sweep = datetime.now()
+        self._lock = threading.Lock()
+
+    def _cell(self, latitude: float, longitude: float) -> Cell:
+        return (math.floor(latitude / self.cell_deg), math.floor(longitude / self.cell_deg))
+
+    def _discard(self, visitor_id: int) -> None:
+        old = self._positions.pop(visitor_id, None)
+        if old is None:
+            return
+        cell = self._cell(old.latitude, old.longitude)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(visitor_id)
+            if not members:
+                del self._cells[cell]
+        if old.visit_id is not None:
+            self._by_visit.pop(old.visit_id, None)
+
+    def update(self, position: LivePosition) -> None:
+        """写入一条定位；比已有位置更旧的定位（乱序上报）忽略"""
+        with self._lock:
+            current = self._positions.get(position.visitor_id)
+            if current is not None and current.locate_time > position.locate_time:
+                return
+            self._discard(position.visitor_id)
+            self._positions[position.visitor_id] = position
+            self._cells.setdefault(self._cell(position.latitude, position.longitude), set()).add(position.visitor_id)
+            if position.visit_id is not None:
+                self._by_visit[position.visit_id] = position.visitor_id
+
+    def evict(self, visitor_id: int) -> None:
+        with self._lock:
+            self._discard(visitor_id)
+
+    def evict_visit(self, visit_id: int) -> None:
+        with self._lock:
+            visitor_id = self._by_visit.get(visit_id)
+            if visitor_id is not None:
+                self._discard(visitor_id)
+
+    def _sweep(self, cutoff: datetime) -> None:
+        stale = [vid for vid, p in self._positions.items() if p.locate_time < cutoff]
+        for vid in stale:
+            self._discard(vid)
+
+    def query(
+        self,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        area_id: Optional[int] = None,
+        out_of_route_only: bool = False,
+    ) -> List[LivePosition]:
+        """bbox 为 (min_lat, min_lng, max_lat, max_lng)"""
+        now = datetime.now()
+        cutoff = now - timedelta(seconds=self.ttl_seconds)
+        with self._lock:
+            # 过期位置只在结果中过滤，全量清理最多每分钟一次，查询开销只与视野内人数相关
+            if (now - self._last_sweep).total_seconds() > 60:
+                self._sweep(cutoff)
+                self._last_sweep = now
+            if bbox is None:
+                candidates = list(self._positions.values())
+            else:
+                min_lat, min_lng, max_lat, max_lng = bbox
+                lo, hi = self._cell(min_lat, min_lng), self._cell(max_lat, max_lng)
+                cell_count = (hi[0] - lo[0] + 1) * (hi[1] - lo[1] + 1)
+                if cell_count > len(self._cells):
+                    # 视野比已占用网格还大时直接遍历已占用网格
+                    ids = [vid for members in self._cells.values() for vid in members]
+                else:
+                    ids = [
+                        vid
+                        for x in range(lo[0], hi[0] + 1)
+                        for y in range(lo[1], hi[1] + 1)
+                        for vid in self._cells.get((x, y), ())
+                    ]
+                candidates = [
+                    p for p in (self._positions[vid] for vid in ids)
+                    if min_lat <= p.latitude <= max_lat and min_lng <= p.longitude <= max_lng
+                ]
+        return [
+            p for p in candidates
+            if p.locate_time >= cutoff
+            and (area_id is None or p.area_id == area_id) and (not out_of_route_only or p.is_out_of_route)
+        ]
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+
+position_index = LivePositionIndex(
+    cell_deg=settings.live_position_cell_deg,
+    ttl_seconds=settings.live_position_ttl_seconds,
+)
+
+
+def record(visitor_id: int, visit_id: Optional[int], latitude: float, longitude: float,
+           area_id: int, locate_time: Optional[datetime], is_out_of_route: bool) -> None:
+    """轨迹已提交后调用：索引只是加速查询，更新失败只记录日志，不影响写入接口"""
+    try:
+        position_index.update(LivePosition(
+            visitor_id=visitor_id,
+            visit_id=visit_id,
+            latitude=float(latitude),
+            longitude=float(longitude),
+            area_id=area_id,
+            locate_time=local_naive(locate_time) or datetime.now(),
+            is_out_of_route=bool(is_out_of_route),
+        ))
+    except Exception:
+        logger.exception("游客实时位置更新失败：VisitorId=%s", visitor_id)
+
+
+def preload() -> None:
+    """启动时从数据库加载在园游客的最新定位，数据库不可用时不阻止启动"""
+    db = SessionLocal()
+    try:
+        since = datetime.now() - timedelta(seconds=settings.live_position_ttl_seconds)
+        rows = queries.list_latest_open_visit_positions(db, since)
+        for r in rows:
+            record(r["VisitorId"], r["VisitId"], r["Latitude"], r["Longitude"],
+                   r["AreaId"], r["LocateTime"], r["IsOutOfRoute"])
+        logger.info("游客实时位置已加载：%s 人", len(rows))
+    except Exception:
+        logger.exception("游客实时位置预加载失败")
+    finally:
+        db.close()
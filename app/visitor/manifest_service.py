@@ -0,0 +1,166 @@
+"""
+闸机入园名单
+开园时一次性加载当日全部已确认预约到内存哈希索引（按预约编号、身份证号），
+确认/取消预约时增量更新，入园校验按名单确定游客，不再按身份证号查询游客表。
+
+名单保存在进程内存中，超过 gate_manifest_refresh_seconds 后在下次访问时整体重载，
+以同步其它工作进程产生的变更；重载前其他进程取消的预约仍在名单中，
+因此入园接口命中名单后仍按主键确认预约状态。
+"""
+import hashlib
+import logging
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.visitor import queries
+
+logger = logging.getLogger(__name__)
+
+
+class ManifestEntry(NamedTuple):
+    reservation_id: int
+    visitor_id: int
+    id_card_no: str
+    visitor_name: Optional[str]
+    park_name: Optional[str]
+    time_slot: str
+    party_size: int
+
+
+def id_card_digest(id_card_no: str) -> str:
+    """下发给闸机的名单不含明文身份证号，闸机对读到的身份证号做同样的摘要后比对"""
+    return hashlib.sha256(id_card_no.strip().upper().encode("utf-8")).hexdigest()[:16]
+
+
+class GateManifest:
+    def __init__(self):
+        self.day: Optional[date] = None
+        self.version = 0
+        self.loaded_at = 0.0
+        self._by_reservation: Dict[int, ManifestEntry] = {}
+        self._by_id_card: Dict[str, Set[int]] = {}
+        self._lock = threading.RLock()
+
+    # ---------- 加载 ----------
+    def _is_fresh(self, today: date) -> bool:
+        return self.day == today and time.monotonic() - self.loaded_at < settings.gate_manifest_refresh_seconds
+
+    def ensure_loaded(self, db: Session, today: Optional[date] = None) -> None:
+        today = today or date.today()
+        if self._is_fresh(today):
+            return
+        with self._lock:
+            if self._is_fresh(today):
+                return
+            self.load(db, today)
+
+    def load(self, db: Session, today: Optional[date] = None) -> int:
+        today = today or date.today()
+        rows = queries.list_confirmed_reservations_for_date(db, today)
+        by_reservation: Dict[int, ManifestEntry] = {}
+        by_id_card: Dict[str, Set[int]] = {}
+        for r in rows:
+            entry = self._entry(r)
+            by_reservation[entry.reservation_id] = entry
+            by_id_card.setdefault(entry.id_card_no, set()).add(entry.reservation_id)
+        with self._lock:
+            self.day = today
+            self._by_reservation = by_reservation
+            self._by_id_card = by_id_card
+            self.loaded_at = time.monotonic()
+            self.version += 1
+        return len(by_reservation)
+
+    @staticmethod
+    def _entry(row) -> ManifestEntry:
+        return ManifestEntry(
+            reservation_id=int(row["ReservationId"]),
+            visitor_id=int(row["VisitorId"]),
+            id_card_no=row["IdCardNo"],
+            visitor_name=row["VisitorName"],
+            park_name=row["ParkName"],
+            time_slot=row["TimeSlot"],
+            party_size=int(row["PartySize"]),
+        )
+
+    # ---------- 增量更新 ----------
+    def _add(self, entry: ManifestEntry) -> None:
+        self._by_reservation[entry.reservation_id] = entry
+        self._by_id_card.setdefault(entry.id_card_no, set()).add(entry.reservation_id)
+        self.version += 1
+
+    def remove(self, reservation_id: int) -> None:
+        with self._lock:
+            entry = self._by_reservation.pop(int(reservation_id), None)
+            if entry is None:
+                return
+            ids = self._by_id_card.get(entry.id_card_no)
+            if ids is not None:
+                ids.discard(entry.reservation_id)
+                if not ids:
+                    del self._by_id_card[entry.id_card_no]
+            self.version += 1
+
+    def on_status_change(self, db: Session, reservation_id: int, reserve_date, new_status: str) -> None:
+        """预约状态变化后调用（在同一事务内、提交前后均可）"""
+        if self.day is None or reserve_date != self.day:
+            return
+        if new_status != "已确认":
+            self.remove(reservation_id)
+            return
+        rows = queries.list_confirmed_reservations_for_date(db, reserve_date, reservation_id=reservation_id)
+        if rows:
+            with self._lock:
+                self._add(self._entry(rows[0]))
+
+    # ---------- 查询 ----------
+    def get(self, reservation_id: int) -> Optional[ManifestEntry]:
+        return self._by_reservation.get(int(reservation_id))
+
+    def find_by_id_card(self, id_card_no: str) -> List[ManifestEntry]:
+        with self._lock:
+            ids = self._by_id_card.get(id_card_no, ())
+            return [self._by_reservation[i] for i in ids]
+
+    def covers(self, day: date) -> bool:
+        return self.day == day
+
+    def export_compact(self, park_name: Optional[str] = None, time_slot: Optional[str] = None) -> dict:
+        """闸机下载格式：列名 + 行数组，身份证号只下发摘要"""
+        with self._lock:
+            entries = list(self._by_reservation.values())
+            version = self.version
+            day = self.day
+        rows = [
+            [e.reservation_id, e.visitor_id, id_card_digest(e.id_card_no), e.time_slot, e.party_size, e.park_name]
+            for e in entries
+            if (park_name is None or e.park_name == park_name) and (time_slot is None or e.time_slot == time_slot)
+        ]
+        return {
+            "date": day.isoformat() if day else None,
+            "version": version,
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "columns": ["reservation_id", "visitor_id", "id_card_digest", "time_slot", "party_size", "park_name"],
+            "rows": rows,
+        }
+
+
+gate_manifest = GateManifest()
+
+
+def preload() -> None:
+    """启动时预加载当日名单；数据库不可用时不阻止启动，首次入园校验时再加载"""
+    db = SessionLocal()
+    try:
+        count = gate_manifest.load(db)
+        logger.info("闸机入园名单已加载：%s 条已确认预约", count)
+    except Exception:
+        logger.exception("闸机入园名单预加载失败")
+    finally:
+        db.close()
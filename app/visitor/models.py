@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, DateTime, Date, DECIMAL, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, String, DateTime, Date, DECIMAL, ForeignKey, CheckConstraint, LargeBinary
 from sqlalchemy.sql import func
 
 from app.db import Base
@@ -80,3 +80,70 @@ class FlowControl(Base):
         CheckConstraint("CurrentInPark >= 0", name="CK_FlowControls_Current"),
     )
 
+
+class ReservationQuota(Base):
+    __tablename__ = "ReservationQuotas"
+
+    ParkName = Column(String(100), primary_key=True)
+    ReserveDate = Column(Date, primary_key=True)
+    TimeSlot = Column(String(20), primary_key=True)
+    Capacity = Column(Integer, nullable=False)
+    Remaining = Column(Integer, nullable=False)
+    UpdatedAt = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("Capacity >= 0", name="CK_ReservationQuotas_Capacity"),
+        CheckConstraint("Remaining >= 0 AND Remaining <= Capacity", name="CK_ReservationQuotas_Remaining"),
+    )
+
+
+class VisitSyncEvent(Base):
+    __tablename__ = "VisitSyncEvents"
+
+    EventKey = Column(String(64), primary_key=True)
+    DeviceId = Column(String(50), nullable=True)
+    EventType = Column(String(10), nullable=False)
+    OccurredAt = Column(DateTime, nullable=False)
+    VisitId = Column(Integer, nullable=True)
+    ResultStatus = Column(String(10), nullable=False)
+    Reason = Column(String(200), nullable=True)
+    SyncedAt = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("EventType IN ('enter','exit')", name="CK_VisitSyncEvents_Type"),
+        CheckConstraint("ResultStatus IN ('applied','conflict')", name="CK_VisitSyncEvents_Status"),
+    )
+
+
+class TicketCheckIn(Base):
+    __tablename__ = "TicketCheckIns"
+
+    ReservationId = Column(Integer, ForeignKey("Reservations.ReservationId"), primary_key=True)
+    VisitDate = Column(Date, primary_key=True)
+    VisitId = Column(Integer, ForeignKey("Visits.VisitId"), nullable=False)
+    CheckedInAt = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class VisitorTrackArchive(Base):
+    __tablename__ = "VisitorTrackArchives"
+
+    VisitId = Column(Integer, ForeignKey("Visits.VisitId"), primary_key=True)
+    VisitorId = Column(Integer, nullable=False)
+    RawPointCount = Column(Integer, nullable=False)
+    KeptPointCount = Column(Integer, nullable=False)
+    Tolerance = Column(DECIMAL(8, 2), nullable=False)
+    RawPoints = Column(LargeBinary, nullable=False)
+    CompactedAt = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class VisitorHeatmapBin(Base):
+    __tablename__ = "VisitorHeatmapBins"
+
+    BucketStart = Column(DateTime, primary_key=True)
+    CellLat = Column(Integer, primary_key=True)
+    CellLng = Column(Integer, primary_key=True)
+    PointCount = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("PointCount >= 0", name="CK_VisitorHeatmapBins_Count"),
+    )
@@ -1,37 +1,72 @@
 from datetime import datetime
-from typing import Optional, Sequence
+from typing import Dict, List, Optional, Sequence, Set
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 
-def get_or_create_visitor_id(db: Session, visitor_name: str, id_card_no: str, phone: Optional[str]) -> int:
-    vid = db.execute(
-        text("SELECT VisitorId FROM dbo.Visitors WHERE IdCardNo = :idc"),
+def get_visitor_id_by_id_card(db: Session, id_card_no: str) -> Optional[dict]:
+    return db.execute(
+        text("SELECT VisitorId, VisitorName, Phone FROM dbo.Visitors WHERE IdCardNo = :idc"),
         {"idc": id_card_no},
+    ).mappings().first()
+
+
+def upsert_visitor(db: Session, visitor_name: str, id_card_no: str, phone: Optional[str]) -> int:
+    """按身份证号插入或更新游客；仅当姓名/电话变化时才写入（HOLDLOCK 防止并发重复插入）"""
+    vid = db.execute(
+        text(
+            """
+            SET NOCOUNT ON;
+            DECLARE @Out TABLE (VisitorId INT);
+            MERGE dbo.Visitors WITH (HOLDLOCK) AS t
+            USING (SELECT :idc AS IdCardNo, :n AS VisitorName, :p AS Phone) AS s
+            ON t.IdCardNo = s.IdCardNo
+            WHEN MATCHED AND (
+                t.VisitorName <> s.VisitorName
+                OR ISNULL(t.Phone, N'') <> ISNULL(s.Phone, N'')
+            ) THEN
+                UPDATE SET VisitorName = s.VisitorName, Phone = s.Phone
+            WHEN NOT MATCHED THEN
+                INSERT (VisitorName, IdCardNo, Phone) VALUES (s.VisitorName, s.IdCardNo, s.Phone)
+            OUTPUT INSERTED.VisitorId INTO @Out;
+            SELECT COALESCE(
+                (SELECT TOP 1 VisitorId FROM @Out),
+                (SELECT VisitorId FROM dbo.Visitors WHERE IdCardNo = :idc)
+            );
+            """
+        ),
+        {"n": visitor_name, "idc": id_card_no, "p": phone},
     ).scalar()
-    if vid:
-        db.execute(
-            text(
-                "UPDATE dbo.Visitors SET VisitorName = :n, Phone = :p WHERE VisitorId = :vid"
-            ),
-            {"n": visitor_name, "p": phone, "vid": int(vid)},
-        )
-        return int(vid)
+    if vid is None:
+        raise RuntimeError("Failed to upsert visitor")
+    return int(vid)
+
 
-    new_id = db.execute(
+def insert_visitor_if_absent(db: Session, visitor_name: str, id_card_no: str, phone: Optional[str]) -> int:
+    """按身份证号获取游客，不存在时插入；已存在的游客信息不做修改"""
+    vid = db.execute(
         text(
             """
-            INSERT INTO dbo.Visitors(VisitorName, IdCardNo, Phone)
-            OUTPUT INSERTED.VisitorId
-            VALUES (:n, :idc, :p)
+            SET NOCOUNT ON;
+            DECLARE @Out TABLE (VisitorId INT);
+            MERGE dbo.Visitors WITH (HOLDLOCK) AS t
+            USING (SELECT :idc AS IdCardNo, :n AS VisitorName, :p AS Phone) AS s
+            ON t.IdCardNo = s.IdCardNo
+            WHEN NOT MATCHED THEN
+                INSERT (VisitorName, IdCardNo, Phone) VALUES (s.VisitorName, s.IdCardNo, s.Phone)
+            OUTPUT INSERTED.VisitorId INTO @Out;
+            SELECT COALESCE(
+                (SELECT TOP 1 VisitorId FROM @Out),
+                (SELECT VisitorId FROM dbo.Visitors WHERE IdCardNo = :idc)
+            );
             """
         ),
         {"n": visitor_name, "idc": id_card_no, "p": phone},
     ).scalar()
-    if new_id is None:
+    if vid is None:
         raise RuntimeError("Failed to insert visitor")
-    return int(new_id)
+    return int(vid)
 
 
 def create_reservation(
@@ -77,20 +112,257 @@ def create_reservation(
     return int(rid)
 
 
-def cancel_reservation(db: Session, reservation_id: int, visitor_id: int) -> int:
-    res = db.execute(
+def cancel_reservation(db: Session, reservation_id: int, visitor_id: int) -> Optional[dict]:
+    """取消预约，返回被取消预约的配额键（ParkName/ReserveDate/TimeSlot/PartySize），未取消返回 None"""
+    return db.execute(
         text(
             """
             UPDATE dbo.Reservations
             SET ReserveStatus = N'已取消'
+            OUTPUT DELETED.ParkName, DELETED.ReserveDate, DELETED.TimeSlot, DELETED.PartySize
             WHERE ReservationId = :rid AND VisitorId = :vid AND ReserveStatus = N'已确认'
             """
         ),
         {"rid": reservation_id, "vid": visitor_id},
+    ).mappings().first()
+
+
+def set_reservation_status(db: Session, reservation_id: int, new_status: str) -> Optional[dict]:
+    """修改预约状态，返回修改前的状态及配额键，预约不存在返回 None"""
+    return db.execute(
+        text(
+            """
+            UPDATE dbo.Reservations
+            SET ReserveStatus = :st
+            OUTPUT DELETED.ReserveStatus, DELETED.ParkName, DELETED.ReserveDate,
+                   DELETED.TimeSlot, DELETED.PartySize, DELETED.ReservationId, DELETED.VisitorId
+            WHERE ReservationId = :rid
+            """
+        ),
+        {"st": new_status, "rid": reservation_id},
+    ).mappings().first()
+
+
+# ========== 预约配额（ReservationQuotas 计数表） ==========
+def approve_pending_reservations(
+    db: Session,
+    default_capacity: int,
+    reservation_ids: Optional[Sequence[int]] = None,
+    reserve_date=None,
+    reserve_date_from=None,
+    park_name: Optional[str] = None,
+    time_slot: Optional[str] = None,
+    max_party_size: Optional[int] = None,
+) -> Sequence[dict]:
+    """
+    集合式批量审核：在一个批处理里锁定符合条件的待审核预约，按预约编号顺序累计人数，
+    与该时段已确认人数之和不超过配额容量的预约一次 UPDATE 为已确认。
+    返回每条相关预约的处理结果（approved / over_capacity / not_pending）。
+    """
+    where = ["r.ReserveStatus = N'待审核'"]
+    params: dict = {"cap": default_capacity}
+    scope = ""
+    if reservation_ids:
+        id_params = {f"id{i}": int(rid) for i, rid in enumerate(reservation_ids)}
+        params.update(id_params)
+        in_list = ", ".join(f":{k}" for k in id_params)
+        where.append(f"r.ReservationId IN ({in_list})")
+        scope = f"r.ReservationId IN ({in_list})"
+    if reserve_date is not None:
+        where.append("r.ReserveDate = :rd")
+        params["rd"] = reserve_date
+    if reserve_date_from is not None:
+        where.append("r.ReserveDate >= :rdf")
+        params["rdf"] = reserve_date_from
+    if park_name is not None:
+        where.append("ISNULL(r.ParkName, N'') = :pn")
+        params["pn"] = park_name
+    if time_slot is not None:
+        where.append("r.TimeSlot = :ts")
+        params["ts"] = time_slot
+    if max_party_size is not None:
+        where.append("r.PartySize <= :mps")
+        params["mps"] = max_party_size
+    if not scope:
+        scope = "r.ReservationId IN (SELECT ReservationId FROM @Cand)"
+
+    sql = f"""
+        SET NOCOUNT ON;
+        DECLARE @Cand TABLE(
+            ReservationId INT PRIMARY KEY, ParkKey NVARCHAR(100), ReserveDate DATE, TimeSlot NVARCHAR(20), PartySize INT
+        );
+        DECLARE @Out TABLE(ReservationId INT PRIMARY KEY);
+
+        INSERT INTO @Cand(ReservationId, ParkKey, ReserveDate, TimeSlot, PartySize)
+        SELECT r.ReservationId, ISNULL(r.ParkName, N''), r.ReserveDate, r.TimeSlot, r.PartySize
+        FROM dbo.Reservations r WITH (UPDLOCK, HOLDLOCK)
+        WHERE {" AND ".join(where)};
+
+        WITH ranked AS (
+            SELECT c.ReservationId, c.ParkKey, c.ReserveDate, c.TimeSlot,
+                   SUM(c.PartySize) OVER (
+                       PARTITION BY c.ParkKey, c.ReserveDate, c.TimeSlot
+                       ORDER BY c.ReservationId ROWS UNBOUNDED PRECEDING
+                   ) AS RunningSize
+            FROM @Cand c
+        ), confirmed AS (
+            SELECT ISNULL(r.ParkName, N'') AS ParkKey, r.ReserveDate, r.TimeSlot, SUM(r.PartySize) AS Size
+            FROM dbo.Reservations r
+            JOIN (SELECT DISTINCT ParkKey, ReserveDate, TimeSlot FROM @Cand) k
+              ON k.ParkKey = ISNULL(r.ParkName, N'') AND k.ReserveDate = r.ReserveDate AND k.TimeSlot = r.TimeSlot
+            WHERE r.ReserveStatus IN (N'已确认', N'已完成')
+            GROUP BY ISNULL(r.ParkName, N''), r.ReserveDate, r.TimeSlot
+        )
+        UPDATE r
+        SET ReserveStatus = N'已确认'
+        OUTPUT INSERTED.ReservationId INTO @Out(ReservationId)
+        FROM dbo.Reservations r
+        JOIN ranked c ON c.ReservationId = r.ReservationId
+        LEFT JOIN dbo.ReservationQuotas q
+          ON q.ParkName = c.ParkKey AND q.ReserveDate = c.ReserveDate AND q.TimeSlot = c.TimeSlot
+        LEFT JOIN confirmed s
+          ON s.ParkKey = c.ParkKey AND s.ReserveDate = c.ReserveDate AND s.TimeSlot = c.TimeSlot
+        WHERE c.RunningSize + ISNULL(s.Size, 0) <= ISNULL(q.Capacity, :cap);
+
+        SELECT r.ReservationId, r.VisitorId, r.ParkName, r.ReserveDate, r.TimeSlot, r.PartySize, r.ReserveStatus,
+               CASE WHEN o.ReservationId IS NOT NULL THEN N'approved'
+                    WHEN c.ReservationId IS NOT NULL THEN N'over_capacity'
+                    ELSE N'not_pending' END AS Outcome
+        FROM dbo.Reservations r
+        LEFT JOIN @Cand c ON c.ReservationId = r.ReservationId
+        LEFT JOIN @Out o ON o.ReservationId = r.ReservationId
+        WHERE {scope}
+        ORDER BY r.ReservationId;
+    """
+    return db.execute(text(sql), params).mappings().all()
+
+
+def try_take_quota(db: Session, park_name: str, reserve_date, time_slot: str, party_size: int) -> Optional[bool]:
+    """条件扣减剩余名额：成功返回 True，名额不足返回 False，配额行不存在返回 None（按主键判断，不统计预约）"""
+    result = db.execute(
+        text(
+            """
+            SET NOCOUNT ON;
+            UPDATE dbo.ReservationQuotas
+            SET Remaining = Remaining - :ps, UpdatedAt = SYSUTCDATETIME()
+            WHERE ParkName = :park AND ReserveDate = :d AND TimeSlot = :ts AND Remaining >= :ps;
+            DECLARE @taken INT = @@ROWCOUNT;
+            SELECT CASE
+                WHEN @taken = 1 THEN 1
+                WHEN EXISTS (
+                    SELECT 1 FROM dbo.ReservationQuotas
+                    WHERE ParkName = :park AND ReserveDate = :d AND TimeSlot = :ts
+                ) THEN 0
+            END;
+            """
+        ),
+        {"park": park_name, "d": reserve_date, "ts": time_slot, "ps": party_size},
+    ).scalar()
+    return None if result is None else result == 1
+
+
+def release_quota(db: Session, park_name: str, reserve_date, time_slot: str, party_size: int) -> int:
+    res = db.execute(
+        text(
+            """
+            UPDATE dbo.ReservationQuotas
+            SET Remaining = CASE WHEN Remaining + :ps > Capacity THEN Capacity ELSE Remaining + :ps END,
+                UpdatedAt = SYSUTCDATETIME()
+            WHERE ParkName = :park AND ReserveDate = :d AND TimeSlot = :ts
+            """
+        ),
+        {"park": park_name, "d": reserve_date, "ts": time_slot, "ps": party_size},
     )
     return int(res.rowcount or 0)
 
 
+def create_quota_if_absent(db: Session, park_name: str, reserve_date, time_slot: str, capacity: int) -> bool:
+    """不存在时按默认容量创建配额行（已扣除现有有效预约），返回是否新建"""
+    created = db.execute(
+        text(
+            """
+            SET NOCOUNT ON;
+            INSERT INTO dbo.ReservationQuotas(ParkName, ReserveDate, TimeSlot, Capacity, Remaining)
+            SELECT :park, :d, :ts, :cap,
+                   CASE WHEN :cap - used.n < 0 THEN 0 ELSE :cap - used.n END
+            FROM (
+                SELECT ISNULL(SUM(PartySize), 0) AS n
+                FROM dbo.Reservations
+                WHERE ISNULL(ParkName, N'') = :park AND ReserveDate = :d AND TimeSlot = :ts
+                  AND ReserveStatus IN (N'待审核', N'已确认', N'已完成')
+            ) used
+            WHERE NOT EXISTS (
+                SELECT 1 FROM dbo.ReservationQuotas WITH (UPDLOCK, HOLDLOCK)
+                WHERE ParkName = :park AND ReserveDate = :d AND TimeSlot = :ts
+            );
+            SELECT @@ROWCOUNT;
+            """
+        ),
+        {"park": park_name, "d": reserve_date, "ts": time_slot, "cap": capacity},
+    ).scalar()
+    return int(created or 0) == 1
+
+
+def set_quota_capacity(db: Session, park_name: str, reserve_date, time_slot: str, capacity: int) -> None:
+    """设置容量，剩余名额按容量差值同步调整"""
+    db.execute(
+        text(
+            """
+            MERGE dbo.ReservationQuotas WITH (HOLDLOCK) AS t
+            USING (SELECT :park AS ParkName, :d AS ReserveDate, :ts AS TimeSlot, :cap AS Capacity) AS s
+            ON t.ParkName = s.ParkName AND t.ReserveDate = s.ReserveDate AND t.TimeSlot = s.TimeSlot
+            WHEN MATCHED THEN
+                UPDATE SET Remaining = CASE WHEN t.Remaining + s.Capacity - t.Capacity < 0 THEN 0
+                                            ELSE t.Remaining + s.Capacity - t.Capacity END,
+                           Capacity = s.Capacity,
+                           UpdatedAt = SYSUTCDATETIME()
+            WHEN NOT MATCHED THEN
+                INSERT (ParkName, ReserveDate, TimeSlot, Capacity, Remaining)
+                VALUES (s.ParkName, s.ReserveDate, s.TimeSlot, s.Capacity, s.Capacity);
+            """
+        ),
+        {"park": park_name, "d": reserve_date, "ts": time_slot, "cap": capacity},
+    )
+
+
+def list_quotas(db: Session, reserve_date=None, park_name: Optional[str] = None) -> Sequence[dict]:
+    sql = "SELECT TOP 500 * FROM dbo.ReservationQuotas WHERE 1 = 1"
+    params: dict = {}
+    if reserve_date is not None:
+        sql += " AND ReserveDate = :d"
+        params["d"] = reserve_date
+    if park_name is not None:
+        sql += " AND ParkName = :park"
+        params["park"] = park_name
+    sql += " ORDER BY ReserveDate, ParkName, TimeSlot"
+    return db.execute(text(sql), params).mappings().all()
+
+
+def reconcile_quotas(db: Session, from_date=None) -> Sequence[dict]:
+    """按实际有效预约重算剩余名额，返回发生偏差的配额行"""
+    return db.execute(
+        text(
+            """
+            UPDATE q
+            SET Remaining = CASE WHEN q.Capacity - ISNULL(u.n, 0) < 0 THEN 0 ELSE q.Capacity - ISNULL(u.n, 0) END,
+                UpdatedAt = SYSUTCDATETIME()
+            OUTPUT INSERTED.ParkName, INSERTED.ReserveDate, INSERTED.TimeSlot,
+                   DELETED.Remaining AS OldRemaining, INSERTED.Remaining AS NewRemaining
+            FROM dbo.ReservationQuotas q
+            LEFT JOIN (
+                SELECT ISNULL(ParkName, N'') AS ParkName, ReserveDate, TimeSlot, SUM(PartySize) AS n
+                FROM dbo.Reservations
+                WHERE ReserveStatus IN (N'待审核', N'已确认', N'已完成')
+                GROUP BY ISNULL(ParkName, N''), ReserveDate, TimeSlot
+            ) u ON u.ParkName = q.ParkName AND u.ReserveDate = q.ReserveDate AND u.TimeSlot = q.TimeSlot
+            WHERE (:from_date IS NULL OR q.ReserveDate >= :from_date)
+              AND q.Remaining <> CASE WHEN q.Capacity - ISNULL(u.n, 0) < 0 THEN 0 ELSE q.Capacity - ISNULL(u.n, 0) END
+            """
+        ),
+        {"from_date": from_date},
+    ).mappings().all()
+
+
 def create_visit(
     db: Session,
     visitor_id: int,
@@ -120,14 +392,148 @@ def create_visit(
     return int(new_visit_id)
 
 
-def exit_visit(db: Session, visit_id: int) -> int:
+def claim_ticket_check_in(db: Session, reservation_id: int, visit_date, visit_id: int) -> bool:
+    """登记电子票当日核销，同一预约当日已核销时返回 False（UPDLOCK + HOLDLOCK 使并发核销排队判断）"""
+    claimed = db.execute(
+        text(
+            """
+            SET NOCOUNT ON;
+            INSERT INTO dbo.TicketCheckIns(ReservationId, VisitDate, VisitId)
+            SELECT :rid, :d, :vid
+            WHERE NOT EXISTS (
+                SELECT 1 FROM dbo.TicketCheckIns WITH (UPDLOCK, HOLDLOCK)
+                WHERE ReservationId = :rid AND VisitDate = :d
+            );
+            SELECT @@ROWCOUNT;
+            """
+        ),
+        {"rid": reservation_id, "d": visit_date, "vid": visit_id},
+    ).scalar()
+    return int(claimed or 0) == 1
+
+
+def exit_visit(db: Session, visit_id: int, exit_time: Optional[datetime] = None) -> int:
     res = db.execute(
         text("UPDATE dbo.Visits SET ExitTime = COALESCE(ExitTime, :t) WHERE VisitId = :id"),
-        {"id": visit_id, "t": datetime.now()},
+        {"id": visit_id, "t": exit_time or datetime.now()},
     )
     return int(res.rowcount or 0)
 
 
+def get_visit(db: Session, visit_id: int) -> Optional[dict]:
+    return db.execute(
+        text(
+            "SELECT VisitId, VisitorId, ReservationId, AreaId, EntryTime, ExitTime "
+            "FROM dbo.Visits WHERE VisitId = :id"
+        ),
+        {"id": visit_id},
+    ).mappings().first()
+
+
+def find_open_visit(db: Session, visitor_id: int, area_id: Optional[int] = None) -> Optional[dict]:
+    """游客最近一次尚未出园的入园记录"""
+    sql = (
+        "SELECT TOP 1 VisitId, VisitorId, ReservationId, AreaId, EntryTime, ExitTime "
+        "FROM dbo.Visits WHERE VisitorId = :vid AND ExitTime IS NULL"
+    )
+    params: dict = {"vid": visitor_id}
+    if area_id is not None:
+        sql += " AND AreaId = :aid"
+        params["aid"] = area_id
+    sql += " ORDER BY EntryTime DESC"
+    return db.execute(text(sql), params).mappings().first()
+
+
+def set_flow_recalc_deferred(db: Session, deferred: bool) -> None:
+    """置位后 TR_Visits_FlowControl 跳过逐行重算，需调用方自行重算受影响区域"""
+    db.execute(
+        text("EXEC sp_set_session_context N'SkipFlowRecalc', :v"),
+        {"v": 1 if deferred else None},
+    )
+
+
+def recalc_flow_control(db: Session, area_id: int) -> None:
+    db.execute(text("EXEC dbo.sp_RecalcFlowControl :aid"), {"aid": area_id})
+
+
+def get_sync_events(db: Session, event_keys: Sequence[str]) -> Sequence[dict]:
+    if not event_keys:
+        return []
+    params = {f"k{i}": k for i, k in enumerate(event_keys)}
+    return db.execute(
+        text(
+            "SELECT EventKey, EventType, VisitId, ResultStatus, Reason FROM dbo.VisitSyncEvents "
+            "WHERE EventKey IN (" + ", ".join(f":{p}" for p in params) + ")"
+        ),
+        params,
+    ).mappings().all()
+
+
+def list_existing_area_ids(db: Session, area_ids: Sequence[int]) -> Set[int]:
+    if not area_ids:
+        return set()
+    params = {f"a{i}": int(a) for i, a in enumerate(area_ids)}
+    rows = db.execute(
+        text("SELECT id FROM dbo.区域表 WHERE id IN (" + ", ".join(f":{p}" for p in params) + ")"),
+        params,
+    ).scalars().all()
+    return {int(r) for r in rows}
+
+
+def get_visitor_ids_by_id_cards(db: Session, id_card_nos: Sequence[str]) -> Dict[str, int]:
+    if not id_card_nos:
+        return {}
+    params = {f"c{i}": c for i, c in enumerate(id_card_nos)}
+    rows = db.execute(
+        text("SELECT IdCardNo, VisitorId FROM dbo.Visitors WHERE IdCardNo IN (" + ", ".join(f":{p}" for p in params) + ")"),
+        params,
+    ).all()
+    return {r[0]: int(r[1]) for r in rows}
+
+
+def get_reservations(db: Session, reservation_ids: Sequence[int]) -> Dict[int, dict]:
+    if not reservation_ids:
+        return {}
+    params = {f"r{i}": int(r) for i, r in enumerate(reservation_ids)}
+    rows = db.execute(
+        text(
+            "SELECT ReservationId, VisitorId, ReserveDate, ReserveStatus FROM dbo.Reservations "
+            "WHERE ReservationId IN (" + ", ".join(f":{p}" for p in params) + ")"
+        ),
+        params,
+    ).mappings().all()
+    return {int(r["ReservationId"]): r for r in rows}
+
+
+# 每行 7 个参数
+_SYNC_EVENT_INSERT_CHUNK = 280
+
+
+def record_sync_events(db: Session, rows: Sequence[dict]) -> None:
+    for start in range(0, len(rows), _SYNC_EVENT_INSERT_CHUNK):
+        chunk = rows[start:start + _SYNC_EVENT_INSERT_CHUNK]
+        values = []
+        params: dict = {}
+        for i, r in enumerate(chunk):
+            values.append(f"(:k{i}, :d{i}, :t{i}, :o{i}, :v{i}, :s{i}, :r{i})")
+            params.update({
+                f"k{i}": r["EventKey"],
+                f"d{i}": r.get("DeviceId"),
+                f"t{i}": r["EventType"],
+                f"o{i}": r["OccurredAt"],
+                f"v{i}": r.get("VisitId"),
+                f"s{i}": r["ResultStatus"],
+                f"r{i}": r.get("Reason"),
+            })
+        db.execute(
+            text(
+                "INSERT INTO dbo.VisitSyncEvents(EventKey, DeviceId, EventType, OccurredAt, VisitId, ResultStatus, Reason) "
+                "VALUES " + ", ".join(values)
+            ),
+            params,
+        )
+
+
 def create_track(
     db: Session,
     visitor_id: int,
@@ -163,6 +569,204 @@ def create_track(
     return int(new_track_id)
 
 
+def list_latest_open_visit_positions(db: Session, since: datetime) -> Sequence[dict]:
+    """在园游客（入园记录未出园）的最新一条定位"""
+    return db.execute(
+        text(
+            """
+            SELECT VisitorId, VisitId, Latitude, Longitude, AreaId, LocateTime, IsOutOfRoute
+            FROM (
+                SELECT t.VisitorId, t.VisitId, t.Latitude, t.Longitude, t.AreaId, t.LocateTime, t.IsOutOfRoute,
+                       ROW_NUMBER() OVER (PARTITION BY t.VisitorId ORDER BY t.LocateTime DESC, t.TrackId DESC) AS rn
+                FROM dbo.VisitorTracks t
+                JOIN dbo.Visits v ON v.VisitId = t.VisitId
+                WHERE v.ExitTime IS NULL AND t.LocateTime >= :since
+            ) x
+            WHERE rn = 1
+            """
+        ),
+        {"since": since},
+    ).mappings().all()
+
+
+def list_visit_track_points(db: Session, visit_id: int) -> Sequence[dict]:
+    return db.execute(
+        text(
+            "SELECT TrackId, VisitorId, VisitId, LocateTime, Latitude, Longitude, AreaId, IsOutOfRoute "
+            "FROM dbo.VisitorTracks WHERE VisitId = :vid ORDER BY LocateTime, TrackId"
+        ),
+        {"vid": visit_id},
+    ).mappings().all()
+
+
+def list_uncompacted_finished_visits(db: Session, limit: int) -> List[int]:
+    rows = db.execute(
+        text(
+            """
+            SELECT TOP (:n) v.VisitId
+            FROM dbo.Visits v
+            WHERE v.ExitTime IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM dbo.VisitorTrackArchives a WHERE a.VisitId = v.VisitId)
+              AND (SELECT COUNT(1) FROM dbo.VisitorTracks t WHERE t.VisitId = v.VisitId) > 2
+            ORDER BY v.ExitTime
+            """
+        ),
+        {"n": limit},
+    ).all()
+    return [int(r[0]) for r in rows]
+
+
+def get_track_archive(db: Session, visit_id: int) -> Optional[dict]:
+    return db.execute(
+        text(
+            "SELECT VisitId, VisitorId, RawPointCount, KeptPointCount, Tolerance, RawPoints, CompactedAt "
+            "FROM dbo.VisitorTrackArchives WHERE VisitId = :vid"
+        ),
+        {"vid": visit_id},
+    ).mappings().first()
+
+
+def list_track_archives(
+    db: Session,
+    visitor_id: Optional[int] = None,
+    visit_id: Optional[int] = None,
+    visit_ids: Optional[Sequence[int]] = None,
+) -> Sequence[dict]:
+    sql = "SELECT VisitId, VisitorId, RawPoints FROM dbo.VisitorTrackArchives WHERE 1 = 1"
+    params: dict = {}
+    if visit_ids is not None:
+        if not visit_ids:
+            return []
+        id_params = {f"v{i}": v for i, v in enumerate(visit_ids)}
+        sql += " AND VisitId IN (" + ", ".join(f":{p}" for p in id_params) + ")"
+        params.update(id_params)
+    if visitor_id is not None:
+        sql += " AND VisitorId = :visitor"
+        params["visitor"] = visitor_id
+    if visit_id is not None:
+        sql += " AND VisitId = :vid"
+        params["vid"] = visit_id
+    return db.execute(text(sql), params).mappings().all()
+
+
+def create_track_archive(
+    db: Session,
+    visit_id: int,
+    visitor_id: int,
+    raw_count: int,
+    kept_count: int,
+    tolerance: float,
+    raw_points: bytes,
+) -> None:
+    db.execute(
+        text(
+            """
+            INSERT INTO dbo.VisitorTrackArchives(VisitId, VisitorId, RawPointCount, KeptPointCount, Tolerance, RawPoints)
+            VALUES (:vid, :visitor, :raw, :kept, :tol, :blob)
+            """
+        ),
+        {"vid": visit_id, "visitor": visitor_id, "raw": raw_count, "kept": kept_count, "tol": tolerance, "blob": raw_points},
+    )
+
+
+_TRACK_DELETE_CHUNK = 1000
+
+
+def delete_tracks(db: Session, track_ids: Sequence[int]) -> int:
+    deleted = 0
+    for start in range(0, len(track_ids), _TRACK_DELETE_CHUNK):
+        chunk = track_ids[start:start + _TRACK_DELETE_CHUNK]
+        params = {f"t{i}": int(tid) for i, tid in enumerate(chunk)}
+        res = db.execute(
+            text("DELETE FROM dbo.VisitorTracks WHERE TrackId IN (" + ", ".join(f":{k}" for k in params) + ")"),
+            params,
+        )
+        deleted += int(res.rowcount or 0)
+    return deleted
+
+
+# 每行 4 个参数
+_HEATMAP_MERGE_CHUNK = 500
+
+
+def add_heatmap_bins(db: Session, bins: dict) -> None:
+    """按 (BucketStart, CellLat, CellLng) 累加热力图计数"""
+    items = list(bins.items())
+    for start in range(0, len(items), _HEATMAP_MERGE_CHUNK):
+        chunk = items[start:start + _HEATMAP_MERGE_CHUNK]
+        values = []
+        params: dict = {}
+        for i, ((bucket, cell_lat, cell_lng), count) in enumerate(chunk):
+            values.append(f"(:b{i}, :y{i}, :x{i}, :c{i})")
+            params.update({f"b{i}": bucket, f"y{i}": cell_lat, f"x{i}": cell_lng, f"c{i}": count})
+        db.execute(
+            text(
+                f"""
+                MERGE dbo.VisitorHeatmapBins WITH (HOLDLOCK) AS t
+                USING (VALUES {", ".join(values)}) AS s(BucketStart, CellLat, CellLng, PointCount)
+                ON t.BucketStart = s.BucketStart AND t.CellLat = s.CellLat AND t.CellLng = s.CellLng
+                WHEN MATCHED THEN
+                    UPDATE SET PointCount = t.PointCount + s.PointCount
+                WHEN NOT MATCHED THEN
+                    INSERT (BucketStart, CellLat, CellLng, PointCount)
+                    VALUES (s.BucketStart, s.CellLat, s.CellLng, s.PointCount);
+                """
+            ),
+            params,
+        )
+
+
+def sum_heatmap_bins(db: Session, start: datetime, end: datetime) -> Sequence[dict]:
+    return db.execute(
+        text(
+            """
+            SELECT CellLat, CellLng, SUM(PointCount) AS PointCount
+            FROM dbo.VisitorHeatmapBins
+            WHERE BucketStart >= :s AND BucketStart < :e
+            GROUP BY CellLat, CellLng
+            """
+        ),
+        {"s": start, "e": end},
+    ).mappings().all()
+
+
+def delete_heatmap_bins(db: Session, start: datetime, end: datetime) -> int:
+    res = db.execute(
+        text("DELETE FROM dbo.VisitorHeatmapBins WHERE BucketStart >= :s AND BucketStart < :e"),
+        {"s": start, "e": end},
+    )
+    return int(res.rowcount or 0)
+
+
+def list_track_points_between(db: Session, start: datetime, end: datetime) -> Sequence[dict]:
+    """时间范围内的轨迹点，不含已压缩归档的入园记录（其原始点从归档读取）"""
+    return db.execute(
+        text(
+            """
+            SELECT t.LocateTime, t.Latitude, t.Longitude
+            FROM dbo.VisitorTracks t
+            WHERE t.LocateTime >= :s AND t.LocateTime < :e
+              AND NOT EXISTS (SELECT 1 FROM dbo.VisitorTrackArchives a WHERE a.VisitId = t.VisitId)
+            """
+        ),
+        {"s": start, "e": end},
+    ).mappings().all()
+
+
+def list_track_archives_between(db: Session, start: datetime, end: datetime) -> Sequence[dict]:
+    return db.execute(
+        text(
+            """
+            SELECT a.VisitId, a.RawPoints
+            FROM dbo.VisitorTrackArchives a
+            JOIN dbo.Visits v ON v.VisitId = a.VisitId
+            WHERE v.EntryTime < :e AND (v.ExitTime IS NULL OR v.ExitTime >= :s)
+            """
+        ),
+        {"s": start, "e": end},
+    ).mappings().all()
+
+
 def list_flow_controls(db: Session) -> Sequence[dict]:
     return db.execute(text("SELECT * FROM dbo.v_AreaFlowControlStatus")).mappings().all()
 
@@ -173,6 +777,35 @@ def list_out_of_route_tracks(db: Session) -> Sequence[dict]:
     ).mappings().all()
 
 
+def get_reservation(db: Session, reservation_id: int) -> Optional[dict]:
+    return db.execute(
+        text(
+            """
+            SELECT ReservationId, VisitorId, ReserveDate, TimeSlot, PartySize, ReserveStatus, ParkName, UserId
+            FROM dbo.Reservations
+            WHERE ReservationId = :rid
+            """
+        ),
+        {"rid": reservation_id},
+    ).mappings().first()
+
+
+def list_confirmed_reservations_for_date(db: Session, reserve_date, reservation_id: Optional[int] = None) -> Sequence[dict]:
+    """某日已确认预约（含游客身份证号），用于闸机入园名单"""
+    sql = """
+        SELECT r.ReservationId, r.VisitorId, r.ReserveDate, r.TimeSlot, r.PartySize, r.ParkName,
+               v.IdCardNo, v.VisitorName
+        FROM dbo.Reservations r
+        JOIN dbo.Visitors v ON r.VisitorId = v.VisitorId
+        WHERE r.ReserveDate = :d AND r.ReserveStatus = N'已确认'
+    """
+    params: dict = {"d": reserve_date}
+    if reservation_id is not None:
+        sql += " AND r.ReservationId = :rid"
+        params["rid"] = reservation_id
+    return db.execute(text(sql), params).mappings().all()
+
+
 def list_reservations(db: Session) -> Sequence[dict]:
     return db.execute(
         text("SELECT TOP 200 * FROM dbo.v_VisitorReservationStatus ORDER BY ReservationId DESC")
@@ -0,0 +1,61 @@
+"""
+预约配额服务
+按 (ParkName, ReserveDate, TimeSlot) 在 ReservationQuotas 计数表中维护剩余名额，
+预约时只做一次带条件的扣减，不再对 Reservations 做 COUNT
+"""
+from typing import Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.visitor import queries
+
+# 占用名额的预约状态
+ACTIVE_STATUSES = {"待审核", "已确认", "已完成"}
+
+
+def quota_park_key(park_name: Optional[str]) -> str:
+    """未指定公园的预约统一记在空字符串键下"""
+    return (park_name or "").strip()
+
+
+def take(db: Session, park_name: Optional[str], reserve_date, time_slot: str, party_size: int) -> bool:
+    """扣减名额，成功返回 True；名额不足返回 False（不抛异常，由接口决定如何响应）"""
+    park = quota_park_key(park_name)
+    taken = queries.try_take_quota(db, park, reserve_date, time_slot, party_size)
+    if taken is not None:
+        return taken
+    # 配额行不存在（首次预约该日期/时段）：按默认容量创建后重试一次；
+    # 并发的首次预约中只有一个请求能创建，其余请求同样需要重试
+    queries.create_quota_if_absent(db, park, reserve_date, time_slot, settings.reservation_slot_capacity)
+    return bool(queries.try_take_quota(db, park, reserve_date, time_slot, party_size))
+
+
+def release(db: Session, park_name: Optional[str], reserve_date, time_slot: str, party_size: int) -> None:
+    queries.release_quota(db, quota_park_key(park_name), reserve_date, time_slot, party_size)
+
+
+def apply_status_change(db: Session, old_status: str, new_status: str, row: dict) -> bool:
+    """预约状态变化时同步名额：释放或重新占用；重新占用失败返回 False"""
+    was_active = old_status in ACTIVE_STATUSES
+    is_active = new_status in ACTIVE_STATUSES
+    key = (row["ParkName"], row["ReserveDate"], row["TimeSlot"], int(row["PartySize"]))
+    if was_active and not is_active:
+        release(db, *key)
+    elif is_active and not was_active:
+        return take(db, *key)
+    return True
+
+
+def set_capacity(db: Session, park_name: Optional[str], reserve_date, time_slot: str, capacity: int) -> None:
+    queries.set_quota_capacity(db, quota_park_key(park_name), reserve_date, time_slot, capacity)
+
+
+def list_quotas(db: Session, reserve_date=None, park_name: Optional[str] = None) -> Sequence[dict]:
+    park = quota_park_key(park_name) if park_name is not None else None
+    return queries.list_quotas(db, reserve_date=reserve_date, park_name=park)
+
+
+def reconcile(db: Session, from_date=None) -> Sequence[dict]:
+    """与实际预约对账，返回被修正的配额行"""
+    return queries.reconcile_quotas(db, from_date=from_date)
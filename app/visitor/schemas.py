@@ -1,10 +1,12 @@
 
 from datetime import datetime, date
-from typing import Optional, List
+from typing import Optional, List, Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from pydantic.config import ConfigDict
 
+from app.timeutil import local_naive
+
 
 class ReservationCreate(BaseModel):
     visitor_name: str = Field(..., min_length=1, max_length=50)
@@ -48,7 +50,8 @@ class FlowControlOut(BaseModel):
 
 
 class VisitEnterCreate(BaseModel):
-    id_card_no: str = Field(..., min_length=5, max_length=30)
+    id_card_no: Optional[str] = Field(None, min_length=5, max_length=30)
+    ticket: Optional[str] = Field(None, max_length=200, description="电子入园票（二维码内容），提供时无需身份证号")
     area_id: int
     entry_method: str = Field(..., description="线上预约/现场购票")
     reservation_id: Optional[int] = None
@@ -74,6 +77,11 @@ class TrackCreate(BaseModel):
     area_id: int
     is_out_of_route: bool = False
 
+    @field_validator("locate_time")
+    @classmethod
+    def to_local_naive(cls, v):
+        return local_naive(v)
+
 
 class OutOfRouteTrackOut(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
@@ -86,6 +94,11 @@ class OutOfRouteTrackOut(BaseModel):
     latitude: Optional[float] = Field(None, alias="Latitude")
     longitude: Optional[float] = Field(None, alias="Longitude")
 
+    @field_validator("locate_time")
+    @classmethod
+    def to_local_naive(cls, v):
+        return local_naive(v)
+
 
 class RecalcFlowControlRequest(BaseModel):
     area_id: Optional[int] = None
@@ -130,3 +143,74 @@ class AlertOut(BaseModel):
 class ReservationConfirm(BaseModel):
     status: str = Field(..., description="已确认/已取消/已完成")
 
+
+class EntryTicketOut(BaseModel):
+    reservation_id: int
+    reserve_date: date
+    time_slot: str
+    party_size: int
+    ticket: str
+
+
+class QueueStatusOut(BaseModel):
+    queue_token: str
+    position: int = Field(..., description="前方等待人数（含自己），0 表示已放行")
+    eta_seconds: float
+    admitted: bool
+
+
+class ReservationQuotaOut(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    park_name: Optional[str] = Field(None, alias="ParkName")
+    reserve_date: Optional[date] = Field(None, alias="ReserveDate")
+    time_slot: Optional[str] = Field(None, alias="TimeSlot")
+    capacity: Optional[int] = Field(None, alias="Capacity")
+    remaining: Optional[int] = Field(None, alias="Remaining")
+
+
+class ReservationQuotaSet(BaseModel):
+    park_name: Optional[str] = Field(None, description="公园名称，为空表示未指定公园")
+    reserve_date: date
+    time_slot: str = Field(..., description="上午/下午/全天")
+    capacity: int = Field(..., ge=0)
+
+
+class VisitSyncEvent(BaseModel):
+    event_key: str = Field(..., min_length=1, max_length=64, description="闸机生成的幂等键，重复提交时返回首次处理结果")
+    event_type: Literal["enter", "exit"]
+    occurred_at: datetime
+    area_id: Optional[int] = None
+    id_card_no: Optional[str] = Field(None, min_length=5, max_length=30)
+    reservation_id: Optional[int] = None
+    visit_id: Optional[int] = Field(None, description="出园事件可直接指定入园记录")
+    entry_method: str = Field("线上预约", description="线上预约/现场购票")
+
+    @field_validator("occurred_at")
+    @classmethod
+    def to_local_naive(cls, v):
+        """带时区的时间转换为服务器本地时间并去掉时区，与库中的 EntryTime/ExitTime 一致"""
+        return local_naive(v)
+
+
+class VisitSyncRequest(BaseModel):
+    device_id: Optional[str] = Field(None, max_length=50)
+    events: List[VisitSyncEvent] = Field(..., min_length=1, max_length=500)
+
+
+class ReservationBatchApprove(BaseModel):
+    reservation_ids: Optional[List[int]] = Field(None, max_length=1000, description="指定预约编号；为空时按筛选条件审核")
+    reserve_date: Optional[date] = None
+    park_name: Optional[str] = None
+    time_slot: Optional[str] = Field(None, description="上午/下午/全天")
+    max_party_size: Optional[int] = Field(None, gt=0, le=20)
+
+
+class LivePositionOut(BaseModel):
+    visitor_id: int
+    visit_id: Optional[int]
+    latitude: float
+    longitude: float
+    area_id: int
+    locate_time: datetime
+    is_out_of_route: bool
@@ -0,0 +1,108 @@
+"""
+电子入园票
+预约确认时生成紧凑的签名票据（二维码内容），闸机可离线验签；入园接口验签后只按主键确认预约状态。
+
+票据格式：T1.<预约编号>.<游客编号>.<日期YYYYMMDD>.<时段代码>.<人数>.<签名>
+签名为 HMAC-SHA256 截断后的 base64url，闸机只需持有 entry_ticket_key 即可离线验签。
+验签时同时检查入园日期和时段：上午票在 entry_ticket_noon_hour 之前、下午票在其后入园，全天票不限。
+核销记录在 dbo.TicketCheckIns（每个预约每天一行），与入园记录在同一事务中写入。
+"""
+import base64
+import hashlib
+import hmac
+from datetime import date, datetime
+from typing import Dict, NamedTuple, Optional
+
+from app.config import settings
+
+TICKET_VERSION = "T1"
+SLOT_CODES = {"上午": "AM", "下午": "PM", "全天": "DAY"}
+_SLOT_NAMES = {v: k for k, v in SLOT_CODES.items()}
+_SIG_BYTES = 12
+
+
+class TicketError(ValueError):
+    pass
+
+
+class TicketClaims(NamedTuple):
+    reservation_id: int
+    visitor_id: int
+    reserve_date: date
+    time_slot: str
+    party_size: int
+
+
+def _signing_key() -> bytes:
+    if settings.entry_ticket_key:
+        return settings.entry_ticket_key.encode("utf-8")
+    # 未单独配置时由应用密钥派生，避免闸机持有会话签名密钥
+    return hmac.new(settings.app_secret_key.encode("utf-8"), b"entry-ticket", hashlib.sha256).digest()
+
+
+def _sign(body: str) -> str:
+    digest = hmac.new(_signing_key(), body.encode("ascii"), hashlib.sha256).digest()[:_SIG_BYTES]
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def issue(reservation_id: int, visitor_id: int, reserve_date: date, time_slot: str, party_size: int) -> str:
+    if time_slot not in SLOT_CODES:
+        raise TicketError(f"未知时段: {time_slot}")
+    body = ".".join(
+        [
+            TICKET_VERSION,
+            str(int(reservation_id)),
+            str(int(visitor_id)),
+            reserve_date.strftime("%Y%m%d"),
+            SLOT_CODES[time_slot],
+            str(int(party_size)),
+        ]
+    )
+    return f"{body}.{_sign(body)}"
+
+
+def _in_slot(time_slot: str, at: datetime) -> bool:
+    if time_slot == "上午":
+        return at.hour < settings.entry_ticket_noon_hour
+    if time_slot == "下午":
+        return at.hour >= settings.entry_ticket_noon_hour
+    return True
+
+
+def verify(code: str, at: Optional[datetime] = None) -> TicketClaims:
+    """验签并检查入园日期和时段（at 为入园时间，默认当前时间），失败抛出 TicketError"""
+    parts = (code or "").strip().split(".")
+    if len(parts) != 7 or parts[0] != TICKET_VERSION:
+        raise TicketError("电子票格式错误")
+
+    body, sig = ".".join(parts[:6]), parts[6]
+    if not hmac.compare_digest(_sign(body), sig):
+        raise TicketError("电子票签名无效")
+
+    try:
+        claims = TicketClaims(
+            reservation_id=int(parts[1]),
+            visitor_id=int(parts[2]),
+            reserve_date=datetime.strptime(parts[3], "%Y%m%d").date(),
+            time_slot=_SLOT_NAMES[parts[4]],
+            party_size=int(parts[5]),
+        )
+    except (KeyError, ValueError):
+        raise TicketError("电子票内容错误")
+
+    at = at or datetime.now()
+    if claims.reserve_date != at.date():
+        raise TicketError("电子票不在有效入园日期")
+    if not _in_slot(claims.time_slot, at):
+        raise TicketError(f"电子票为{claims.time_slot}时段，当前不在有效入园时段")
+    return claims
+
+
+def ticket_for_row(row: Dict) -> str:
+    return issue(
+        reservation_id=row["ReservationId"],
+        visitor_id=row["VisitorId"],
+        reserve_date=row["ReserveDate"],
+        time_slot=row["TimeSlot"],
+        party_size=row["PartySize"],
+    )
@@ -0,0 +1,216 @@
+"""
+游客轨迹压缩
+慢速步行的游客大部分定位点都是冗余的。对已出园的入园记录按 VisitId 做一次压缩：
+越界点、区域切换前后的点、首尾点以及长时间断点原样保留，其余点之间用 Douglas-Peucker
+按容差（米）抽稀；被删除的原始点整体压缩归档到 dbo.VisitorTrackArchives，需要时可还原。
+"""
+import json
+import math
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Set
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.visitor import queries
+
+_EARTH_RADIUS_M = 6371008.8
+_ARCHIVE_FIELDS = ("TrackId", "LocateTime", "Latitude", "Longitude", "AreaId", "IsOutOfRoute")
+
+
+def _project(points: Sequence[dict]) -> List[tuple]:
+    """以首点为原点做等距投影，轨迹范围很小时误差可以忽略"""
+    lat0 = math.radians(float(points[0]["Latitude"]))
+    lng0 = float(points[0]["Longitude"])
+    cos_lat0 = math.cos(lat0)
+    return [
+        (
+            math.radians(float(p["Longitude"]) - lng0) * cos_lat0 * _EARTH_RADIUS_M,
+            (math.radians(float(p["Latitude"])) - lat0) * _EARTH_RADIUS_M,
+        )
+        for p in points
+    ]
+
+
+def _segment_distance(p: tuple, a: tuple, b: tuple) -> float:
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(p[0] - (a[0] + t * dx), p[1] - (a[1] + t * dy))
+
+
+def _douglas_peucker(xy: Sequence[tuple], start: int, end: int, tolerance: float, keep: Set[int]) -> None:
+    stack = [(start, end)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        best, best_d = -1, -1.0
+        for k in range(i + 1, j):
+            d = _segment_distance(xy[k], xy[i], xy[j])
+            if d > best_d:
+                best, best_d = k, d
+        if best_d > tolerance:
+            keep.add(best)
+            stack.append((i, best))
+            stack.append((best, j))
+
+
+def _anchor_indexes(points: Sequence[dict], max_gap_seconds: float) -> Set[int]:
+    """必须原样保留的点：首尾、越界点、区域切换两侧、定位中断两侧"""
+    n = len(points)
+    anchors = {0, n - 1}
+    for i, p in enumerate(points):
+        if p["IsOutOfRoute"]:
+            anchors.add(i)
+        if i == 0:
+            continue
+        prev = points[i - 1]
+        if p["AreaId"] != prev["AreaId"]:
+            anchors.update((i - 1, i))
+        elif (p["LocateTime"] - prev["LocateTime"]).total_seconds() > max_gap_seconds:
+            anchors.update((i - 1, i))
+    return anchors
+
+
+def simplify(
+    points: Sequence[dict],
+    tolerance_m: Optional[float] = None,
+    max_gap_seconds: Optional[float] = None,
+) -> List[dict]:
+    """按时间排序的同一段轨迹抽稀，返回保留的点（保持原顺序）"""
+    if len(points) <= 2:
+        return list(points)
+    tolerance = settings.track_simplify_tolerance_m if tolerance_m is None else tolerance_m
+    max_gap = settings.track_max_gap_seconds if max_gap_seconds is None else max_gap_seconds
+
+    keep = _anchor_indexes(points, max_gap)
+    xy = _project(points)
+    anchors = sorted(keep)
+    for a, b in zip(anchors, anchors[1:]):
+        _douglas_peucker(xy, a, b, tolerance, keep)
+    return [points[i] for i in sorted(keep)]
+
+
+def simplify_rows(rows: Sequence[dict]) -> List[dict]:
+    """列表接口用：按入园记录（无入园记录时按游客）分组抽稀，保持原有排序"""
+    groups: Dict[tuple, List[dict]] = {}
+    for r in rows:
+        key = ("visit", r["VisitId"]) if r.get("VisitId") is not None else ("visitor", r["VisitorId"])
+        groups.setdefault(key, []).append(r)
+
+    kept: Set[int] = set()
+    for group in groups.values():
+        ordered = sorted(group, key=lambda r: (r["LocateTime"], r["TrackId"]))
+        kept.update(r["TrackId"] for r in simplify(ordered))
+    return [r for r in rows if r["TrackId"] in kept]
+
+
+def _encode_archive(points: Sequence[dict]) -> bytes:
+    data = [
+        [
+            int(p["TrackId"]),
+            p["LocateTime"].isoformat(),
+            float(p["Latitude"]),
+            float(p["Longitude"]),
+            int(p["AreaId"]),
+            1 if p["IsOutOfRoute"] else 0,
+        ]
+        for p in points
+    ]
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def decode_archive(blob: bytes) -> List[dict]:
+    rows = json.loads(zlib.decompress(blob).decode("utf-8"))
+    out = []
+    for r in rows:
+        item = dict(zip(_ARCHIVE_FIELDS, r))
+        item["LocateTime"] = datetime.fromisoformat(item["LocateTime"])
+        item["IsOutOfRoute"] = bool(item["IsOutOfRoute"])
+        out.append(item)
+    return out
+
+
+def with_archived_points(
+    db: Session,
+    rows: Sequence[dict],
+    visitor_id: Optional[int] = None,
+    visit_id: Optional[int] = None,
+    limit: int = 500,
+) -> List[dict]:
+    """
+    原始轨迹：已压缩的入园记录用归档中的全部原始点替换抽稀后的点。
+    未按游客或入园记录筛选时（最近的定位点）只还原 rows 中出现的入园记录：
+    归档记录的末点总会保留，时间窗内有原始点的入园记录一定出现在 rows 中。
+    """
+    if visitor_id is None and visit_id is None:
+        visit_ids = sorted({r["VisitId"] for r in rows if r.get("VisitId") is not None})
+        archives = queries.list_track_archives(db, visit_ids=visit_ids)
+    else:
+        archives = queries.list_track_archives(db, visitor_id=visitor_id, visit_id=visit_id)
+    if not archives:
+        return list(rows)
+
+    names = {r["VisitorId"]: r.get("VisitorName") for r in rows}
+    archived_visits = {a["VisitId"] for a in archives}
+    merged = [r for r in rows if r.get("VisitId") not in archived_visits]
+    for a in archives:
+        for p in decode_archive(a["RawPoints"]):
+            p.update({"VisitorId": a["VisitorId"], "VisitId": a["VisitId"], "VisitorName": names.get(a["VisitorId"])})
+            merged.append(p)
+    merged.sort(key=lambda r: (r["LocateTime"], r["TrackId"]), reverse=True)
+    return merged[:limit]
+
+
+def compact_visit(db: Session, visit_id: int, tolerance_m: Optional[float] = None) -> Optional[dict]:
+    """压缩单个入园记录的轨迹，调用方负责提交；已压缩或点数过少时返回 None"""
+    if queries.get_track_archive(db, visit_id) is not None:
+        return None
+    points = queries.list_visit_track_points(db, visit_id)
+    if len(points) <= 2:
+        return None
+
+    tolerance = settings.track_simplify_tolerance_m if tolerance_m is None else tolerance_m
+    kept = simplify(points, tolerance_m=tolerance)
+    kept_ids = {p["TrackId"] for p in kept}
+    removed = [p["TrackId"] for p in points if p["TrackId"] not in kept_ids]
+
+    queries.create_track_archive(
+        db,
+        visit_id=visit_id,
+        visitor_id=points[0]["VisitorId"],
+        raw_count=len(points),
+        kept_count=len(kept),
+        tolerance=tolerance,
+        raw_points=_encode_archive(points),
+    )
+    queries.delete_tracks(db, removed)
+    return {"visit_id": visit_id, "raw_points": len(points), "kept_points": len(kept)}
+
+
+def compact_finished_visits(db: Session, limit: int = 200, tolerance_m: Optional[float] = None) -> dict:
+    """压缩已出园且尚未压缩的入园记录，逐个提交，单个失败不影响其它"""
+    compacted, failed = [], []
+    for visit_id in queries.list_uncompacted_finished_visits(db, limit):
+        try:
+            result = compact_visit(db, visit_id, tolerance_m=tolerance_m)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            failed.append({"visit_id": visit_id, "error": str(e)})
+            continue
+        if result:
+            compacted.append(result)
+
+    raw = sum(c["raw_points"] for c in compacted)
+    kept = sum(c["kept_points"] for c in compacted)
+    return {
+        "visits": len(compacted),
+        "raw_points": raw,
+        "kept_points": kept,
+        "removed_rows": raw - kept,
+        "failed": failed,
+    }
@@ -0,0 +1,172 @@
+"""
+闸机批量同步
+团体入园和断网闸机会一次产生大量入园/出园事件。闸机本地缓存带时间戳和幂等键的事件，
+联网后整批提交：同一事务内按发生时间顺序处理，写入期间暂停 TR_Visits_FlowControl 的逐行重算，
+事务末尾对受影响区域各重算一次；重复提交的事件直接返回首次处理结果，无法处理的事件作为冲突返回。
+写入前先按批查询事件引用的区域、游客和预约，引用不存在的事件作为冲突返回，不会因外键错误使整批失败。
+"""
+from typing import Dict, List, Optional, Sequence, Set
+
+from sqlalchemy.orm import Session
+
+from app.visitor import queries
+from app.visitor.live_positions import position_index
+
+APPLIED = "applied"
+CONFLICT = "conflict"
+
+
+class _Conflict(Exception):
+    pass
+
+
+class _References:
+    """一批事件引用的区域、游客和预约，各一条查询取出"""
+
+    def __init__(self, db: Session, events: Sequence):
+        self.area_ids = queries.list_existing_area_ids(
+            db, sorted({e.area_id for e in events if e.area_id is not None})
+        )
+        self.visitor_ids = queries.get_visitor_ids_by_id_cards(
+            db, sorted({e.id_card_no for e in events if e.id_card_no})
+        )
+        self.reservations = queries.get_reservations(
+            db, sorted({e.reservation_id for e in events if e.event_type == "enter" and e.reservation_id is not None})
+        )
+
+
+def _resolve_visitor(event, refs: _References) -> int:
+    if not event.id_card_no:
+        raise _Conflict("缺少身份证号")
+    visitor_id = refs.visitor_ids.get(event.id_card_no)
+    if not visitor_id:
+        raise _Conflict("游客不存在")
+    return visitor_id
+
+
+def _check_reservation(reservation_id: int, visitor_id: int, refs: _References) -> None:
+    row = refs.reservations.get(reservation_id)
+    if not row:
+        raise _Conflict("预约编号不存在")
+    if int(row["VisitorId"]) != visitor_id:
+        raise _Conflict("预约编号与游客身份证不匹配")
+    if row["ReserveStatus"] == "已取消":
+        raise _Conflict("预约已取消")
+
+
+def _apply_enter(db: Session, event, refs: _References, open_visits: Dict[tuple, int]) -> dict:
+    if event.area_id is None:
+        raise _Conflict("入园事件缺少区域ID")
+    if event.area_id not in refs.area_ids:
+        raise _Conflict("区域不存在")
+    visitor_id = _resolve_visitor(event, refs)
+    if event.reservation_id is not None:
+        _check_reservation(event.reservation_id, visitor_id, refs)
+
+    key = (visitor_id, event.area_id)
+    if key in open_visits or queries.find_open_visit(db, visitor_id, event.area_id):
+        raise _Conflict("游客已在该区域内，未出园")
+
+    visit_id = queries.create_visit(
+        db,
+        visitor_id=visitor_id,
+        area_id=event.area_id,
+        entry_method=event.entry_method,
+        reservation_id=event.reservation_id,
+        entry_time=event.occurred_at,
+    )
+    open_visits[key] = visit_id
+    return {"visit_id": visit_id, "area_id": event.area_id}
+
+
+def _apply_exit(db: Session, event, refs: _References, open_visits: Dict[tuple, int], exited_visitors: Set[int]) -> dict:
+    visit = None
+    if event.visit_id is not None:
+        visit = queries.get_visit(db, event.visit_id)
+        if not visit:
+            raise _Conflict("入园记录不存在")
+    else:
+        visitor_id = _resolve_visitor(event, refs)
+        visit = queries.find_open_visit(db, visitor_id, event.area_id)
+        if not visit:
+            raise _Conflict("未找到未出园的入园记录")
+
+    if visit["ExitTime"] is not None:
+        raise _Conflict("该入园记录已出园")
+    if visit["EntryTime"] > event.occurred_at:
+        raise _Conflict("出园时间早于入园时间")
+
+    queries.exit_visit(db, int(visit["VisitId"]), exit_time=event.occurred_at)
+    exited_visitors.add(int(visit["VisitorId"]))
+    open_visits.pop((int(visit["VisitorId"]), int(visit["AreaId"])), None)
+    return {"visit_id": int(visit["VisitId"]), "area_id": int(visit["AreaId"])}
+
+
+def sync_events(db: Session, events: Sequence, device_id: Optional[str] = None) -> dict:
+    """处理一批闸机事件，调用方负责提交。
+
+    出现数据库错误时连接上会残留 SkipFlowRecalc 标记，调用方应废弃该连接（Session.invalidate）。
+    """
+    applied: List[dict] = []
+    duplicates: List[dict] = []
+    conflicts: List[dict] = []
+
+    # 批内重复的幂等键只处理第一条
+    unique = {}
+    for e in events:
+        unique.setdefault(e.event_key, e)
+
+    for row in queries.get_sync_events(db, list(unique)):
+        unique.pop(row["EventKey"], None)
+        duplicates.append({
+            "event_key": row["EventKey"],
+            "status": row["ResultStatus"],
+            "visit_id": row["VisitId"],
+            "reason": row["Reason"],
+        })
+
+    pending = sorted(unique.values(), key=lambda e: e.occurred_at)
+    refs = _References(db, pending)
+    open_visits: Dict[tuple, int] = {}
+    areas: Set[int] = set()
+    exited_visitors: Set[int] = set()
+    records: List[dict] = []
+
+    queries.set_flow_recalc_deferred(db, True)
+    for e in pending:
+        try:
+            if e.event_type == "enter":
+                result = _apply_enter(db, e, refs, open_visits)
+            else:
+                result = _apply_exit(db, e, refs, open_visits, exited_visitors)
+        except _Conflict as c:
+            conflicts.append({"event_key": e.event_key, "event_type": e.event_type, "reason": str(c)})
+            records.append({
+                "EventKey": e.event_key, "DeviceId": device_id, "EventType": e.event_type,
+                "OccurredAt": e.occurred_at, "ResultStatus": CONFLICT, "Reason": str(c),
+            })
+            continue
+
+        areas.add(result["area_id"])
+        applied.append({"event_key": e.event_key, "event_type": e.event_type, **result})
+        records.append({
+            "EventKey": e.event_key, "DeviceId": device_id, "EventType": e.event_type,
+            "OccurredAt": e.occurred_at, "VisitId": result["visit_id"], "ResultStatus": APPLIED,
+        })
+
+    queries.record_sync_events(db, records)
+    queries.set_flow_recalc_deferred(db, False)
+
+    for area_id in sorted(areas):
+        queries.recalc_flow_control(db, area_id)
+
+    # 出园游客从实时位置索引移除（提交失败时只是提前移除，下一次定位上报会恢复）
+    for visitor_id in exited_visitors:
+        position_index.evict(visitor_id)
+
+    return {
+        "applied": applied,
+        "duplicates": duplicates,
+        "conflicts": conflicts,
+        "recalculated_areas": sorted(areas),
+    }
@@ -0,0 +1,154 @@
+"""
+预约虚拟等候室
+放号高峰时在预约写库之前排队：客户端拿到签名排队令牌和排位，
+固定速率的放行器每秒只放行 N 个预约进入数据库，排位/预计等待时间全部由内存计算。
+
+说明：放行状态保存在进程内存中，放行速率按单个工作进程计算；
+其它进程签发的令牌在本进程会被视为新排队者。
+"""
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from fastapi import Depends, Header, HTTPException, status
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from app.config import settings
+from app.core import models as core_models
+from app.core.api import get_current_user
+
+_serializer = URLSafeTimedSerializer(settings.app_secret_key, salt="waiting-room")
+
+QUEUE_TOKEN_HEADER = "X-Queue-Token"
+
+
+class AdmissionQueue:
+    """令牌桶放行器：票号按到达顺序递增，额度按固定速率累积，额度足够时按票号顺序放行"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = max(float(rate), 0.001)
+        self.burst = max(float(burst if burst is not None else rate), 1.0)
+        self.room_id = uuid.uuid4().hex[:12]
+        self._issued = 0
+        self._admitted = 0
+        self._credit = self.burst
+        self._last = time.monotonic()
+        self._consumed: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def _advance(self, now: float) -> None:
+        self._credit = min(self.burst, self._credit + (now - self._last) * self.rate)
+        self._last = now
+        waiting = self._issued - self._admitted
+        n = min(waiting, int(self._credit))
+        if n > 0:
+            self._admitted += n
+            self._credit -= n
+
+    def join(self) -> int:
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            self._issued += 1
+            ticket = self._issued
+            self._advance(now)
+            return ticket
+
+    def position(self, ticket: int) -> int:
+        """前方仍需等待的人数（含自己），0 表示已放行"""
+        with self._lock:
+            self._advance(time.monotonic())
+            return max(0, ticket - self._admitted)
+
+    def consume(self, ticket: int) -> bool:
+        """已放行的票号只能使用一次"""
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            if ticket > self._admitted or ticket in self._consumed:
+                return False
+            self._consumed[ticket] = now
+            if len(self._consumed) > 4 * self.burst + 1024:
+                self._prune(now)
+            return True
+
+    def _prune(self, now: float) -> None:
+        # 超过令牌有效期的票号不可能再被出示，可以丢弃
+        cutoff = now - settings.waiting_room_token_ttl
+        self._consumed = {t: ts for t, ts in self._consumed.items() if ts >= cutoff}
+
+    def eta_seconds(self, position: int) -> float:
+        return round(position / self.rate, 1)
+
+    def waiting(self) -> int:
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._issued - self._admitted
+
+
+booking_queue = AdmissionQueue(settings.waiting_room_admit_rate)
+
+
+def _issue_token(ticket: int) -> str:
+    return _serializer.dumps({"room": booking_queue.room_id, "ticket": ticket})
+
+
+def _read_ticket(token: str) -> Optional[int]:
+    try:
+        payload = _serializer.loads(token, max_age=settings.waiting_room_token_ttl)
+    except (BadSignature, SignatureExpired):
+        return None
+    if not isinstance(payload, dict) or payload.get("room") != booking_queue.room_id:
+        return None
+    return int(payload.get("ticket", 0)) or None
+
+
+def _status(token: str, ticket: int) -> dict:
+    position = booking_queue.position(ticket)
+    return {
+        "queue_token": token,
+        "position": position,
+        "eta_seconds": booking_queue.eta_seconds(position),
+        "admitted": position == 0,
+    }
+
+
+def join() -> dict:
+    ticket = booking_queue.join()
+    return _status(_issue_token(ticket), ticket)
+
+
+def get_status(token: str) -> dict:
+    ticket = _read_ticket(token)
+    if ticket is None:
+        raise HTTPException(status_code=400, detail="排队令牌无效或已过期，请重新排队")
+    return _status(token, ticket)
+
+
+def admit_booking(
+    queue_token: Optional[str] = Header(None, alias=QUEUE_TOKEN_HEADER),
+    current_user: core_models.User = Depends(get_current_user),
+) -> None:
+    """预约接口依赖：先认证再排队，未登录的请求不占用放行额度；
+    排队中的请求只查询一次用户，不访问预约相关的表"""
+    if not settings.waiting_room_enabled:
+        return
+
+    ticket = _read_ticket(queue_token) if queue_token else None
+    if ticket is None:
+        ticket = booking_queue.join()
+        queue_token = _issue_token(ticket)
+
+    if booking_queue.consume(ticket):
+        return
+
+    info = _status(queue_token, ticket)
+    if info["admitted"]:
+        # 已放行但令牌已被使用过
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="排队令牌已使用，请重新排队")
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail={"message": "预约人数较多，正在排队", **info},
+        headers={"Retry-After": str(max(1, int(info["eta_seconds"])))},
+    )
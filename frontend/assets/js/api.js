@@ -88,6 +88,49 @@
     return data;
   }
 
+  // 分块续传：创建会话后逐块 PUT，失败时查询已接收的字节数从断点继续
+  async function uploadResumable(createUrl, file, options) {
+    options = options || {};
+    var session = await requestJson("POST", createUrl, { filename: file.name, total_size: file.size }, options);
+    var base = "/api/biodiversity/uploads/" + session.upload_id;
+    var chunkSize = session.chunk_size;
+    var offset = session.received || 0;
+    var retries = 0;
+
+    while (offset < file.size) {
+      var headers = { "Content-Type": "application/octet-stream" };
+      var token = options.token != null ? options.token : _getToken();
+      if (token) {
+        headers["Authorization"] = "Bearer " + token;
+      }
+      try {
+        var resp = await fetch(base + "?offset=" + offset, {
+          method: "PUT",
+          headers: headers,
+          body: file.slice(offset, offset + chunkSize)
+        });
+        if (!resp.ok) {
+          var err = new Error("HTTP " + resp.status);
+          err.status = resp.status;
+          try { err.data = await resp.json(); } catch (e) { err.data = null; }
+          throw err;
+        }
+        offset = (await resp.json()).received;
+        retries = 0;
+      } catch (e) {
+        if ((e.status && e.status !== 409 && e.status < 500) || ++retries > 5) {
+          throw e;
+        }
+        var status = await requestJson("GET", base, null, options);
+        offset = status.received;
+      }
+      if (options.onProgress) {
+        options.onProgress(offset, file.size);
+      }
+    }
+    return requestJson("POST", base + "/complete", null, options);
+  }
+
   function formatError(err) {
     if (!err) return "未知错误";
     if (typeof err === "string") return err;
@@ -107,6 +150,7 @@
   window.Api = {
     requestJson: requestJson,
     uploadFile: uploadFile,
+    uploadResumable: uploadResumable,
     formatError: formatError,
   };
 })();
@@ -233,6 +233,9 @@
         // 记录文件列
         var fileCell = '<div style="display:flex;gap:4px;align-items:center;justify-content:center;">';
         if (item.image_path) {
+          if (item.thumbnail_url && item.thumbnail_url !== item.image_path) {
+            fileCell += '<img src="' + item.thumbnail_url + '" loading="lazy" alt="" style="height:32px;border-radius:4px;" onerror="this.style.display=\'none\'" />';
+          }
           fileCell += '<a href="' + item.image_path + '" target="_blank" class="btn btn-sm btn-success" download>📥 下载</a>';
         }
         fileCell += '<button class="btn btn-sm btn-info" onclick="BiodiversityPage.uploadFile(' + item.id + ')">📤 上传</button>';
@@ -259,6 +262,10 @@
       });
       
       html += '</tbody></table>';
+      var pendingItems = data.filter(function(item) { return item.state === "待核实"; });
+      if (pendingItems.length > 1 && isAnalyst()) {
+        html += '<div style="margin-top:16px;"><button class="btn btn-success" onclick="BiodiversityPage.verifyListed()">✓ 核实本页全部待核实记录（' + pendingItems.length + '）</button></div>';
+      }
       container.innerHTML = html;
     } catch (e) {
       container.innerHTML = '<div class="notice notice-danger">加载失败: ' + Api.formatError(e) + '</div>';
@@ -522,7 +529,7 @@
     if (r.image_path) {
       imageHtml = '<div style="margin-top:16px;padding:16px;background:#f8fafc;border-radius:8px;text-align:center;">' +
         '<div style="color:#666;margin-bottom:8px;font-weight:500;">📷 监测影像</div>' +
-        '<img src="' + r.image_path + '" alt="监测影像" style="max-width:100%;max-height:300px;border-radius:8px;box-shadow:0 2px 8px rgba(0,0,0,0.1);" onerror="this.style.display=\'none\';this.nextElementSibling.style.display=\'block\';" />' +
+        '<img src="' + (r.preview_url || r.image_path) + '" alt="监测影像" style="max-width:100%;max-height:300px;border-radius:8px;box-shadow:0 2px 8px rgba(0,0,0,0.1);" onerror="this.style.display=\'none\';this.nextElementSibling.style.display=\'block\';" />' +
         '<div style="display:none;color:#999;padding:20px;">图片加载失败，路径：' + r.image_path + '</div>' +
         '<div style="margin-top:8px;"><a href="' + r.image_path + '" target="_blank" class="btn btn-sm btn-info">🔍 查看原图</a></div>' +
       '</div>';
@@ -656,7 +663,24 @@
     });
   }
 
+  async function verifyListed() {
+    var ids = recordsCache.filter(function(item) { return item.state === "待核实"; })
+      .map(function(item) { return item.id; });
+    if (ids.length === 0) return;
+    Common.confirm("确认核实本页 " + ids.length + " 条待核实记录？", async function() {
+      try {
+        var result = await Api.requestJson("POST", "/api/biodiversity/records/batch-verify", { record_ids: ids });
+        Common.showToast("✅ 已核实 " + result.verified + " 条记录", "success");
+        loadObservations();
+      } catch (e) {
+        Common.showToast("批量核实失败: " + Api.formatError(e), "error");
+      }
+    });
+  }
+
   // ========== 上传记录文件 ==========
+  var RESUMABLE_UPLOAD_THRESHOLD = 16 * 1024 * 1024;
+
   function uploadFile(recordId) {
     var content = 
       '<div style="text-align:center;padding:20px;">' +
@@ -691,12 +715,22 @@
         document.getElementById("progressBar").style.width = "30%";
         
         try {
-          var formData = new FormData();
-          formData.append("file", file);
-          
-          document.getElementById("progressBar").style.width = "60%";
-          
-          var resp = await Api.uploadFile("/api/biodiversity/records/" + recordId + "/upload", formData);
+          if (file.size > RESUMABLE_UPLOAD_THRESHOLD) {
+            // 大文件（无人机视频）分块续传
+            await Api.uploadResumable("/api/biodiversity/records/" + recordId + "/uploads", file, {
+              onProgress: function(sent, total) {
+                document.getElementById("progressBar").style.width = Math.floor(sent * 100 / total) + "%";
+                document.getElementById("progressText").textContent = "上传中... " + Math.floor(sent * 100 / total) + "%";
+              }
+            });
+          } else {
+            var formData = new FormData();
+            formData.append("file", file);
+
+            document.getElementById("progressBar").style.width = "60%";
+
+            await Api.uploadFile("/api/biodiversity/records/" + recordId + "/upload", formData);
+          }
           
           document.getElementById("progressBar").style.width = "100%";
           document.getElementById("progressText").textContent = "上传成功！";
@@ -766,6 +800,7 @@
     showAddToAreaModal: showAddToAreaModal,
     toggleMainSpecies: toggleMainSpecies,
     removeFromArea: removeFromArea,
-    verifyRecord: verifyRecord
+    verifyRecord: verifyRecord,
+    verifyListed: verifyListed
   };
 })();
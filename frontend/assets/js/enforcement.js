@@ -643,6 +643,12 @@
             evidence_path: evidencePath,
             monitor_point_id: formData.get("monitor_point_id")
           });
+
+          // 证据文件上传到服务器媒体存储（相同内容只保存一份）
+          var evidenceInput = document.getElementById("evidenceFileInput");
+          if (evidenceInput && evidenceInput.files && evidenceInput.files.length > 0) {
+            await uploadEvidenceFile(recordId, evidenceInput.files[0]);
+          }
           
           // 存储上传的图片到缓存
           if (tempUploadedImages.length > 0) {
@@ -709,6 +715,19 @@
     }
   }
   
+  // 上传证据文件，服务器返回 /api/media/<sha256> 地址并写入 evidence_path
+  async function uploadEvidenceFile(recordId, file) {
+    var fd = new FormData();
+    fd.append("file", file);
+    try {
+      var updated = await Api.uploadFile("/api/enforcement/records/" + encodeURIComponent(recordId) + "/evidence", fd);
+      var cached = recordsCache.find(function(r) { return r.record_id === recordId; });
+      if (cached && updated) cached.evidence_path = updated.evidence_path;
+    } catch (e) {
+      Common.showToast("证据文件上传失败: " + Api.formatError(e), "error");
+    }
+  }
+
   // 查看证据
   function viewEvidence(recordId) {
     var record = recordsCache.find(function(r) { return r.record_id === recordId; });
@@ -728,6 +747,9 @@
     }
     
     var imageHtml = '';
+    if ((!images || images.length === 0) && record.evidence_path && record.evidence_path.indexOf("/api/media/") === 0) {
+      images = [record.evidence_preview_url || record.evidence_path];
+    }
     if (images && images.length > 0) {
       imageHtml = '<div style="display:flex;flex-wrap:wrap;gap:12px;justify-content:center;margin-bottom:16px;">';
       images.forEach(function(imgSrc, idx) {
@@ -785,6 +807,8 @@
       }
     } catch (e) {}
     
+    uploadEvidenceFile(recordId, input.files[0]);
+
     var newImages = [];
     var filesLoaded = 0;
     var totalFiles = input.files.length;
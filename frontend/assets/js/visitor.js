@@ -1256,7 +1256,7 @@
         }
         
         try {
-          await Api.requestJson("POST", "/api/visitor/reservations", payload);
+          await submitReservationQueued(payload);
           Common.showToast("预约创建成功", "success");
           close();
           loadReservations();
@@ -1268,6 +1268,28 @@
     });
   }
 
+  // 放号高峰时预约接口返回 429 + 排队令牌，按预计等待时间轮询排位后携带令牌重试
+  async function submitReservationQueued(payload) {
+    var queueToken = null;
+    while (true) {
+      try {
+        var headers = queueToken ? { "X-Queue-Token": queueToken } : {};
+        return await Api.requestJson("POST", "/api/visitor/reservations", payload, { headers: headers });
+      } catch (e) {
+        var info = e && e.status === 429 && e.data && e.data.detail;
+        if (!info || !info.queue_token) throw e;
+        queueToken = info.queue_token;
+        while (info && !info.admitted) {
+          Common.showToast("预约排队中，前方 " + info.position + " 人，预计等待 " + Math.ceil(info.eta_seconds) + " 秒", "info");
+          await new Promise(function(resolve) {
+            setTimeout(resolve, Math.min(Math.max(info.eta_seconds, 1), 10) * 1000);
+          });
+          info = await Api.requestJson("GET", "/api/visitor/queue/status?queue_token=" + encodeURIComponent(queueToken));
+        }
+      }
+    }
+  }
+
   async function loadAlerts() {
     var container = document.getElementById("alertsTable");
     Common.setContentLoading(container);
@@ -0,0 +1,79 @@
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+def _request_json(method: str, url: str, payload: object | None = None, token: str | None = None, timeout: float = 60.0):
+    headers = {"Accept": "application/json"}
+    data = None
+    if payload is not None:
+        data = json.dumps(payload).encode("utf-8")
+        headers["Content-Type"] = "application/json; charset=utf-8"
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    req = urllib.request.Request(url, data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            raw = resp.read()
+            return resp.status, json.loads(raw.decode("utf-8")) if raw else None
+    except urllib.error.HTTPError as e:
+        body = e.read().decode("utf-8", errors="replace")
+        return e.code, body[:500]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time the all-areas diversity index dashboard query")
+    parser.add_argument("--base", default="http://127.0.0.1:8007", help="Base URL, e.g. http://127.0.0.1:8007")
+    parser.add_argument("--end", default=None, help="End date (ISO), defaults to now")
+    parser.add_argument("--repeat", type=int, default=5, help="Warm requests after the first one")
+    parser.add_argument("--max-seconds", type=float, default=1.0, help="Fail if a warm request takes longer")
+
+    parser.add_argument("--analyst-name", default="数据分析师")
+    parser.add_argument("--analyst-phone", default="13800000002")
+
+    args = parser.parse_args()
+    base: str = args.base.rstrip("/")
+
+    try:
+        status, data = _request_json("POST", f"{base}/api/core/login",
+                                     payload={"phone": args.analyst_phone, "name": args.analyst_name})
+        token = data.get("token") if isinstance(data, dict) else None
+        if not token:
+            raise RuntimeError(f"login failed: status={status} body={data}")
+
+        query = urllib.parse.urlencode({"end_date": args.end} if args.end else {})
+        url = f"{base}/api/biodiversity/analysis/diversity" + (f"?{query}" if query else "")
+
+        t0 = time.perf_counter()
+        status, data = _request_json("GET", url, token=token)
+        cold = time.perf_counter() - t0
+        if status != 200:
+            raise RuntimeError(f"diversity query failed: status={status} body={data}")
+        print(f"[INFO] areas={len(data['areas'])} periods={len(data['periods'])} cold={cold * 1000:.0f} ms")
+
+        warm = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            status, _ = _request_json("GET", url, token=token)
+            warm.append(time.perf_counter() - t0)
+            if status != 200:
+                raise RuntimeError(f"diversity query failed: status={status}")
+        worst = max(warm) if warm else cold
+        print(f"[INFO] warm: best={min(warm, default=cold) * 1000:.0f} ms worst={worst * 1000:.0f} ms")
+        if worst > args.max_seconds:
+            raise RuntimeError(f"warm request took {worst:.2f}s, limit {args.max_seconds:.2f}s")
+
+        print("[PASS] diversity dashboard within limit")
+        return 0
+
+    except Exception as e:
+        print(f"[FAIL] {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
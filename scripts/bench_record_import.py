@@ -0,0 +1,164 @@
+import argparse
+import datetime as _dt
+import io
+import json
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from dataclasses import dataclass
+
+
+@dataclass
+class HttpResult:
+    status: int
+    data: object
+
+
+def _send(req: urllib.request.Request, timeout: float) -> HttpResult:
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            raw = resp.read()
+            return HttpResult(resp.status, json.loads(raw.decode("utf-8")) if raw else None)
+    except urllib.error.HTTPError as e:
+        try:
+            body = e.read().decode("utf-8", errors="replace")
+            parsed = json.loads(body) if body else None
+        except Exception:
+            parsed = None
+        return HttpResult(e.code, parsed)
+
+
+def _request_json_soft(method: str, url: str, payload: object | None = None, token: str | None = None, timeout: float = 30.0) -> HttpResult:
+    headers = {"Accept": "application/json"}
+    data = None
+    if payload is not None:
+        data = json.dumps(payload).encode("utf-8")
+        headers["Content-Type"] = "application/json; charset=utf-8"
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return _send(urllib.request.Request(url, data=data, headers=headers, method=method), timeout)
+
+
+def _post_multipart(url: str, files: dict, token: str, timeout: float = 600.0) -> HttpResult:
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for field, (filename, content, ctype) in files.items():
+        body.write(f"--{boundary}\r\n".encode())
+        body.write(f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'.encode())
+        body.write(f"Content-Type: {ctype}\r\n\r\n".encode())
+        body.write(content)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    headers = {
+        "Accept": "application/json",
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+        "Authorization": f"Bearer {token}",
+    }
+    return _send(urllib.request.Request(url, data=body.getvalue(), headers=headers, method="POST"), timeout)
+
+
+def _login(base: str, phone: str, name: str) -> str:
+    r = _request_json_soft("POST", f"{base}/api/core/login", payload={"phone": phone, "name": name})
+    token = r.data.get("token") if isinstance(r.data, dict) else None
+    if not token:
+        raise RuntimeError(f"login failed for {phone}: status={r.status} body={r.data}")
+    return token
+
+
+def _rows(n: int, species_ids: list, device_id: int | None, seed: int) -> list:
+    rnd = random.Random(seed)
+    start = _dt.datetime.now() - _dt.timedelta(days=30)
+    rows = []
+    for i in range(n):
+        rows.append({
+            "species_id": rnd.choice(species_ids),
+            "device_id": device_id,
+            "time": (start + _dt.timedelta(seconds=i * 37)).isoformat(timespec="seconds"),
+            "latitude": round(30 + rnd.random(), 6),
+            "longitude": round(103 + rnd.random(), 6),
+            "monitoring_method": "红外相机",
+            "count": rnd.randint(1, 5),
+            "behavior": "觅食",
+        })
+    return rows
+
+
+def _csv(rows: list) -> bytes:
+    cols = ["species_id", "device_id", "time", "latitude", "longitude", "monitoring_method", "count", "behavior"]
+    out = io.StringIO()
+    out.write(",".join(cols) + "\n")
+    for r in rows:
+        out.write(",".join("" if r[c] is None else str(r[c]) for c in cols) + "\n")
+    return out.getvalue().encode("utf-8")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark bulk camera-trap import against the per-record create endpoint")
+    parser.add_argument("--base", default="http://127.0.0.1:8007", help="Base URL, e.g. http://127.0.0.1:8007")
+    parser.add_argument("--records", type=int, default=50000, help="Rows in the bulk import manifest")
+    parser.add_argument("--baseline", type=int, default=300, help="Rows sent one by one through POST /records")
+    parser.add_argument("--species-ids", default="1", help="Comma-separated existing species ids")
+    parser.add_argument("--device-id", type=int, default=None, help="Existing monitoring device id (optional)")
+    parser.add_argument("--max-seconds", type=float, default=10.0,
+                        help="Fail if the end-to-end bulk import (upload, validate, write) takes longer")
+    parser.add_argument("--seed", type=int, default=7)
+
+    parser.add_argument("--manager-name", default="李四")
+    parser.add_argument("--manager-phone", default="13800000005")
+
+    args = parser.parse_args()
+    base: str = args.base.rstrip("/")
+    species_ids = [int(s) for s in args.species_ids.split(",") if s.strip()]
+
+    try:
+        token = _login(base, args.manager_phone, args.manager_name)
+
+        # 基线：逐条创建
+        rows = _rows(args.baseline, species_ids, args.device_id, args.seed)
+        t0 = time.perf_counter()
+        for r in rows:
+            res = _request_json_soft("POST", f"{base}/api/biodiversity/records", payload=r, token=token)
+            if res.status != 200:
+                raise RuntimeError(f"baseline create failed: status={res.status} body={res.data}")
+        per_record = (time.perf_counter() - t0) / max(len(rows), 1)
+        print(f"[INFO] baseline: {len(rows)} records, {per_record * 1000:.1f} ms/record, "
+              f"estimated {per_record * args.records:.1f}s for {args.records}")
+
+        manifest = _csv(_rows(args.records, species_ids, args.device_id, args.seed + 1))
+        print(f"[INFO] manifest: {args.records} rows, {len(manifest) / 1024 / 1024:.1f} MB")
+
+        t0 = time.perf_counter()
+        dry = _post_multipart(f"{base}/api/biodiversity/records/import?dry_run=true",
+                              {"manifest": ("bench.csv", manifest, "text/csv")}, token)
+        if dry.status != 200 or dry.data.get("failed"):
+            raise RuntimeError(f"dry run failed: status={dry.status} body={str(dry.data)[:500]}")
+        print(f"[INFO] validate only: {time.perf_counter() - t0:.2f}s")
+
+        t0 = time.perf_counter()
+        res = _post_multipart(f"{base}/api/biodiversity/records/import",
+                              {"manifest": ("bench.csv", manifest, "text/csv")}, token)
+        elapsed = time.perf_counter() - t0
+        if res.status != 200:
+            raise RuntimeError(f"import failed: status={res.status} body={str(res.data)[:500]}")
+        data = res.data
+        print(f"[INFO] bulk import: imported={data['imported']} failed={data['failed']} "
+              f"elapsed={elapsed:.2f}s ({args.records / elapsed:.0f} rows/s, server {data['elapsed_ms']} ms)")
+        if data["imported"] != args.records:
+            raise RuntimeError(f"expected {args.records} imported rows, errors={data['errors'][:5]}")
+        print(f"[INFO] speedup vs per-record create: {per_record * args.records / elapsed:.0f}x")
+        if elapsed > args.max_seconds:
+            raise RuntimeError(f"bulk import took {elapsed:.1f}s, limit {args.max_seconds:.0f}s")
+
+        print(f"[PASS] {args.records} records imported in {elapsed:.1f}s")
+        return 0
+
+    except Exception as e:
+        print(f"[FAIL] {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
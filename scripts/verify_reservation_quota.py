@@ -0,0 +1,146 @@
+import argparse
+import datetime as _dt
+import json
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+
+@dataclass
+class HttpResult:
+    status: int
+    data: object
+
+
+def _request_json_soft(method: str, url: str, payload: object | None = None, token: str | None = None, timeout: float = 30.0) -> HttpResult:
+    headers = {
+        "Accept": "application/json",
+    }
+    data = None
+
+    if payload is not None:
+        data = json.dumps(payload).encode("utf-8")
+        headers["Content-Type"] = "application/json; charset=utf-8"
+
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    req = urllib.request.Request(url, data=data, headers=headers, method=method)
+
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            raw = resp.read()
+            return HttpResult(resp.status, json.loads(raw.decode("utf-8")) if raw else None)
+    except urllib.error.HTTPError as e:
+        try:
+            body = e.read().decode("utf-8", errors="replace")
+            parsed = json.loads(body) if body else None
+        except Exception:
+            parsed = None
+        return HttpResult(e.code, parsed)
+
+
+def _login(base: str, phone: str, name: str) -> str:
+    r = _request_json_soft("POST", f"{base}/api/core/login", payload={"phone": phone, "name": name})
+    token = r.data.get("token") if isinstance(r.data, dict) else None
+    if not token:
+        raise RuntimeError(f"login failed for {phone}: status={r.status} body={r.data}")
+    return token
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Verify that concurrent reservations never overbook a quota")
+    parser.add_argument("--base", default="http://127.0.0.1:8007", help="Base URL, e.g. http://127.0.0.1:8007")
+    parser.add_argument("--requests", type=int, default=300, help="Number of parallel booking requests")
+    parser.add_argument("--workers", type=int, default=100, help="Client thread pool size")
+    parser.add_argument("--capacity", type=int, default=50, help="Capacity configured for the test slot")
+    parser.add_argument(
+        "--no-seed",
+        action="store_true",
+        help="Do not pre-create the quota row, so concurrent first bookings race to create it; "
+        "--capacity must then equal the server's reservation_slot_capacity",
+    )
+    parser.add_argument("--party-size", type=int, default=1)
+
+    parser.add_argument("--visitor-name", default="张三")
+    parser.add_argument("--visitor-phone", default="13800000007")
+    parser.add_argument("--manager-name", default="李四")
+    parser.add_argument("--manager-phone", default="13800000005")
+
+    args = parser.parse_args()
+    base: str = args.base.rstrip("/")
+
+    try:
+        mtoken = _login(base, args.manager_phone, args.manager_name)
+        vtoken = _login(base, args.visitor_phone, args.visitor_name)
+
+        # 使用远期日期 + 随机公园名，保证每次运行都是全新的配额行
+        park_name = f"并发测试公园-{uuid.uuid4().hex[:8]}"
+        reserve_date = (_dt.date.today() + _dt.timedelta(days=300)).isoformat()
+        time_slot = "上午"
+
+        if args.no_seed:
+            print(f"[INFO] quota not seeded: park={park_name} date={reserve_date} slot={time_slot} capacity={args.capacity}")
+        else:
+            set_r = _request_json_soft(
+                "PUT",
+                f"{base}/api/visitor/quotas",
+                payload={"park_name": park_name, "reserve_date": reserve_date, "time_slot": time_slot, "capacity": args.capacity},
+                token=mtoken,
+            )
+            if set_r.status != 200:
+                raise RuntimeError(f"set quota failed: status={set_r.status} body={set_r.data}")
+            print(f"[OK] quota set: park={park_name} date={reserve_date} slot={time_slot} capacity={args.capacity}")
+
+        def _book(i: int) -> int:
+            payload = {
+                "visitor_name": f"并发游客{i}",
+                "id_card_no": f"9{i:017d}",
+                "phone": None,
+                "reserve_date": reserve_date,
+                "time_slot": time_slot,
+                "party_size": args.party_size,
+                "park_name": park_name,
+            }
+            return _request_json_soft("POST", f"{base}/api/visitor/reservations", payload=payload, token=vtoken).status
+
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            statuses = list(pool.map(_book, range(args.requests)))
+
+        ok = statuses.count(200)
+        full = statuses.count(409)
+        other = len(statuses) - ok - full
+        expected = min(args.requests, args.capacity // args.party_size)
+        print(f"[INFO] booked={ok} rejected_full={full} other={other}")
+        if other:
+            raise RuntimeError(f"unexpected statuses: {sorted(set(s for s in statuses if s not in (200, 409)))}")
+        if ok != expected:
+            raise RuntimeError(f"expected exactly {expected} successful bookings, got {ok}")
+
+        qs = urllib.parse.urlencode({"reserve_date": reserve_date, "park_name": park_name})
+        quotas = _request_json_soft("GET", f"{base}/api/visitor/quotas?{qs}", token=mtoken).data
+        row = next((q for q in quotas or [] if q.get("time_slot") == time_slot), None)
+        if not row or row.get("remaining") != args.capacity - ok * args.party_size:
+            raise RuntimeError(f"quota remaining mismatch: {row}")
+        print(f"[OK] quota remaining={row.get('remaining')}")
+
+        rec = _request_json_soft("POST", f"{base}/api/visitor/quotas/reconcile?from_date={reserve_date}", token=mtoken)
+        fixed = [f for f in (rec.data or {}).get("fixed", []) if f.get("ParkName") == park_name]
+        if rec.status != 200 or fixed:
+            raise RuntimeError(f"reconciliation found drift: status={rec.status} fixed={fixed}")
+        print("[OK] reconciliation found no drift")
+
+        print("[PASS] no overbooking under concurrent load")
+        return 0
+
+    except Exception as e:
+        print(f"[FAIL] {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -159,6 +159,106 @@ BEGIN
 END
 GO
 
+-- 空间网格：经纬度按 0.01 度（约 1 公里）分格的行优先编号，由数据库在写入时计算并持久化；
+-- 应用中的 app/biodiversity/spatial.py 使用同一公式，修改分格大小时两处需同时修改
+IF COL_LENGTH(N'物种监测记录表', N'grid_cell') IS NULL
+BEGIN
+    ALTER TABLE 物种监测记录表 ADD grid_cell AS (
+        CAST(FLOOR((latitude + 90) * 100) AS BIGINT) * 36000
+        + CAST(FLOOR((longitude + 180) * 100) AS BIGINT)
+    ) PERSISTED;
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'idx_grid_cell' AND object_id = OBJECT_ID(N'物种监测记录表'))
+BEGIN
+    CREATE NONCLUSTERED INDEX idx_grid_cell ON 物种监测记录表(grid_cell)
+    INCLUDE (latitude, longitude, species_id, state, time);
+END
+GO
+
+-- 红外相机连拍去重：并入该记录的连拍记录数；按设备和时间查找同一次连拍
+IF COL_LENGTH(N'物种监测记录表', N'duplicate_count') IS NULL
+BEGIN
+    ALTER TABLE 物种监测记录表 ADD duplicate_count INT NOT NULL
+        CONSTRAINT DF_物种监测记录_duplicate_count DEFAULT(0);
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'idx_device_time' AND object_id = OBJECT_ID(N'物种监测记录表'))
+BEGIN
+    CREATE NONCLUSTERED INDEX idx_device_time ON 物种监测记录表(device_id, time)
+    INCLUDE (species_id, state, monitoring_method, latitude, longitude);
+END
+GO
+
+-- 待核实记录的筛选索引：分析员领取待核实记录时按编号顺序查找
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'idx_pending_id' AND object_id = OBJECT_ID(N'物种监测记录表'))
+BEGIN
+    CREATE NONCLUSTERED INDEX idx_pending_id ON 物种监测记录表(id) WHERE state = N'待核实';
+END
+GO
+
+-- 分析员工作队列：领取的记录及租约。Queue 为 verify（待核实）或 analysis（待填写分析结论），
+-- 租约过期的行在下一次领取时删除，记录删除时级联删除
+IF OBJECT_ID(N'dbo.RecordReviewClaims', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.RecordReviewClaims(
+        Queue VARCHAR(16) NOT NULL,
+        RecordId INT NOT NULL,
+        AnalystId INT NOT NULL,
+        ClaimedAt DATETIME2 NOT NULL CONSTRAINT DF_RecordReviewClaims_ClaimedAt DEFAULT(SYSUTCDATETIME()),
+        LeaseExpiresAt DATETIME2 NOT NULL,
+        CONSTRAINT PK_RecordReviewClaims PRIMARY KEY (Queue, RecordId),
+        CONSTRAINT CK_RecordReviewClaims_Queue CHECK (Queue IN ('verify', 'analysis')),
+        CONSTRAINT FK_RecordReviewClaims_记录 FOREIGN KEY (RecordId) REFERENCES 物种监测记录表(id) ON DELETE CASCADE
+    );
+    CREATE NONCLUSTERED INDEX IX_RecordReviewClaims_Analyst ON dbo.RecordReviewClaims(AnalystId, Queue)
+    INCLUDE (LeaseExpiresAt);
+    PRINT N'RecordReviewClaims 创建成功';
+END
+GO
+
+-- 物种监测汇总：由应用在有效监测记录新增 / 核实 / 修改 / 删除时按增量维护，
+-- 替代每次读取都聚合全部监测记录的 V_物种综合信息。
+-- 创建后调用 POST /biodiversity/species/summary/rebuild 按现有记录初始化
+IF OBJECT_ID(N'dbo.SpeciesSummary', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.SpeciesSummary(
+        SpeciesId INT NOT NULL CONSTRAINT PK_SpeciesSummary PRIMARY KEY,
+        Records INT NOT NULL CONSTRAINT DF_SpeciesSummary_Records DEFAULT(0),  -- 有效监测记录数
+        CountSum BIGINT NOT NULL CONSTRAINT DF_SpeciesSummary_CountSum DEFAULT(0),  -- 观测数量之和
+        CountSamples INT NOT NULL CONSTRAINT DF_SpeciesSummary_CountSamples DEFAULT(0),  -- 填写了观测数量的记录数
+        LastSeen DATETIME NULL,  -- 最近监测时间
+        UpdatedAt DATETIME2 NOT NULL CONSTRAINT DF_SpeciesSummary_UpdatedAt DEFAULT(SYSUTCDATETIME()),
+        CONSTRAINT FK_SpeciesSummary_物种 FOREIGN KEY (SpeciesId) REFERENCES 物种表(id) ON DELETE CASCADE
+    );
+    PRINT N'SpeciesSummary 创建成功';
+END
+GO
+
+-- 物种 × 月份的有效监测记录数，用于计算最近若干个月的监测频率
+IF OBJECT_ID(N'dbo.SpeciesMonthlyCounts', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.SpeciesMonthlyCounts(
+        SpeciesId INT NOT NULL,
+        Month DATE NOT NULL,
+        Records INT NOT NULL,
+        CONSTRAINT PK_SpeciesMonthlyCounts PRIMARY KEY (SpeciesId, Month),
+        CONSTRAINT FK_SpeciesMonthlyCounts_物种 FOREIGN KEY (SpeciesId) REFERENCES 物种表(id) ON DELETE CASCADE
+    );
+    PRINT N'SpeciesMonthlyCounts 创建成功';
+END
+GO
+
+-- 重建汇总和删除最近一条记录后重新取最近监测时间时按物种查找有效记录
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'idx_species_state_time' AND object_id = OBJECT_ID(N'物种监测记录表'))
+BEGIN
+    CREATE NONCLUSTERED INDEX idx_species_state_time ON 物种监测记录表(species_id, state, time)
+    INCLUDE ([count]);
+END
+GO
+
 -- 3. 区域物种关联表
 IF NOT EXISTS (SELECT * FROM sysobjects WHERE name=N'区域物种关联表' AND xtype='U')
 BEGIN
@@ -132,3 +132,57 @@ BEGIN
     PRINT N'监测设备表已有数据，跳过插入';
 END
 GO
+
+-- 创建类接口的幂等键：键与业务写入同一事务占位，完成后保存响应供重放
+IF OBJECT_ID(N'dbo.IdempotencyKeys', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.IdempotencyKeys(
+        Scope NVARCHAR(150) NOT NULL,
+        IdempotencyKey NVARCHAR(100) NOT NULL,
+        RequestHash CHAR(64) NOT NULL,
+        StatusCode INT NULL,
+        ResponseBody NVARCHAR(MAX) NULL,
+        CreatedAt DATETIME2 NOT NULL CONSTRAINT DF_IdempotencyKeys_CreatedAt DEFAULT(SYSUTCDATETIME()),
+        CompletedAt DATETIME2 NULL,
+        CONSTRAINT PK_IdempotencyKeys PRIMARY KEY (Scope, IdempotencyKey)
+    );
+    CREATE INDEX IX_IdempotencyKeys_CreatedAt ON dbo.IdempotencyKeys(CreatedAt);
+    PRINT N'IdempotencyKeys 创建成功';
+END
+GO
+
+-- 内容寻址媒体存储：文件按 SHA-256 保存一份，RefCount 为业务表中引用该地址的次数
+IF OBJECT_ID(N'dbo.MediaObjects', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.MediaObjects(
+        Sha256 CHAR(64) NOT NULL CONSTRAINT PK_MediaObjects PRIMARY KEY,
+        SizeBytes BIGINT NOT NULL,
+        ContentType NVARCHAR(100) NOT NULL,
+        OriginalName NVARCHAR(255) NULL,
+        RefCount INT NOT NULL CONSTRAINT DF_MediaObjects_RefCount DEFAULT(0),
+        CreatedAt DATETIME2 NOT NULL CONSTRAINT DF_MediaObjects_CreatedAt DEFAULT(SYSUTCDATETIME()),
+        LastReferencedAt DATETIME2 NOT NULL CONSTRAINT DF_MediaObjects_LastReferencedAt DEFAULT(SYSUTCDATETIME()),
+        CONSTRAINT CK_MediaObjects_RefCount CHECK (RefCount >= 0)
+    );
+    -- 清理任务只扫描引用计数为 0 的行
+    CREATE INDEX IX_MediaObjects_Unreferenced ON dbo.MediaObjects(LastReferencedAt) WHERE RefCount = 0;
+    PRINT N'MediaObjects 创建成功';
+END
+GO
+
+-- 区域边界：多边形（WGS84），按区域筛选监测记录时判断点是否落在区域内；外包矩形用于网格预筛选
+IF OBJECT_ID(N'dbo.AreaBoundaries', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.AreaBoundaries(
+        AreaId INT NOT NULL CONSTRAINT PK_AreaBoundaries PRIMARY KEY,
+        Boundary GEOGRAPHY NOT NULL,
+        MinLat FLOAT NOT NULL,
+        MinLng FLOAT NOT NULL,
+        MaxLat FLOAT NOT NULL,
+        MaxLng FLOAT NOT NULL,
+        UpdatedAt DATETIME2 NOT NULL CONSTRAINT DF_AreaBoundaries_UpdatedAt DEFAULT(SYSUTCDATETIME()),
+        CONSTRAINT FK_AreaBoundaries_区域 FOREIGN KEY (AreaId) REFERENCES 区域表(id) ON DELETE CASCADE
+    );
+    PRINT N'AreaBoundaries 创建成功';
+END
+GO
@@ -96,18 +96,112 @@ BEGIN
 END
 GO
 
+-- 预约配额计数表：按公园/日期/时段维护剩余名额，预约时条件扣减
+IF OBJECT_ID(N'dbo.ReservationQuotas', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.ReservationQuotas(
+        ParkName NVARCHAR(100) NOT NULL,
+        ReserveDate DATE NOT NULL,
+        TimeSlot NVARCHAR(20) NOT NULL,
+        Capacity INT NOT NULL,
+        Remaining INT NOT NULL,
+        UpdatedAt DATETIME2 NOT NULL CONSTRAINT DF_ReservationQuotas_UpdatedAt DEFAULT(SYSUTCDATETIME()),
+        CONSTRAINT PK_ReservationQuotas PRIMARY KEY (ParkName, ReserveDate, TimeSlot),
+        CONSTRAINT CK_ReservationQuotas_Capacity CHECK (Capacity >= 0),
+        CONSTRAINT CK_ReservationQuotas_Remaining CHECK (Remaining >= 0 AND Remaining <= Capacity)
+    );
+END
+GO
+
+-- 轨迹压缩归档：压缩时保存该次入园的全部原始定位点（zlib 压缩的 JSON），VisitorTracks 只保留抽稀后的点
+IF OBJECT_ID(N'dbo.VisitorTrackArchives', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.VisitorTrackArchives(
+        VisitId INT NOT NULL PRIMARY KEY,
+        VisitorId INT NOT NULL,
+        RawPointCount INT NOT NULL,
+        KeptPointCount INT NOT NULL,
+        Tolerance DECIMAL(8,2) NOT NULL,
+        RawPoints VARBINARY(MAX) NOT NULL,
+        CompactedAt DATETIME2 NOT NULL CONSTRAINT DF_VisitorTrackArchives_CompactedAt DEFAULT(SYSUTCDATETIME()),
+        CONSTRAINT FK_VisitorTrackArchives_Visit FOREIGN KEY(VisitId) REFERENCES dbo.Visits(VisitId)
+    );
+END
+GO
+
+-- 游客密度热力图：按时间桶和经纬度网格（网格编号 = FLOOR(坐标 / 网格边长)）预聚合的轨迹点计数
+IF OBJECT_ID(N'dbo.VisitorHeatmapBins', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.VisitorHeatmapBins(
+        BucketStart DATETIME2 NOT NULL,
+        CellLat INT NOT NULL,
+        CellLng INT NOT NULL,
+        PointCount INT NOT NULL,
+        CONSTRAINT PK_VisitorHeatmapBins PRIMARY KEY (BucketStart, CellLat, CellLng),
+        CONSTRAINT CK_VisitorHeatmapBins_Count CHECK (PointCount >= 0)
+    );
+END
+GO
+
+-- 电子票核销：每张票（预约）每天只能入园一次，主键冲突即重复使用，多进程和重启后同样有效
+IF OBJECT_ID(N'dbo.TicketCheckIns', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.TicketCheckIns(
+        ReservationId INT NOT NULL,
+        VisitDate DATE NOT NULL,
+        VisitId INT NOT NULL,
+        CheckedInAt DATETIME2 NOT NULL CONSTRAINT DF_TicketCheckIns_CheckedInAt DEFAULT(SYSUTCDATETIME()),
+        CONSTRAINT PK_TicketCheckIns PRIMARY KEY (ReservationId, VisitDate),
+        CONSTRAINT FK_TicketCheckIns_Reservation FOREIGN KEY(ReservationId) REFERENCES dbo.Reservations(ReservationId),
+        CONSTRAINT FK_TicketCheckIns_Visit FOREIGN KEY(VisitId) REFERENCES dbo.Visits(VisitId)
+    );
+END
+GO
+
+-- 闸机离线同步事件：记录已处理的客户端幂等键，重放时直接返回首次处理结果
+IF OBJECT_ID(N'dbo.VisitSyncEvents', N'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.VisitSyncEvents(
+        EventKey NVARCHAR(64) NOT NULL PRIMARY KEY,
+        DeviceId NVARCHAR(50) NULL,
+        EventType NVARCHAR(10) NOT NULL,
+        OccurredAt DATETIME2 NOT NULL,
+        VisitId INT NULL,
+        ResultStatus NVARCHAR(10) NOT NULL,
+        Reason NVARCHAR(200) NULL,
+        SyncedAt DATETIME2 NOT NULL CONSTRAINT DF_VisitSyncEvents_SyncedAt DEFAULT(SYSUTCDATETIME()),
+        CONSTRAINT CK_VisitSyncEvents_Type CHECK (EventType IN (N'enter', N'exit')),
+        CONSTRAINT CK_VisitSyncEvents_Status CHECK (ResultStatus IN (N'applied', N'conflict'))
+    );
+END
+GO
+
 IF OBJECT_ID(N'dbo.Reservations', N'U') IS NOT NULL
 AND NOT EXISTS (
     SELECT 1 FROM sys.indexes WHERE name = N'IX_Reservations_Visitor_Date' AND object_id = OBJECT_ID(N'dbo.Reservations')
 )
     CREATE INDEX IX_Reservations_Visitor_Date ON dbo.Reservations(VisitorId, ReserveDate);
 
+IF OBJECT_ID(N'dbo.Reservations', N'U') IS NOT NULL
+AND COL_LENGTH(N'dbo.Reservations', N'ParkName') IS NOT NULL
+AND NOT EXISTS (
+    SELECT 1 FROM sys.indexes WHERE name = N'IX_Reservations_Park_Date_Slot' AND object_id = OBJECT_ID(N'dbo.Reservations')
+)
+    CREATE INDEX IX_Reservations_Park_Date_Slot ON dbo.Reservations(ParkName, ReserveDate, TimeSlot)
+        INCLUDE (PartySize, ReserveStatus);
+
 IF OBJECT_ID(N'dbo.Visits', N'U') IS NOT NULL
 AND NOT EXISTS (
     SELECT 1 FROM sys.indexes WHERE name = N'IX_Visits_Area_EntryTime' AND object_id = OBJECT_ID(N'dbo.Visits')
 )
     CREATE INDEX IX_Visits_Area_EntryTime ON dbo.Visits(AreaId, EntryTime);
 
+IF OBJECT_ID(N'dbo.Visits', N'U') IS NOT NULL
+AND NOT EXISTS (
+    SELECT 1 FROM sys.indexes WHERE name = N'IX_Visits_Visitor_Open' AND object_id = OBJECT_ID(N'dbo.Visits')
+)
+    CREATE INDEX IX_Visits_Visitor_Open ON dbo.Visits(VisitorId, AreaId) INCLUDE (EntryTime) WHERE ExitTime IS NULL;
+
 IF OBJECT_ID(N'dbo.VisitorTracks', N'U') IS NOT NULL
 AND NOT EXISTS (
     SELECT 1 FROM sys.indexes WHERE name = N'IX_VisitorTracks_Visitor_Time' AND object_id = OBJECT_ID(N'dbo.VisitorTracks')
@@ -119,4 +213,10 @@ AND NOT EXISTS (
     SELECT 1 FROM sys.indexes WHERE name = N'IX_VisitorTracks_Area_Time' AND object_id = OBJECT_ID(N'dbo.VisitorTracks')
 )
     CREATE INDEX IX_VisitorTracks_Area_Time ON dbo.VisitorTracks(AreaId, LocateTime);
+
+IF OBJECT_ID(N'dbo.VisitorTracks', N'U') IS NOT NULL
+AND NOT EXISTS (
+    SELECT 1 FROM sys.indexes WHERE name = N'IX_VisitorTracks_Visit_Time' AND object_id = OBJECT_ID(N'dbo.VisitorTracks')
+)
+    CREATE INDEX IX_VisitorTracks_Visit_Time ON dbo.VisitorTracks(VisitId, LocateTime);
 GO
@@ -60,6 +60,10 @@ AS
 BEGIN
     SET NOCOUNT ON;
 
+    -- 批量同步时由应用层在事务末尾按区域统一重算一次
+    IF CAST(SESSION_CONTEXT(N'SkipFlowRecalc') AS INT) = 1
+        RETURN;
+
     DECLARE @Areas TABLE(AreaId INT PRIMARY KEY);
 
     INSERT INTO @Areas(AreaId)
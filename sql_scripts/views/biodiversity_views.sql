@@ -13,6 +13,7 @@ GO
 
 -- 视图1：物种综合信息视图
 -- 适用范围：用于物种信息查询和报表生成
+-- 监测次数等统计读取应用维护的 dbo.SpeciesSummary（见 ddl/biodiversity_tables.sql），不再聚合全部监测记录
 IF EXISTS (SELECT * FROM sysobjects WHERE name = N'V_物种综合信息' AND xtype = 'V')
     DROP VIEW V_物种综合信息;
 GO
@@ -25,15 +26,11 @@ SELECT
     s.protect_level AS 保护等级,
     s.class_name AS 纲,
     s.[order] AS 目,
-    COUNT(m.id) AS 监测次数,
-    MAX(m.time) AS 最近监测时间,
-    AVG(m.[count]) AS 平均观测数量
+    ISNULL(ss.Records, 0) AS 监测次数,
+    ss.LastSeen AS 最近监测时间,
+    CAST(ss.CountSum / NULLIF(ss.CountSamples, 0) AS INT) AS 平均观测数量
 FROM 物种表 s
-LEFT JOIN 物种监测记录表 m ON s.id = m.species_id
-WHERE m.state = N'有效' OR m.state IS NULL
-GROUP BY
-    s.id, s.chinese_name, s.latin_name, s.protect_level,
-    s.class_name, s.[order];
+LEFT JOIN dbo.SpeciesSummary ss ON ss.SpeciesId = s.id;
 GO
 
 PRINT N'✓ 视图1：V_物种综合信息 创建完成';
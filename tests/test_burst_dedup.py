@@ -0,0 +1,59 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.biodiversity.burst_dedup import same_burst, sweep
+from app.config import settings
+
+Row = namedtuple("Row", "species_id state time latitude longitude")
+
+T0 = datetime(2024, 5, 1, 6, 0, 0)
+
+
+def row(species_id=1, seconds=0, latitude=30.0, longitude=120.0, state="待核实"):
+    return Row(species_id, state, T0 + timedelta(seconds=seconds), latitude, longitude)
+
+
+@pytest.fixture(autouse=True)
+def burst_settings(monkeypatch):
+    monkeypatch.setattr(settings, "burst_window_seconds", 60)
+    monkeypatch.setattr(settings, "burst_distance_m", 50.0)
+
+
+def test_same_burst_within_window_and_distance():
+    assert same_burst(row(), row(seconds=59, latitude=30.0001))
+
+
+def test_same_burst_rejects_other_species_or_state():
+    assert not same_burst(row(), row(species_id=2, seconds=1))
+    assert not same_burst(row(), row(seconds=1, state="有效"))
+
+
+def test_same_burst_rejects_outside_window():
+    assert not same_burst(row(), row(seconds=61))
+    assert not same_burst(row(seconds=61), row())
+
+
+def test_same_burst_rejects_far_apart_points():
+    # 纬度差 0.001° 约 111 米
+    assert not same_burst(row(), row(seconds=1, latitude=30.001))
+
+
+def test_same_burst_without_coordinates_compares_time_only():
+    assert same_burst(row(latitude=None), row(seconds=30, latitude=31.0))
+
+
+def test_sweep_groups_follow_first_record_of_burst():
+    rows = [row(seconds=0), row(seconds=30), row(seconds=59), row(seconds=90), row(seconds=100)]
+    # 第 4 条与代表相隔 90 秒，另起一段
+    assert sweep(rows) == [(0, [1, 2]), (3, [4])]
+
+
+def test_sweep_splits_on_species_change_and_skips_singletons():
+    rows = [row(seconds=0), row(species_id=2, seconds=1), row(species_id=2, seconds=2), row(species_id=3, seconds=3)]
+    assert sweep(rows) == [(1, [2])]
+
+
+def test_sweep_empty():
+    assert sweep([]) == []
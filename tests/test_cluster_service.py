@@ -0,0 +1,57 @@
+import numpy as np
+
+from app.biodiversity.cluster_service import Occurrence, _Layer, _Level
+
+
+def level_of(points, zoom=3):
+    ids = np.array([p[0] for p in points], dtype=np.int64)
+    lat = np.array([p[1] for p in points], dtype=np.float64)
+    lng = np.array([p[2] for p in points], dtype=np.float64)
+    return _Level.build(_Layer(ids, lat, lng), zoom)
+
+
+def test_adjust_adds_point_to_existing_cluster():
+    level = level_of([(1, 30.0, 120.0)])
+    key = int(level.keys[0])
+    level.adjust(key, 30.2, 120.2, 2, 1)
+    assert level.keys.tolist() == [key]
+    assert level.count.tolist() == [2]
+    assert level.sum_lat[0] == 60.2
+    assert level.sum_id.tolist() == [3]
+
+
+def test_adjust_inserts_new_cluster_in_key_order():
+    level = level_of([(1, 30.0, 120.0), (2, -30.0, -60.0)])
+    keys = level.keys.tolist()
+    new_key = keys[0] + 1
+    level.adjust(new_key, 10.0, 10.0, 7, 1)
+    assert level.keys.tolist() == sorted(keys + [new_key])
+    i = level.keys.tolist().index(new_key)
+    assert level.count[i] == 1 and level.sum_id[i] == 7
+
+
+def test_adjust_removes_cluster_when_last_point_leaves():
+    level = level_of([(1, 30.0, 120.0), (2, -30.0, -60.0)])
+    key = int(level.keys[0])
+    i = 0
+    level.adjust(key, float(level.sum_lat[i]), float(level.sum_lng[i]), int(level.sum_id[i]), -1)
+    assert key not in level.keys.tolist()
+    assert len(level.count) == len(level.sum_lat) == len(level.sum_lng) == len(level.sum_id) == 1
+
+
+def test_adjust_ignores_removal_from_unknown_cluster():
+    level = level_of([(1, 30.0, 120.0)])
+    level.adjust(int(level.keys[0]) + 1, 0.0, 0.0, 9, -1)
+    assert level.count.tolist() == [1]
+
+
+def test_incremental_layer_matches_rebuild():
+    layer = _Layer(np.array([1, 2], dtype=np.int64), np.array([30.0, 30.01]), np.array([120.0, 120.01]))
+    layer.level(5)
+    layer.add([Occurrence(3, 1, -10.0, 20.0)])
+    layer.remove([1])
+    rebuilt = _Level.build(layer, 5)
+    cached = layer.level(5)
+    assert cached.keys.tolist() == rebuilt.keys.tolist()
+    assert cached.count.tolist() == rebuilt.count.tolist()
+    assert cached.sum_id.tolist() == rebuilt.sum_id.tolist()
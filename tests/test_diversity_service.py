@@ -0,0 +1,91 @@
+import math
+from collections import namedtuple
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from app.biodiversity import diversity_service
+from app.biodiversity.diversity_service import (
+    DiversityIndexEngine,
+    add_months,
+    diversity_indices,
+    month_range,
+)
+
+Row = namedtuple("Row", "area_id period species_id individuals records")
+
+
+def test_month_helpers():
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert month_range(date(2024, 11, 15), date(2025, 1, 2)) == [
+        date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1)
+    ]
+
+
+def test_diversity_indices_even_community():
+    result = diversity_indices(np.array([[5, 5, 5, 5]]))
+    assert result["richness"][0] == 4
+    assert result["individuals"][0] == 20
+    assert result["shannon"][0] == pytest.approx(math.log(4))
+    assert result["simpson"][0] == pytest.approx(0.75)
+    assert result["pielou"][0] == pytest.approx(1.0)
+
+
+def test_diversity_indices_uneven_community():
+    result = diversity_indices(np.array([[9, 1]]))
+    p = np.array([0.9, 0.1])
+    assert result["shannon"][0] == pytest.approx(-(p * np.log(p)).sum())
+    assert result["simpson"][0] == pytest.approx(1 - (p * p).sum())
+
+
+def test_diversity_indices_single_species_and_empty_rows():
+    result = diversity_indices(np.array([[0, 7], [0, 0]]))
+    assert result["richness"].tolist() == [1, 0]
+    assert result["shannon"][0] == 0.0
+    assert result["simpson"][0] == 0.0
+    assert np.isnan(result["pielou"][0])
+    for name in ("shannon", "simpson", "pielou"):
+        assert np.isnan(result[name][1])
+
+
+class _FakeQueries:
+    def __init__(self):
+        self.calls = []
+
+    def aggregate_valid_records_by_area_month(self, db, start, end, end_inclusive=False):
+        self.calls.append((start, end, end_inclusive))
+        month = date(start.year, start.month, 1)
+        return [Row(1, month, 10, 4, 2)]
+
+
+@pytest.fixture
+def fake_queries(monkeypatch):
+    fake = _FakeQueries()
+    monkeypatch.setattr(diversity_service, "BiodiversityQueries", fake)
+    return fake
+
+
+def test_compute_queries_partial_month_with_exact_range(fake_queries):
+    engine = DiversityIndexEngine(ttl_seconds=60)
+    result = engine.compute(None, [1], datetime(2024, 3, 15), datetime(2024, 3, 20))
+    assert fake_queries.calls == [(datetime(2024, 3, 15), datetime(2024, 3, 20), True)]
+    assert result["periods"] == ["2024-03"]
+    assert result["areas"][0]["total"]["records"] == 2
+
+
+def test_compute_caches_whole_months_only(fake_queries):
+    engine = DiversityIndexEngine(ttl_seconds=60)
+    engine.compute(None, [1], datetime(2024, 1, 10), datetime(2024, 3, 5))
+    assert fake_queries.calls == [
+        (date(2024, 2, 1), date(2024, 3, 1), False),
+        (datetime(2024, 1, 10), datetime(2024, 2, 1), False),
+        (datetime(2024, 3, 1), datetime(2024, 3, 5), True),
+    ]
+    fake_queries.calls.clear()
+    result = engine.compute(None, [1, 2], datetime(2024, 2, 1), datetime(2024, 2, 29, 23, 59, 59, 999999))
+    assert fake_queries.calls == []
+    by_area = {a["area_id"]: a for a in result["areas"]}
+    assert by_area[1]["total"]["individuals"] == 4
+    assert by_area[2]["total"]["records"] == 0
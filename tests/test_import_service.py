@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.biodiversity.import_service import _RowValidator
+
+
+@pytest.fixture
+def validator():
+    return _RowValidator(species_ids={1, 2}, device_ids={10}, recorder_id=5, archive_names=None)
+
+
+def raw(**overrides):
+    values = {"species_id": "1", "device_id": "10", "time": "2024-05-01 08:30:00", "latitude": "30.5", "longitude": "120.1"}
+    values.update(overrides)
+    return values
+
+
+def test_valid_row_defaults(validator):
+    values, member, errors = validator.validate(raw())
+    assert errors == [] and member is None
+    assert values["time"] == datetime(2024, 5, 1, 8, 30)
+    assert values["monitoring_method"] == "红外相机"
+    assert values["state"] == "待核实"
+    assert values["latitude"] == 30.5
+    assert values["recorder_id"] == 5
+
+
+def test_aware_time_is_converted_to_local_naive(validator):
+    values, _, errors = validator.validate(raw(time="2024-05-01T00:30:00Z"))
+    assert errors == []
+    expected = datetime(2024, 5, 1, 0, 30, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert values["time"] == expected
+    assert values["time"].tzinfo is None
+
+
+def test_offset_time_is_converted_to_local_naive(validator):
+    values, _, errors = validator.validate(raw(time="2024-05-01T08:30:00+08:00"))
+    assert errors == []
+    expected = datetime(2024, 5, 1, 8, 30, tzinfo=timezone(timedelta(hours=8))).astimezone().replace(tzinfo=None)
+    assert values["time"] == expected
+
+
+@pytest.mark.parametrize("value", ["yesterday", "2024-13-01", "2024-05-01T08:30:00+25:00"])
+def test_unparseable_time_is_a_row_error(validator, value):
+    values, _, errors = validator.validate(raw(time=value))
+    assert values is None
+    assert errors == [f"time 格式错误：{value}"]
+
+
+def test_future_time_is_rejected(validator):
+    future = (datetime.now() + timedelta(days=1)).isoformat()
+    _, _, errors = validator.validate(raw(time=future))
+    assert errors == ["time 不能晚于当前时间"]
+
+
+def test_collects_all_errors(validator):
+    values, _, errors = validator.validate(
+        raw(species_id="9", device_id="x", time="", latitude="91", monitoring_method="雷达", count="-1")
+    )
+    assert values is None
+    assert errors == [
+        "物种不存在：9",
+        "device_id 不是整数：x",
+        "time 不能为空",
+        "latitude 超出范围：91",
+        "monitoring_method 无效：雷达",
+        "count 不能为负数",
+    ]
+
+
+def test_image_requires_archive(validator):
+    _, _, errors = validator.validate(raw(image="a.jpg"))
+    assert errors == ["清单引用了 image 但没有上传 ZIP 包"]
+
+
+def test_image_resolved_by_basename():
+    validator = _RowValidator({1}, {10}, 5, {"a.jpg": "cards/01/a.jpg"})
+    values, member, errors = validator.validate(raw(image="other/a.jpg"))
+    assert errors == []
+    assert member == "cards/01/a.jpg"
+
+
+def test_non_object_row(validator):
+    assert validator.validate(["1"]) == (None, None, ["不是有效的记录对象"])
@@ -0,0 +1,45 @@
+from app import local_cache
+from app.local_cache import ReconciledCache, expired
+
+
+class _Counter(ReconciledCache):
+    def __init__(self, reconcile_seconds):
+        super().__init__(reconcile_seconds)
+        self.loads = 0
+        self.value = None
+
+    def _rebuild(self, db):
+        self.loads += 1
+        return {"value": db}
+
+    def read(self, db):
+        self._ensure(db)
+        return self.value
+
+
+def test_expired(monkeypatch):
+    monkeypatch.setattr(local_cache.time, "monotonic", lambda: 100.0)
+    assert expired(None, 10)
+    assert expired(90.0, 10)
+    assert not expired(95.0, 10)
+
+
+def test_reconciles_once_until_ttl(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(local_cache.time, "monotonic", lambda: now[0])
+    cache = _Counter(reconcile_seconds=60)
+    assert not cache.loaded
+    assert cache.read("a") == "a"
+    now[0] = 59.0
+    assert cache.read("b") == "a"
+    now[0] = 60.0
+    assert cache.read("c") == "c"
+    assert cache.loads == 2
+
+
+def test_invalidate_forces_reload():
+    cache = _Counter(reconcile_seconds=3600)
+    cache.read("a")
+    cache.invalidate()
+    assert not cache.loaded
+    assert cache.read("b") == "b"
@@ -0,0 +1,60 @@
+from datetime import date
+
+import pytest
+
+from app.config import settings
+from app.visitor import quota_service
+
+
+class _FakeQueries:
+    def __init__(self, results):
+        self.results = list(results)
+        self.created = []
+
+    def try_take_quota(self, db, park, reserve_date, time_slot, party_size):
+        return self.results.pop(0)
+
+    def create_quota_if_absent(self, db, park, reserve_date, time_slot, capacity):
+        self.created.append((park, reserve_date, time_slot, capacity))
+        return True
+
+
+def use(monkeypatch, results):
+    fake = _FakeQueries(results)
+    monkeypatch.setattr(quota_service, "queries", fake)
+    return fake
+
+
+DAY = date(2024, 5, 1)
+
+
+def test_take_succeeds_without_seeding(monkeypatch):
+    fake = use(monkeypatch, [True])
+    assert quota_service.take(None, " 园区 ", DAY, "上午", 2) is True
+    assert fake.created == []
+
+
+def test_take_on_full_quota_does_not_seed(monkeypatch):
+    fake = use(monkeypatch, [False])
+    assert quota_service.take(None, "园区", DAY, "上午", 2) is False
+    assert fake.created == []
+
+
+@pytest.mark.parametrize("retry, expected", [(True, True), (False, False)])
+def test_take_seeds_missing_row_and_retries_once(monkeypatch, retry, expected):
+    monkeypatch.setattr(settings, "reservation_slot_capacity", 300)
+    fake = use(monkeypatch, [None, retry])
+    assert quota_service.take(None, None, DAY, "下午", 2) is expected
+    assert fake.created == [("", DAY, "下午", 300)]
+
+
+def test_apply_status_change(monkeypatch):
+    calls = []
+    monkeypatch.setattr(quota_service, "take", lambda db, *key: calls.append(("take", key)) or True)
+    monkeypatch.setattr(quota_service, "release", lambda db, *key: calls.append(("release", key)))
+    row = {"ParkName": "园区", "ReserveDate": DAY, "TimeSlot": "上午", "PartySize": 2}
+    quota_service.apply_status_change(None, "待审核", "已取消", row)
+    quota_service.apply_status_change(None, "已取消", "已确认", row)
+    quota_service.apply_status_change(None, "待审核", "已确认", row)
+    key = ("园区", DAY, "上午", 2)
+    assert calls == [("release", key), ("take", key)]
@@ -0,0 +1,40 @@
+from collections import namedtuple
+from datetime import date, datetime
+
+from app.biodiversity.species_summary import SummaryDelta
+
+Record = namedtuple("Record", "species_id time count")
+
+
+def test_of_aggregates_by_species_and_month():
+    delta = SummaryDelta.of([
+        Record(1, datetime(2024, 3, 2), 3),
+        Record(1, datetime(2024, 4, 5), None),
+        Record(2, datetime(2024, 3, 9), 1),
+    ])
+    assert delta.species_rows() == [
+        (1, 2, 3, 1, datetime(2024, 4, 5), None),
+        (2, 1, 1, 1, datetime(2024, 3, 9), None),
+    ]
+    assert delta.month_rows() == [(1, date(2024, 3, 1), 1), (1, date(2024, 4, 1), 1), (2, date(2024, 3, 1), 1)]
+
+
+def test_remove_tracks_latest_removed_time_separately():
+    delta = SummaryDelta()
+    delta.add(1, datetime(2024, 3, 2), 2)
+    delta.remove(1, datetime(2024, 5, 1), 4)
+    assert delta.species_rows() == [(1, 0, -2, 0, datetime(2024, 3, 2), datetime(2024, 5, 1))]
+
+
+def test_month_rows_drop_cancelled_months():
+    delta = SummaryDelta()
+    delta.add(1, datetime(2024, 3, 2), None)
+    delta.remove(1, datetime(2024, 3, 20), None)
+    assert delta.month_rows() == []
+    # 物种行仍保留，调用方据此重新判断最晚监测时间
+    assert bool(delta)
+
+
+def test_empty_delta_is_falsy():
+    assert not SummaryDelta()
+    assert not SummaryDelta.of([])
@@ -0,0 +1,67 @@
+from datetime import date, datetime
+
+import pytest
+
+from app.config import settings
+from app.visitor import ticket_service
+from app.visitor.ticket_service import TicketError, issue, verify
+
+
+@pytest.fixture(autouse=True)
+def ticket_settings(monkeypatch):
+    monkeypatch.setattr(settings, "entry_ticket_key", "test-key")
+    monkeypatch.setattr(settings, "entry_ticket_noon_hour", 12)
+
+
+DAY = date(2024, 5, 1)
+
+
+def test_verify_round_trip():
+    code = issue(11, 22, DAY, "全天", 3)
+    claims = verify(code, at=datetime(2024, 5, 1, 18, 0))
+    assert claims == ticket_service.TicketClaims(11, 22, DAY, "全天", 3)
+
+
+def test_verify_rejects_tampered_ticket():
+    code = issue(11, 22, DAY, "全天", 3)
+    tampered = code.replace(".3.", ".9.")
+    with pytest.raises(TicketError, match="签名无效"):
+        verify(tampered, at=datetime(2024, 5, 1, 9, 0))
+
+
+def test_verify_rejects_ticket_signed_with_other_key(monkeypatch):
+    code = issue(11, 22, DAY, "全天", 3)
+    monkeypatch.setattr(settings, "entry_ticket_key", "other-key")
+    with pytest.raises(TicketError, match="签名无效"):
+        verify(code, at=datetime(2024, 5, 1, 9, 0))
+
+
+@pytest.mark.parametrize("code", ["", "T1.1.2", "T2.1.2.20240501.AM.1.sig", None])
+def test_verify_rejects_malformed_ticket(code):
+    with pytest.raises(TicketError, match="格式错误"):
+        verify(code, at=datetime(2024, 5, 1, 9, 0))
+
+
+def test_verify_rejects_other_day():
+    code = issue(11, 22, DAY, "全天", 3)
+    with pytest.raises(TicketError, match="入园日期"):
+        verify(code, at=datetime(2024, 5, 2, 9, 0))
+
+
+@pytest.mark.parametrize(
+    "slot, hour, ok",
+    [("上午", 11, True), ("上午", 12, False), ("下午", 11, False), ("下午", 12, True), ("全天", 23, True)],
+)
+def test_verify_checks_time_slot(slot, hour, ok):
+    code = issue(11, 22, DAY, slot, 1)
+    at = datetime(2024, 5, 1, hour, 30)
+    if ok:
+        assert verify(code, at=at).time_slot == slot
+    else:
+        with pytest.raises(TicketError, match="时段"):
+            verify(code, at=at)
+
+
+def test_issue_rejects_unknown_slot():
+    with pytest.raises(TicketError):
+        issue(11, 22, DAY, "夜间", 1)
@@ -0,0 +1,17 @@
+from datetime import datetime, timedelta, timezone
+
+from app.timeutil import local_naive
+
+
+def test_naive_and_none_unchanged():
+    value = datetime(2024, 5, 1, 8, 0)
+    assert local_naive(value) is value
+    assert local_naive(None) is None
+
+
+def test_aware_converted_to_local_time():
+    value = datetime(2024, 5, 1, 8, 0, tzinfo=timezone(timedelta(hours=8)))
+    result = local_naive(value)
+    assert result.tzinfo is None
+    assert result == value.astimezone().replace(tzinfo=None)
+    assert result.replace(tzinfo=value.astimezone().tzinfo) == value